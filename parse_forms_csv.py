@@ -5,6 +5,7 @@
 
 # Standard library
 from argparse import ArgumentParser
+from bisect import bisect_right
 import calendar
 import csv
 import datetime
@@ -416,6 +417,31 @@ def find_near_date(all_data, target_date, day_delta=3):  # TODO be smarter/more
     return nearest_entries
 
 
+def find_near_dates(all_data, target_dates, day_delta=3):
+    """find_near_date() for many target dates at once, sorting each user's dates only once
+
+    (tl40data_v2/submission_index.py does the same for the db-backed dashboard.)
+
+    Arguments
+        all_data : entries : dict by user, containing subdict by date
+        target_dates : list of datetime.date
+        day_delta : integer : as in find_near_date()
+
+    Returns
+        list of dicts as returned by find_near_date(), one per target date, in the given order
+    """
+    delta = datetime.timedelta(days=day_delta)
+    results = [{} for _ in target_dates]
+    for user, entries in all_data.items():
+        dates = sorted(entries)
+        for result, target_date in zip(results, target_dates):
+            # Latest date up to the end of the window, if it's not before its start
+            idx = bisect_right(dates, target_date + delta) - 1
+            if idx >= 0 and dates[idx] >= target_date - delta:
+                result[user] = entries[dates[idx]]
+    return results
+
+
 #def render_monthly(entries):
 #
 #    with open(report_fields_path, 'r') as fr:
@@ -467,7 +493,7 @@ def to_increment_str(val):
     else:
         return f"{int(float(val)):,}"
 
-def render_monthly_html(entries, month=None, running_totals=None, player_platinum_tracker=None):
+def render_monthly_html(entries, month=None, running_totals=None, player_platinum_tracker=None, months_data=None):
     """Return a list of HTML divs, one per calendar month, and data derived from entries
 
     These are meant to be (one at a time) added to a parent HTML document.
@@ -478,6 +504,7 @@ def render_monthly_html(entries, month=None, running_totals=None, player_platinu
             # TODO RENAME: this is not a month, but a date object of the first day of a month
         running_totals: None or a dictionary.
         player_platinum_tracker: None or a dictionary
+        months_data: find_near_date(entries, month), if the caller already has it
 
     Returns:
         content_div: HTML
@@ -504,7 +531,8 @@ def render_monthly_html(entries, month=None, running_totals=None, player_platinu
         month = starting_date
 
     #oct_data = find_near_date(entries, datetime.date(2021, 10, 31))
-    months_data = find_near_date(entries, month)
+    if months_data is None:
+        months_data = find_near_date(entries, month)
     monthname = calendar.month_name[month.month]
     month_year = f" ({monthname} {month.year})"
 
@@ -704,8 +732,10 @@ def main(args):
     starting_date = datetime.date(day=1, year=today_date.year, month=today_date.month)
     running_totals = None  # will become a dict
     player_platinum_tracker = None  # will become a dict
-    for n in range(-11, 1):  # last 12 months, starting from 12 months ago
-        newmonthdate = starting_date + relativedelta(months=n, days=-1)  # e.g. 10-31-2021
+    month_offsets = range(-11, 1)  # last 12 months, starting from 12 months ago
+    month_dates = [starting_date + relativedelta(months=n, days=-1) for n in month_offsets]  # e.g. 10-31-2021
+    all_months_data = find_near_dates(entries, month_dates)
+    for n, newmonthdate, months_data in zip(month_offsets, month_dates, all_months_data):
 
         # Start of an HTML document
         doc = dominate.document(title='PoGo Stats - San Jose')
@@ -734,7 +764,8 @@ def main(args):
             content, running_totals, player_platinum_tracker, aborted = render_monthly_html(entries,
                                                                                             newmonthdate,
                                                                                             running_totals,
-                                                                                            player_platinum_tracker)
+                                                                                            player_platinum_tracker,
+                                                                                            months_data)
             if aborted:
                 print(f"Skipped month ending on: {newmonthdate} (render_monthly_html aborted; no or invalid data for month)")
                 continue
@@ -4,11 +4,11 @@ import datetime
 from io import StringIO
 from unittest import TestCase
 
-from parse_forms_csv import parse_csv_to_clean_submissions, relative_date_string_to_date
+from parse_forms_csv import find_near_date, find_near_dates, parse_csv_to_clean_submissions, relative_date_string_to_date
 
 # Valid input (3 columns of data)
 simple_example_user1 = """
-Timestamp,PoGo Name (either in-game or discord name),Copy paste
+Timestamp,PoGo Name (either in-game or discord name),Copy paste
 10/31/2021 20:13:17,Gertlex,"
 Survey History
 		Response Date 	Admin Override 	Total XP 	Trainer Level 	
@@ -23,7 +23,7 @@ ignore_for_now = """
 10/31/2021 20:53:47,Gertlex,"Response Date 	Admin Override 	Total XP 	
 edit
 	done	Today at 8:16 PM	---	70,419,835 (+3,192,248)	45 (+0)	
-done"
+done"
 10/31/2021 21:26:53,TheNakedHornet,"	Response Date	Admin Override	Total XP
 edit	done	Today at 7:01 PM	---	121,477,982 (+4,340,644)	
 edit	done	09/30/2021	---	117,137,338 (+6,257,517)	47 (+0)	
@@ -67,3 +67,16 @@ class TestDateInferral(TestCase):
             res = relative_date_string_to_date(datestr, ref_date_str="10/30/2021")
             print(res, exp)
             assert res == exp
+
+
+# Test picking each user's submission around month ends
+class TestFindNearDates(TestCase):
+
+    def test_matches_find_near_date(self):
+        entries = {"gertlex": {datetime.date(2021, 9, 30): "a", datetime.date(2021, 10, 2): "b",
+                               datetime.date(2021, 10, 31): "c"},
+                   "other": {datetime.date(2021, 11, 3): "d", datetime.date(2021, 8, 30): "e"}}
+        targets = [datetime.date(2021, 10, 31), datetime.date(2021, 9, 30), datetime.date(2021, 8, 31)]
+        results = find_near_dates(entries, targets)
+        self.assertEqual(results, [find_near_date(entries, target) for target in targets])
+        self.assertEqual(results[1], {"gertlex": "b"})
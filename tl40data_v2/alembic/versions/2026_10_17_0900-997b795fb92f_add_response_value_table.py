@@ -0,0 +1,50 @@
+"""Add response_value table, one row per stat value of each response
+
+Revision ID: 997b795fb92f
+Revises: d6e989d814ae
+Create Date: 2026-10-17 09:00:12.481516
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = '997b795fb92f'
+down_revision = 'd6e989d814ae'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    response_value = op.create_table(
+        'response_value',
+        sa.Column('response_id', sa.Integer(), sa.ForeignKey('response.id'), primary_key=True),
+        sa.Column('stat_id', sa.Integer(), sa.ForeignKey('stat.id'), primary_key=True),
+        sa.Column('value', sa.Integer(), nullable=True),
+    )
+    op.create_index('ix_response_value_stat_id_value', 'response_value', ['stat_id', 'value'])
+
+    # Backfill from strdata. Plain SQL rather than the classes in tables.py, since those
+    # will keep changing after this migration is written.
+    bind = op.get_bind()
+    stat_ids = [row[0] for row in bind.execute(sa.text('SELECT id FROM stat ORDER BY order_idx'))]
+    responses = bind.execute(sa.text('SELECT id, strdata FROM response')).fetchall()
+    rows = []
+    for response_id, strdata in responses:
+        if strdata is None:
+            continue
+        for stat_id, val in zip(stat_ids, strdata.split(";")):
+            if val == "":
+                val = None
+            else:
+                try:
+                    val = int(val)
+                except ValueError:
+                    val = float(val)
+            rows.append({"response_id": response_id, "stat_id": stat_id, "value": val})
+    if rows:
+        op.bulk_insert(response_value, rows)
+
+
+def downgrade():
+    op.drop_index('ix_response_value_stat_id_value', table_name='response_value')
+    op.drop_table('response_value')
@@ -0,0 +1,40 @@
+"""Add numeric response.timestamp_epoch, and indexes for trainer/date lookups
+
+Revision ID: b5b4ae772015
+Revises: 997b795fb92f
+Create Date: 2026-10-17 10:30:41.207358
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'b5b4ae772015'
+down_revision = '997b795fb92f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    # A unique index can't be created while there are duplicates, so say which ones to clean up first.
+    duplicates = bind.execute(sa.text(
+        'SELECT name, COUNT(*) FROM trainer GROUP BY name HAVING COUNT(*) > 1')).fetchall()
+    if duplicates:
+        raise RuntimeError("Duplicate trainer names need merging (e.g. with sqlitebrowser) "
+                           f"before upgrading: {duplicates}")
+
+    op.add_column('response', sa.Column('timestamp_epoch', sa.Float(), nullable=True))
+    op.execute('UPDATE response SET timestamp_epoch = CAST(timestamp AS REAL)')
+
+    op.create_index('ix_response_timestamp_epoch', 'response', ['timestamp_epoch'])
+    op.create_index('ix_response_trainer_id_timestamp_epoch', 'response', ['trainer_id', 'timestamp_epoch'])
+    op.create_index('ix_trainer_name', 'trainer', ['name'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_trainer_name', table_name='trainer')
+    op.drop_index('ix_response_trainer_id_timestamp_epoch', table_name='response')
+    op.drop_index('ix_response_timestamp_epoch', table_name='response')
+    with op.batch_alter_table('response') as batch_op:
+        batch_op.drop_column('timestamp_epoch')
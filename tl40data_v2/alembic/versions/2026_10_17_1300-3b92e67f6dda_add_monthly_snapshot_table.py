@@ -0,0 +1,54 @@
+"""Add monthly_snapshot table, each trainer's latest response per survey month
+
+Revision ID: 3b92e67f6dda
+Revises: b5b4ae772015
+Create Date: 2026-10-17 13:00:27.915230
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '3b92e67f6dda'
+down_revision = 'b5b4ae772015'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    monthly_snapshot = op.create_table(
+        'monthly_snapshot',
+        sa.Column('trainer_id', sa.Integer(), sa.ForeignKey('trainer.id'), primary_key=True),
+        sa.Column('survey_month', sa.String(), primary_key=True),
+        sa.Column('response_id', sa.Integer(), sa.ForeignKey('response.id'), nullable=False),
+        sa.Column('timestamp_epoch', sa.Float(), nullable=False),
+        sa.Column('response_count', sa.Integer(), nullable=False),
+    )
+    op.create_index('ix_monthly_snapshot_survey_month', 'monthly_snapshot', ['survey_month'])
+
+    # Backfill. Plain SQL, and a copy of tables.survey_month(), since tables.py will keep changing.
+    bind = op.get_bind()
+    responses = bind.execute(sa.text('SELECT id, trainer_id, timestamp_epoch FROM response '
+                                     'WHERE timestamp_epoch IS NOT NULL ORDER BY id')).fetchall()
+    snapshots = {}
+    for response_id, trainer_id, timestamp_epoch in responses:
+        date = datetime.datetime.fromtimestamp(timestamp_epoch)
+        if date.day <= 3:
+            date = date.replace(day=1) - datetime.timedelta(days=1)
+        key = (trainer_id, date.strftime("%Y-%m"))
+        if key not in snapshots:
+            snapshots[key] = {"trainer_id": trainer_id, "survey_month": key[1], "response_id": response_id,
+                              "timestamp_epoch": timestamp_epoch, "response_count": 0}
+        snapshot = snapshots[key]
+        snapshot["response_count"] += 1
+        if timestamp_epoch >= snapshot["timestamp_epoch"]:
+            snapshot["response_id"] = response_id
+            snapshot["timestamp_epoch"] = timestamp_epoch
+    if snapshots:
+        op.bulk_insert(monthly_snapshot, list(snapshots.values()))
+
+
+def downgrade():
+    op.drop_index('ix_monthly_snapshot_survey_month', table_name='monthly_snapshot')
+    op.drop_table('monthly_snapshot')
@@ -0,0 +1,60 @@
+"""Add response.bindata, a compact binary copy of strdata
+
+Revision ID: 227e1418fc00
+Revises: 3b92e67f6dda
+Create Date: 2026-10-17 14:00:05.664120
+
+"""
+import struct
+
+from alembic import op
+import numpy as np
+import sqlalchemy as sa
+
+revision = '227e1418fc00'
+down_revision = '3b92e67f6dda'
+branch_labels = None
+depends_on = None
+
+
+def encode_v1(strdata):
+    """Version 1 of tables.encode_bindata(), copied here since tables.py will keep changing"""
+    values = []
+    for val in strdata.split(";"):
+        if val == "":
+            values.append(None)
+            continue
+        try:
+            values.append(int(val))
+        except ValueError:
+            values.append(float(val))
+    is_null = np.array([val is None for val in values], dtype=bool)
+    is_float = np.array([isinstance(val, float) for val in values], dtype=bool)
+    ints = np.array([val for val in values if val is not None and not isinstance(val, float)], dtype=np.int64)
+    floats = np.array([val for val in values if isinstance(val, float)], dtype="<f8")
+    int_dtypes = [np.dtype("<i1"), np.dtype("<i2"), np.dtype("<i4"), np.dtype("<i8")]
+    int_codes = sum(((ints < np.iinfo(dtype).min) | (ints > np.iinfo(dtype).max)).astype(np.uint8)
+                    for dtype in int_dtypes[:-1])
+    codes = np.zeros(len(values), dtype=np.uint8)
+    codes[~is_null & ~is_float] = int_codes
+    code_bits = ((codes[:, None] >> np.array([0, 1], dtype=np.uint8)) & 1).ravel()
+    return b"".join([struct.pack("<BH", 1, len(values)),
+                     np.packbits(is_null, bitorder="little").tobytes(),
+                     np.packbits(is_float, bitorder="little").tobytes(),
+                     np.packbits(code_bits, bitorder="little").tobytes()]
+                    + [ints[int_codes == code].astype(dtype).tobytes() for code, dtype in enumerate(int_dtypes)]
+                    + [floats.tobytes()])
+
+def upgrade():
+    op.add_column('response', sa.Column('bindata', sa.LargeBinary(), nullable=True))
+
+    bind = op.get_bind()
+    responses = bind.execute(sa.text('SELECT id, strdata FROM response WHERE strdata IS NOT NULL')).fetchall()
+    for response_id, strdata in responses:
+        bind.execute(sa.text('UPDATE response SET bindata = :bindata WHERE id = :id'),
+                     {"bindata": encode_v1(strdata), "id": response_id})
+
+
+def downgrade():
+    with op.batch_alter_table('response') as batch_op:
+        batch_op.drop_column('bindata')
@@ -4,12 +4,17 @@
 
 # Standard library
 import argparse
-import json
+import atexit
+from collections import namedtuple
+import functools
+import mimetypes
+import os
+import queue
 import sys
 from datetime import datetime
 
 # Third party
-from flask import request, flash, redirect, url_for, send_from_directory, jsonify
+from flask import request, flash, redirect, url_for, send_from_directory, jsonify, make_response
 from flask import Flask
 from flask import render_template
 from wtforms import Form, BooleanField, DecimalField, StringField, IntegerField, \
@@ -21,13 +26,16 @@ import matplotlib.pyplot as plt
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.exc import OperationalError
-from sqlalchemy import create_engine
 from sqlalchemy.engine import ExceptionContext
 
 # Local
-from tables import Stat, Response, Trainer
-from settings import LOCAL_DB_SPECIFIER, PLOT_DIR
+from config_cache import config_version, get_stat_help, get_stats, stat_kwargs
+from page_cache import PageCache
+from tables import Stat, Response, Trainer, response_saved_listeners
+from settings import INGEST_SPILL_PATH, LOCAL_DB_SPECIFIER, PLOT_DIR, get_engine
 from age_survey import register_age_survey_routes
+from static_assets import is_hashed_name, precompressed_variant
+from trainer_series import VIEW_TYPES, compare_columns, monthly_series, series_cache, view_points
 
 
 MEDALS = ["No medal", "Bronze", "Silver", "Gold", "Platinum"]
@@ -52,6 +60,17 @@ TYPE_MEDALS = ["Schoolkid",  # This list's fields get put at the very end of the
               ]
 
 app = Flask(__name__)
+ingester = None  # ingest.SubmissionIngester when run with --async-ingest
+
+STATIC_PAGES_DIR = 'static'  # the generated leaderboard pages and assets, uploaded from html/
+HASHED_ASSET_MAX_AGE = 365 * 24 * 3600  # content-hashed names never change content
+PAGE_MAX_AGE = 3600  # then revalidated with the ETag; a month's page can be regenerated after late submissions
+# Rendered survey pages; see survey_page_key(). Saving a response drops the trainer's pages, and
+# the TTL bounds how long edits made outside the app (e.g. db_editor.py) go unnoticed
+SURVEY_PAGE_CACHE_SIZE = 256
+SURVEY_PAGE_CACHE_TTL = 600  # seconds
+survey_page_cache = PageCache(SURVEY_PAGE_CACHE_SIZE, SURVEY_PAGE_CACHE_TTL)
+MAX_COMPARE_TRAINERS = 20  # per /api/compare request
 
 
 def get_survey_data_in_survey_order(session, user=None):
@@ -84,17 +103,10 @@ def get_survey_data_in_survey_order(session, user=None):
     stats_list = []  # list of lists, each sublist is [index, Stat, previous_val]; previous_val gets set later
     # For now, load from json. The json is a list in a hand-chosen desired order.
     # This means we can update the order (in the json file), without updating/migrating the database.
-    static_stat_info = json.load(open("stats.json", 'r'))  # dict
-    stat_keys = static_stat_info["key"]  # list
-    stat_vals = static_stat_info["data"]  # dict keyed by Stat Names
-    for cnt, stat_name in enumerate(stat_vals):
-        # Create stat data dict but exclude 'category' field since it's not in the Stat model
-        stat_data = dict(zip(stat_keys, stat_vals[stat_name]))
-        if 'category' in stat_data:
-            del stat_data['category']
-
+    stats_config = get_stats()  # parsed once; see config_cache.py
+    for cnt, stat_info in enumerate(stats_config.stats):
         stats_list.append([cnt,  # index to sort by later
-                           Stat(name=stat_name, **stat_data),
+                           Stat(name=stat_info.name, **stat_kwargs(stat_info)),
                            0,  # previous value
                            ])
 
@@ -119,20 +131,19 @@ def get_survey_data_in_survey_order(session, user=None):
 
     # Calculate offsets for each stat category
     # For each stat category, iterate through its badge amounts, calculating offsets based on previous stat amount.
-    # Use cnt as index in stats_list, generated from stats_vals.
-    for cnt, key in enumerate(stat_vals):  # iterate through the entries loaded from json
+    # Use cnt as index in stats_list, generated from stats_config.stats.
+    for cnt, stat_info in enumerate(stats_config.stats):  # iterate through the entries loaded from json
         # Note: key is e.g. "Unique Species Caught"
-        x = stat_vals[key]
-        statname = x[7]
+        key = stat_info.name
+        thresholds = stat_info.thresholds  # bronze, silver, gold, platinum
         try:
-            # The keys for trainer_data are actually tuples...  # TODO 1-2025: reading code, this claim seems wrong
-            previousval = trainer_data[(key,)]
+            previousval = trainer_data[key]
             if previousval == '':  # Trying to load a new field that is not in the previous response's strdata
                 previousval = 0
             else:
                 previousval = int(previousval) # TODO int or float support
         except ValueError as e:
-            previousval = float(trainer_data[(key,)])  # Technically we could do this always
+            previousval = float(trainer_data[key])  # Technically we could do this always
         except KeyError:
             print("Missing key:", key)  # Stat/key is not in DB; but should be added by next survey submission.
             previousval = 0
@@ -141,7 +152,7 @@ def get_survey_data_in_survey_order(session, user=None):
             previousval = 0
 
         # Calculate order offsets used for ordering of survey items
-        bronze_thresh = x[1]
+        bronze_thresh = thresholds[0]
         if bronze_thresh == 0:  # 0 indicates NO MEDALS for this stat
             # Always put these medal-less stats at top of render order
             order_offset = 0
@@ -150,7 +161,7 @@ def get_survey_data_in_survey_order(session, user=None):
             # TODO(enhancement): If a state is zero, set the order_offset even higher...
             order_offset = 400
             medal_idx = 1  # 1/2/3/4/5 none/bronze/silver/gold/platinum
-            while medal_idx < 5 and previousval >= x[medal_idx]:
+            while medal_idx < 5 and previousval >= thresholds[medal_idx - 1]:
                 order_offset -= 100
                 medal_idx += 1
             medal_name = f"({MEDALS[medal_idx-1]})"
@@ -198,30 +209,54 @@ class RegistrationForm(Form):
 def load_stats():
     return []
 
-class PogoStatsForm(Form):
-    """Form class used for the survey fields. See survey_gen()."""
-    pass
+# Distinct survey layouts whose form classes are kept around; see survey_form_class()
+SURVEY_FORM_CACHE_SIZE = 64
 
+# A survey field's part of the layout, i.e. everything its form class field depends on.
+# maxed: the trainer's previous value is the stat's maximum, so the field is prefilled with it
+# optional: a required == 0 stat that isn't maxed
+SurveyFieldLayout = namedtuple("SurveyFieldLayout",
+                               ["icon", "name", "numtype", "maximum", "divider", "maxed", "optional"])
 
-def survey_gen(stats_list, formclass, _test_default_val=None):
-    """Sets survey fields as attrs on form object
 
-    Also inserts sectional breaks.
+class PogoStatsForm(Form):
+    """Form class used for the survey fields. See survey_form_class().
+
+    Instantiate with the trainer's previous_values from survey_layout(): the per-trainer
+    placeholders and lower limits aren't part of the (shared) form class.
+    """
+    def __init__(self, formdata=None, previous_values=None, **kwargs):
+        super().__init__(formdata, **kwargs)
+        for icon, (previous_val_str, minimum) in (previous_values or {}).items():
+            field = self[icon]
+            field.render_kw = {"inputmode": "numeric", "type": "number",
+                               "placeholder": previous_val_str,
+                               "previous_val_with_badge": previous_val_str,  # unused
+                               }
+            # The class's NumberRange has no minimum; this trainer can't go below their last survey
+            number_range = validators.NumberRange(min=minimum, max=field.validators[-1].max)
+            field.validators = list(field.validators[:-1]) + [number_range]
+            field.flags.min = minimum
+
+
+def survey_layout(stats_list, _test_default_val=None):
+    """Split the survey for a trainer into its layout, shared by trainers with the same medal tiers,
+    and the trainer's own previous values
 
     Stats with "required = -1" are not not included in the form (survey).
 
     Args:
         stats_list: list of Stat objects. Each list will drive a input field on the form.
             The order of the list determines the order of the fields on the form.
-        formclass: Class of a form object.
         _test_default_val: Default value for all fields. Normally set by
             test code.
 
     Returns:
-        A formclass with attributes set, ready to be instantiated.
+        layout: Hashable; (tuple of SurveyFieldLayout in survey order, _test_default_val)
+        previous_values: dict by stat icon of (previous value string, e.g. "123 (Gold)", minimum value)
     """
-    statlist = []  # lookup of attribute names on the FormClass which hold Field objects
-    statdivider = []  # list of booleans: when True, jinja2 template script will add a divider after the stat
+    fields = []
+    previous_values = {}
     # TODO(enhancement) this is stupidly brittle? Every time I add a new non-badge stat...? or if we get too many badges
     # See also shenanigans around line 150 above.
     sections = [20, 100, 200, 300, 400, 500, 600, 700, 800, 900, 10000]
@@ -238,71 +273,74 @@ def survey_gen(stats_list, formclass, _test_default_val=None):
             previous_val = int(previous_val_str.split()[0])
         #print(section_idx, order, stat.icon)
         if order > sections[section_idx]:
-            statdivider.append(True)
+            divider = True
             while order > sections[section_idx]:
                 section_idx += 1
         else:
-            statdivider.append(False)
+            divider = False
 
         #print(stat.name, previous_val_str)
         if stat.name == 'Trainer Level':
             minimum = max(40, previous_val)
         elif stat.monotonic:
-            try:
-                minimum = previous_val  # todo floats
-            except:
-                minimum = 0
+            minimum = previous_val  # todo floats
         else:
             minimum = 0
-        checks = [validators.NumberRange(min=minimum,
-                                         max=stat.maximum if stat.maximum > 0 else None)
-                     ]
-        default_val = _test_default_val
-        if previous_val == stat.maximum:  # Note there are no stats with maximums that are also float values.
-            # Fill in the field for already-maxed stats.
-            default_val = previous_val
-        elif stat.required == 0:
+        # Note there are no stats with maximums that are also float values.
+        maxed = previous_val == stat.maximum
+        # We cast str on stat.icon, otherwise we actually have a sqlalchemy object, and this causes
+        # thread issues with sqlite at render time.  (This theory didn't prove correct)
+        icon = str(stat.icon)
+        fields.append(SurveyFieldLayout(icon, stat.name, stat.numtype, stat.maximum, divider, maxed,
+                                        not maxed and stat.required == 0))
+        previous_values[icon] = (previous_val_str, minimum)
+    return (tuple(fields), _test_default_val), previous_values
+
+
+@functools.lru_cache(maxsize=SURVEY_FORM_CACHE_SIZE)
+def survey_form_class(layout):
+    """A PogoStatsForm subclass with a field per stat of a survey_layout() layout
+
+    Built once per distinct layout (most trainers share a few), and never modified afterwards,
+    so concurrent requests can share it. Also inserts sectional breaks.
+
+    Returns:
+        A form class, ready to be instantiated with the trainer's previous_values
+    """
+    fields, _test_default_val = layout
+
+    class SurveyForm(PogoStatsForm):
+        pass
+
+    for field_layout in fields:
+        # The minimum is set per trainer at instantiation; see PogoStatsForm
+        checks = [validators.NumberRange(min=None,
+                                         max=field_layout.maximum if field_layout.maximum > 0 else None)
+                  ]
+        # Fill in the field for already-maxed stats.
+        default_val = field_layout.maximum if field_layout.maxed else _test_default_val
+        if field_layout.optional:
             checks = [validators.Optional()] + checks
-        if stat.numtype == "Float":
+        if field_layout.numtype == "Float":
             # TODO fix float input here?
             # Per wtforms docs, DecimalField is usually preferred over FloatField
-            print("FLOAT BOX:", stat.name)
-            field = DecimalField(stat.name, validators=checks,
-                                 default=default_val,
-                                 render_kw={"inputmode": "numeric", "type": "number",
-                                            "placeholder": previous_val_str,
-                                            "previous_val_with_badge": previous_val_str,  # unused
-                                            },
-                                 )
+            field = DecimalField(field_layout.name, validators=checks, default=default_val)
         else:
-            field = IntegerField(stat.name, validators=checks,
-                                 default=default_val, # Could use this but it fills a valid value. Use render_kw["placeholder"] instead
-                                 render_kw={"inputmode": "numeric", "type": "number",
-                                            "placeholder": previous_val_str,
-                                            "previous_val_with_badge": previous_val_str,  # unused
-                                            },
-                                 )
+            # Could use default but it fills a valid value. Placeholders are used instead
+            field = IntegerField(field_layout.name, validators=checks, default=default_val)
         # Set the field object on our form, which will later generate the HTML
-        # We cast str on stat.icon, otherwise we actually have a sqlalchemy object, and this causes
-        # thread issues with sqlite at render time.  (This theory didn't prove correct)
-        setattr(formclass, str(stat.icon), field)  # using icon because name has spaces in it
-        # Order of newly added attrs is preserved in statlist
-        statlist.append(stat.icon)
+        setattr(SurveyForm, field_layout.icon, field)  # using icon because name has spaces in it
 
-    setattr(formclass, "statlist", statlist)
-    setattr(formclass, "statdivider", statdivider)
+    # Order of the stats, and whether the jinja2 template script will add a divider before each
+    SurveyForm.statlist = tuple(field_layout.icon for field_layout in fields)
+    SurveyForm.statdivider = tuple(field_layout.divider for field_layout in fields)
     # https://gaming.stackexchange.com/a/281007
-    trainername = StringField('Trainer Name',
-                              validators=[validators.Length(min=4, max=15),
-                                          validators.Regexp(regex=r"^[\w\d]+$",
-                                                            message="Trainer name can only be letters and numbers"),
-                                  ])
-    formclass.trainername = trainername
-    #print(type(formclass.statlist), formclass.statlist)
-    #setattr(form,
-    #form = formclass()
-    #return form #formclass()
-    return formclass
+    SurveyForm.trainername = StringField('Trainer Name',
+                                         validators=[validators.Length(min=4, max=15),
+                                                     validators.Regexp(regex=r"^[\w\d]+$",
+                                                                       message="Trainer name can only be letters and numbers"),
+                                             ])
+    return SurveyForm
 
 
 @app.template_filter()
@@ -311,11 +349,34 @@ def printx(*args):
     print(*args)
     return ''
 
+def send_precompressed(filename, directory=None):
+    """send_from_directory(), but sending the .br/.gz copy (see static_assets.py) if the client accepts it
+
+    With cache headers: content-hashed assets may be kept for a year, anything else for PAGE_MAX_AGE.
+    """
+    directory = os.path.join(app.root_path, directory or STATIC_PAGES_DIR)
+    encoding, variant = precompressed_variant(directory, filename, request.accept_encodings)
+    if encoding:
+        mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+        response = send_from_directory(directory, variant, mimetype=mimetype)
+        response.headers["Content-Encoding"] = encoding
+    else:
+        response = send_from_directory(directory, filename)
+    response.vary.add("Accept-Encoding")
+    response.cache_control.public = True
+    if is_hashed_name(filename):
+        response.cache_control.max_age = HASHED_ASSET_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = PAGE_MAX_AGE
+    return response
+
+
 @app.route("/<month>")
 def stats_previous(month=None):
     """month is something like 2022-3"""
     # Should load the previous month's stats
-    return send_from_directory('static', month)
+    return send_precompressed(month)
 
 # Not sure this is necessary
 @app.route("/static/<month>")
@@ -328,7 +389,7 @@ def stats_previous_from_static(month=None):
     # Note 10-13-2023: this might not be working? Missing static/scroll2.js...
     #return send_from_directory('/static', month)
     # 10-13-2023: Trying this again:
-    return send_from_directory('static', month)
+    return send_precompressed(month)
     #  this might work better?
     # Nope
     #return redirect(f"/{month}")
@@ -338,7 +399,7 @@ def stats_previous_from_static(month=None):
 
 @app.route("/")
 def stats():
-    return send_from_directory('static', 'index.html')
+    return send_precompressed('index.html')
 
 
 # TODO not implemented
@@ -367,6 +428,38 @@ def register():
                            zip=zip, type=type, print=print,
                            )
 
+def survey_page_key(session, user):
+    """Everything a GET of the survey page depends on, for survey_page_cache
+
+    Returns:
+        (trainer name (lowercase), user as given (it prefills the form), id of the trainer's newest
+        response, stat table schema version, stats.json/stat_help.json version)
+    """
+    trainer = user.lower() if user else ""
+    newest_response = None
+    if user:
+        newest_response = session.query(Trainer.newest_response).filter(Trainer.name == trainer).scalar()
+    return trainer, user, newest_response, Stat.get_schema(session).version, config_version()
+
+
+def forget_trainer_caches(trainer):
+    """Drop a trainer's cached survey pages and stat series; called whenever Response.save_response saves one of theirs"""
+    survey_page_cache.invalidate_trainer(trainer)
+    series_cache.invalidate_trainer(trainer)
+
+
+response_saved_listeners.append(forget_trainer_caches)
+
+
+def cached_page_response(page):
+    """Response for a page_cache.CachedPage, or 304 Not Modified if the browser's copy is current"""
+    response = make_response(page.html)
+    response.set_etag(page.etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True  # i.e. revalidate with the ETag each time
+    return response.make_conditional(request)
+
+
 @app.route('/survey/<username>', methods=['GET', 'POST'])
 def fill_survey_for_user(username=None):
     # TODO sanitize the username string? Check: What does the decorator do already?
@@ -377,17 +470,32 @@ def fill_survey_for_user(username=None):
 def fill_survey(user=None):
     # Generate a stats list, either default order, or order by user's badge levels if known
     session = Session(engine, autoflush=True)
+    # Pick up stat table changes from e.g. fill_static_tables.py + push_db.bash without a restart
+    Stat.get_schema(session, revalidate=True)
+
+    # A GET of the page is served from the cache until the trainer submits again (or the stats change)
+    try:
+        is_get = request.method == 'GET'
+    except RuntimeError:  # e.g. --test-get-survey-data, outside of a request
+        is_get = False
+    page_key = None
+    if is_get:
+        page_key = survey_page_key(session, user)
+        page = survey_page_cache.get(page_key)
+        if page is not None:
+            session.close()
+            return cached_page_response(page)
+
     stats_list = get_survey_data_in_survey_order(session=session, user=user)
 
     # Load help text for stats
-    try:
-        stat_help = json.load(open("stat_help.json", 'r'))
-    except FileNotFoundError:
-        stat_help = {}
+    stat_help = get_stat_help()
 
-    PogoForm = survey_gen(stats_list, PogoStatsForm)
+    # The form class is only built for a layout (stat order and medal tiers) not seen recently
+    layout, previous_values = survey_layout(stats_list)
+    PogoForm = survey_form_class(layout)
     try:
-        form = PogoForm(request.form)
+        form = PogoForm(request.form, previous_values=previous_values)
         real_function_call = True  # TODO cleanup
         # These are debug stuff...
         print("")
@@ -395,7 +503,7 @@ def fill_survey(user=None):
             print(request.values)
     except RuntimeError:  # likely "Working outside of request context"
         # Presumably this is because we're testing stuff and request isn't defined.
-        form = PogoForm()
+        form = PogoForm(previous_values=previous_values)
         real_function_call = False  # TODO cleanup
 
     # Prefill trainername field
@@ -422,10 +530,16 @@ def fill_survey(user=None):
             # Display save success
             # Redirect to user history page
         if session:  # is set up
-            response = Response.save_response(session, response_values=request.values)
-            print(response)
-            session.commit()
-            session.flush()
+            queued = False
+            if ingester is not None:
+                try:
+                    ingester.submit(request.values.to_dict())
+                    queued = True
+                except queue.Full:
+                    print("Ingest queue full; saving synchronously", file=sys.stderr)
+            if not queued:
+                response = Response.save_response(session, response_values=request.values)
+                print(response)
 
             # Submission page
             # <pre> tags preserve the tab characters, so users can paste data into spreadsheets
@@ -466,6 +580,8 @@ def fill_survey(user=None):
     except:
         pass
 
+    if page_key is not None:
+        return cached_page_response(survey_page_cache.put(page_key, html_out))
     return html_out
 
 
@@ -478,31 +594,13 @@ def trainer_visualization():
         trainers = session.query(Trainer.name).distinct().order_by(Trainer.name).all()
         trainer_names = [t.name for t in trainers]
 
-        # Load stats from JSON and extract categories
-        with open('stats.json', 'r') as f:
-            stats_data = json.load(f)
-
-        # Parse stats with categories
-        stats = []
-        categories = set()
-        for stat_name, stat_info in stats_data['data'].items():
-            # Get category (last item in the array)
-            if len(stat_info) >= 10:  # has category field
-                category = stat_info[9]
-            else:
-                category = "General"  # fallback
-
-            categories.add(category)
-            stats.append({
-                'name': stat_name,
-                'icon': stat_info[8],  # icon field
-                'category': category
-            })
+        # Stats (with .name, .icon and .category) and their categories, from stats.json
+        stats_config = get_stats()
 
         return render_template('trainer_visualization.html',
                              trainers=trainer_names,
-                             stats=stats,
-                             categories=sorted(categories))
+                             stats=stats_config.stats,
+                             categories=stats_config.categories)
     finally:
         session.close()
 
@@ -529,72 +627,25 @@ def get_trainer_stats():
         start_timestamp = datetime.strptime(start_date, '%Y-%m-%d').timestamp()
         end_timestamp = datetime.strptime(end_date + ' 23:59:59', '%Y-%m-%d %H:%M:%S').timestamp()
 
-        # Get all responses for this trainer in the date range
-        responses = session.query(Response).filter(
-            Response.trainer_id == trainer.id,
-            Response.timestamp >= str(start_timestamp),
-            Response.timestamp <= str(end_timestamp)
-        ).order_by(Response.timestamp).all()
+        # Refresh the stat table's schema first, so the cached series see any new stats
+        Stat.get_schema(session, revalidate=True)
+        # The trainer's latest response of each calendar month, among those in the date range
+        series = monthly_series(series_cache.get(session, trainer.id, trainer.name, stat_names),
+                                start_timestamp, end_timestamp)
 
-        if not responses:
+        if not series.months:
             return jsonify({'error': 'No data found for the selected date range'}), 404
 
-        if len(responses) < 2 and view_type in ['increments', 'rate']:
+        if len(series.months) < 2 and view_type in ['increments', 'rate']:
             return jsonify({'error': 'At least 2 data points required for incremental/rate views'}), 400
 
-        # Get stat names in database order to parse strdata
-        stat_names_ordered = [s[0] for s in session.query(Stat.name).order_by(Stat.order_idx).all()]
-
-        # Group responses by month and extract requested stats
-        monthly_data = {}
-
-        for response in responses:
-            # Convert timestamp to datetime and extract year-month
-            response_dt = datetime.fromtimestamp(float(response.timestamp))
-            month_key = response_dt.strftime('%Y-%m')
-
-            # Parse strdata to get individual stat values
-            stat_values = response.strdata.split(';')
-            stat_dict = dict(zip(stat_names_ordered, stat_values))
-
-            # Store the latest response for each month (in case multiple submissions per month)
-            if month_key not in monthly_data or response.timestamp > monthly_data[month_key]['timestamp']:
-                monthly_data[month_key] = {
-                    'timestamp': response.timestamp,
-                    'stats': stat_dict
-                }
-
         # Build results for each requested stat
         results = []
         for stat_name in stat_names:
-            if stat_name not in stat_names_ordered:
+            if stat_name not in series.values:
                 continue
 
-            data_points = []
-            prev_value = None
-
-            # Sort months chronologically
-            for month in sorted(monthly_data.keys()):
-                try:
-                    value = float(monthly_data[month]['stats'][stat_name])
-                except (ValueError, KeyError):
-                    value = 0
-
-                if view_type == 'increments':
-                    if prev_value is not None:
-                        # Monthly change - skip first data point
-                        data_points.append([month, value - prev_value])
-                elif view_type == 'rate':
-                    if prev_value is not None and prev_value > 0:
-                        # Growth rate percentage - skip first data point
-                        rate = ((value - prev_value) / prev_value) * 100
-                        data_points.append([month, rate])
-                else:
-                    # Absolute values (always include all data points)
-                    data_points.append([month, value])
-
-                prev_value = value
-
+            data_points = view_points(series.months, series.values[stat_name], view_type)
             if data_points:
                 results.append({
                     'stat_name': stat_name,
@@ -621,6 +672,79 @@ def get_trainer_stats():
         session.close()
 
 
+
+@app.route('/api/compare', methods=['POST'])
+def compare_trainers():
+    """API endpoint to fetch several trainers' statistics at once, in columns on one month axis
+
+    Takes trainer_names (a list) and otherwise the same JSON as /api/trainer-stats. Returns
+    months, trainer_names and stat_names (those found), missing_trainers, and columns:
+    {trainer_name, stat_name, values} per trainer and stat, values lined up with months.
+    """
+    session = Session(engine, autoflush=True)
+    try:
+        data = request.get_json()
+        stat_names = data['stat_names']
+        start_date = data['start_date']
+        end_date = data['end_date']
+        view_type = data.get('view_type', 'absolute')
+        if not isinstance(data['trainer_names'], list):
+            return jsonify({'error': 'trainer_names must be a list'}), 400
+        count_error = f'Between 1 and {MAX_COMPARE_TRAINERS} trainers can be compared'
+        requested_names = []  # unique, in the order given
+        seen = set()  # lowercase
+        for name in data['trainer_names']:
+            if not isinstance(name, str):
+                return jsonify({'error': 'trainer_names must be a list of names'}), 400
+            if name.lower() not in seen:
+                seen.add(name.lower())
+                requested_names.append(name)
+                if len(requested_names) > MAX_COMPARE_TRAINERS:  # stop before reading the rest
+                    return jsonify({'error': count_error}), 400
+        if not requested_names:
+            return jsonify({'error': count_error}), 400
+        if view_type not in VIEW_TYPES:
+            return jsonify({'error': f'Unknown view type {view_type}'}), 400
+
+        # Find the trainers
+        trainer_ids = dict(session.query(Trainer.name, Trainer.id)
+                                  .filter(Trainer.name.in_([name.lower() for name in requested_names])))
+        trainer_names = [name for name in requested_names if name.lower() in trainer_ids]
+        missing_trainers = [name for name in requested_names if name.lower() not in trainer_ids]
+        if not trainer_names:
+            return jsonify({'error': 'Trainer not found', 'missing_trainers': missing_trainers}), 404
+
+        # Convert date strings to timestamps for comparison
+        start_timestamp = datetime.strptime(start_date, '%Y-%m-%d').timestamp()
+        end_timestamp = datetime.strptime(end_date + ' 23:59:59', '%Y-%m-%d %H:%M:%S').timestamp()
+
+        # Refresh the stat table's schema first, so the cached series see any new stats
+        Stat.get_schema(session, revalidate=True)
+        series = series_cache.get_many(session, [(trainer_ids[name.lower()], name.lower()) for name in trainer_names],
+                                       stat_names)
+        months, columns = compare_columns({name: monthly_series(series[name.lower()], start_timestamp, end_timestamp)
+                                           for name in trainer_names},
+                                          stat_names, view_type)
+        if not months:
+            return jsonify({'error': 'No data found for the selected date range'}), 404
+
+        return jsonify({
+            'months': months,
+            'trainer_names': trainer_names,
+            'stat_names': list(dict.fromkeys(column['stat_name'] for column in columns)),
+            'missing_trainers': missing_trainers,
+            'columns': columns,
+        })
+
+    except Exception as e:
+        print(f"Error in compare_trainers: {e}", file=sys.stderr)
+        import traceback
+        traceback.print_exc()
+        return jsonify({'error': str(e)}), 500
+    finally:
+        session.close()
+
+
 #@app.route('/test_survey/', methods=['GET', 'POST'])
 #def fill_test_survey():
 #    # Generate a stats list, either default order, or order by user's badge levels if known
@@ -708,13 +832,16 @@ if __name__ == '__main__':
                         help="Test just the loading of the survey data, to verify e.g. "
                         "it's in the order expected.")
     parser.add_argument("--test-user", action='store', default=None)
+    parser.add_argument("--async-ingest", action='store_true',
+                        help="Queue survey submissions for a single db writer thread, rather than "
+                        "saving them in the request thread. See ingest.py.")
     args = parser.parse_args()
 
     if True: # Later can support alternate
         db_specifier = LOCAL_DB_SPECIFIER
         print(f"Using: {LOCAL_DB_SPECIFIER}")
 
-    engine = create_engine(db_specifier)
+    engine = get_engine(db_specifier)
 
     if args.test_get_survey_data:
         # Why autoflush?
@@ -727,6 +854,12 @@ if __name__ == '__main__':
     # Register age survey routes
     register_age_survey_routes(app, engine)
 
+    if args.async_ingest:
+        from ingest import SubmissionIngester
+        ingester = SubmissionIngester(engine, INGEST_SPILL_PATH)
+        ingester.start()
+        atexit.register(ingester.stop)
+
     try:
         app.run()
     except (BaseException, Exception) as e:
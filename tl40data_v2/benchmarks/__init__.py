@@ -0,0 +1,6 @@
+"""Benchmarks for the survey app, the DB layer and dashboard generation.
+
+Run from the tl40data_v2 directory (they read stats.json etc. from there), e.g.
+
+    python3 -m benchmarks.bench_engine
+"""
@@ -0,0 +1,137 @@
+#! /usr/bin/env python3
+
+"""Storage size and full-table decode time of Response.strdata vs. Response.bindata
+
+Fills a scratch db with synthetic responses (random values within each stat's usual range, from
+stats.json), then compares:
+  - bytes of strdata vs. bindata, and the size of a VACUUMed db holding only one of the two
+  - reading every response and decoding it to a matrix: Stat.unpack_strdata_many vs. unpack_bindata_many
+  - decoding one response at a time: Stat.unpack_strdata vs. decode_bindata
+
+    python3 -m benchmarks.bench_codec --responses 20000
+"""
+
+# Standard library
+from argparse import ArgumentParser
+import json
+import os
+import random
+import sqlite3
+import tempfile
+
+# Third party
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Local
+from benchmarks.common import Timer, make_benchmark_db
+from settings import get_engine
+from tables import Response, Stat, Trainer, decode_bindata
+
+
+def synthetic_strdata(rng, stat_info):
+    """One response's strdata, with values roughly the size real ones are"""
+    vals = []
+    for stat in stat_info:
+        if stat["numtype"] == "Float":
+            vals.append(str(round(rng.uniform(0, 50000), 1)))
+        elif stat["icon"] == "total_xp":
+            vals.append(str(rng.randint(10 ** 7, 10 ** 9)))
+        elif stat["maximum"] > 0:
+            vals.append(str(rng.randint(0, stat["maximum"])))
+        elif rng.random() < 0.05:
+            vals.append("")
+        else:
+            vals.append(str(rng.randint(0, 10 ** rng.randint(1, 5))))
+    return ";".join(vals)
+
+
+def db_size_with_only(db_path, column, tmpdir):
+    """Size in bytes of a VACUUMed copy of the db whose response table keeps only one of strdata/bindata"""
+    other = "bindata" if column == "strdata" else "strdata"
+    copy_path = os.path.join(tmpdir, f"only_{column}.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"VACUUM INTO '{copy_path}'")
+    conn.close()
+    conn = sqlite3.connect(copy_path)
+    conn.execute(f"UPDATE response SET {other} = NULL")
+    conn.execute("DROP TABLE IF EXISTS response_value")  # the same either way; keep the comparison focused
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(copy_path)
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    static_stat_info = json.load(open("stats.json", 'r'))
+    stat_info = [dict(zip(static_stat_info["key"], vals), name=name)
+                 for name, vals in static_stat_info["data"].items()]
+
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmpdir:
+        db_path = os.path.join(tmpdir, "bench.db")
+        engine = get_engine(make_benchmark_db(db_path))
+        session = Session(engine)
+        assert len(Stat.get_schema(session)) == len(stat_info)
+        trainers = [Trainer(name=f"trainer{idx}", proper_name=f"Trainer{idx}") for idx in range(args.trainers)]
+        session.add_all(trainers)
+        session.flush()
+        rows = []
+        for idx in range(args.responses):
+            strdata = synthetic_strdata(rng, stat_info)
+            timestamp = str(1600000000.0 + 3600 * idx)
+            rows.append({"trainer_id": trainers[idx % args.trainers].id, "timestamp": timestamp,
+                         "timestamp_epoch": float(timestamp), "strdata": strdata,
+                         "bindata": Response.bindata_from_strdata(strdata)})
+        session.execute(Response.__table__.insert(), rows)
+        session.commit()
+
+        strdata_bytes, bindata_bytes = session.execute(
+            text("SELECT SUM(LENGTH(CAST(strdata AS BLOB))), SUM(LENGTH(bindata)) FROM response")).one()
+
+        # Warm the schema cache and sqlite's page cache, so both sides start equal
+        session.execute(text("SELECT COUNT(strdata), COUNT(bindata) FROM response")).one()
+        with Timer() as strdata_many:
+            matrix_s = Stat.unpack_strdata_many(
+                session.query(Response.id, Response.trainer_id, Response.timestamp, Response.strdata).all(),
+                session, pad_data=True)
+        with Timer() as bindata_many:
+            matrix_b = Stat.unpack_bindata_many(
+                session.query(Response.id, Response.trainer_id, Response.timestamp, Response.bindata).all(),
+                session)
+        assert (matrix_s.values == matrix_b.values).all() and (matrix_s.missing == matrix_b.missing).all()
+
+        width = len(stat_info)
+        strdatas = [row["strdata"] for row in rows]
+        blobs = [row["bindata"] for row in rows]
+        with Timer() as strdata_each:
+            for strdata in strdatas:
+                Stat.unpack_strdata(strdata, session, pad_data=True)
+        with Timer() as bindata_each:
+            for blob in blobs:
+                decode_bindata(blob, width)
+        session.close()
+        engine.dispose()
+
+        strdata_db = db_size_with_only(db_path, "strdata", tmpdir)
+        bindata_db = db_size_with_only(db_path, "bindata", tmpdir)
+
+    n = args.responses
+    print(f"{n} responses x {width} stats")
+    print(f"    column bytes:  strdata {strdata_bytes / n:.0f} B/response, bindata {bindata_bytes / n:.0f} "
+          f"B/response ({bindata_bytes / strdata_bytes:.0%})")
+    print(f"    db file:       strdata-only {strdata_db / 1e6:.2f} MB, bindata-only {bindata_db / 1e6:.2f} MB "
+          f"({bindata_db / strdata_db:.0%})")
+    print(f"    query + decode all to matrix: strdata {strdata_many.elapsed:.3f} s, "
+          f"bindata {bindata_many.elapsed:.3f} s")
+    print(f"    decode one at a time:         strdata {1e6 * strdata_each.elapsed / n:.1f} us, "
+          f"bindata {1e6 * bindata_each.elapsed / n:.1f} us")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--responses", type=int, default=20000, help="Default: %(default)s")
+    parser.add_argument("--trainers", type=int, default=500, help="Default: %(default)s")
+    parser.add_argument("--seed", type=int, default=0, help="Default: %(default)s")
+    parser.add_argument("--tmpdir", default=None, help="Where to put the scratch db files")
+    main(parser.parse_args())
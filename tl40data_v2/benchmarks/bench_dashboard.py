@@ -0,0 +1,253 @@
+#! /usr/bin/env python3
+
+"""End-to-end dashboard_html_from_db.py run on a synthetic db, timed phase by phase
+
+Builds a db with benchmarks/synthetic_db.py (or uses --db-file), then runs the same steps as
+dashboard_html_from_db.main() for the last 12 months, timing each one:
+
+    load                 load_entries_from_db()
+    add_monthly_changes  MONTHLY_CHANGES_FUNCTIONS[--monthly-changes]
+    find_near_date       SubmissionIndex.find_near_dates() for every month
+    tables               compute_monthly_tables(), except for its ranking step
+    ranking              ranking.rank_leaderboards(), inside compute_monthly_tables()
+    serialize            each month's HTML (--renderer) and JSON data, as strings
+    write                the pages and data files to disk
+    precompress          static_assets.precompress_dir() on them
+
+Times are the best of --repeat runs, without tracemalloc running; the peak traced memory of each
+phase comes from one more run with tracemalloc on. The results, with the db's size and the git
+commit, are appended to --results (a JSON list of runs), and compared with the previous run there
+with the same settings, so regressions show up over time.
+
+    python3 -m benchmarks.bench_dashboard --trainers 3000 --months 60 --repeat 3
+"""
+
+# Standard library
+from argparse import ArgumentParser
+import datetime
+import json
+import os
+import resource
+import subprocess
+import tempfile
+import tracemalloc
+from unittest import mock
+
+# Third party
+from dateutil.relativedelta import relativedelta
+
+# Local
+from benchmarks.common import Timer, quiet
+from benchmarks.synthetic_db import add_arguments, build_synthetic_db, synthetic_db_kwargs
+from dashboard_html_from_db import (LeaderboardRenderer, MONTHLY_CHANGES_FUNCTIONS, compute_monthly_tables,
+                                    load_entries_from_db, month_data, render_month_page, report_fields_path)
+import ranking
+from settings import local_db_specifier_from_file
+from static_assets import precompress_dir
+from submission_index import SubmissionIndex
+
+PHASES = ["load", "add_monthly_changes", "find_near_date", "tables", "ranking", "serialize", "write",
+          "precompress"]
+RESULTS_VERSION = 1
+
+
+class PhaseRecorder():
+    """Accumulates time, and with tracemalloc running the peak traced memory, per phase
+
+    A phase can be entered while another is running (ranking, inside tables); the outer phase's
+    time then excludes the inner one's.
+    """
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.seconds = {phase: 0.0 for phase in PHASES}
+        self.peak_bytes = {phase: 0 for phase in PHASES}
+        self.stack = []  # [phase, time spent in phases entered meanwhile] per running phase
+
+    def run(self, phase, func, *args, **kwargs):
+        if self.trace_memory and not self.stack:
+            tracemalloc.reset_peak()
+        self.stack.append([phase, 0.0])
+        with Timer() as timer:
+            result = func(*args, **kwargs)
+        _, nested = self.stack.pop()
+        self.seconds[phase] += timer.elapsed - nested
+        if self.stack:
+            self.stack[-1][1] += timer.elapsed
+        if self.trace_memory:
+            # Traced memory includes everything still held from earlier phases (e.g. the entries)
+            self.peak_bytes[phase] = max(self.peak_bytes[phase], tracemalloc.get_traced_memory()[1])
+        return result
+
+
+def run_dashboard(recorder, db_specifier, output_dir, args):
+    """The steps of dashboard_html_from_db.main() (without --all-history), through recorder
+
+    Returns:
+        (number of responses loaded, number of pages written)
+    """
+    with open(report_fields_path, 'r') as fr:
+        report_fields_dict = json.load(fr)
+    report_fields = list(report_fields_dict)
+    starting_date = datetime.date.today().replace(day=1)
+    month_dates = [starting_date + relativedelta(months=n, days=-1) for n in range(-11, 1)]
+
+    entries = recorder.run("load", load_entries_from_db, db_specifier=db_specifier)
+    recorder.run("add_monthly_changes", MONTHLY_CHANGES_FUNCTIONS[args.monthly_changes], entries, report_fields)
+    all_months_data = recorder.run("find_near_date", SubmissionIndex(entries).find_near_dates, month_dates)
+
+    def rank_leaderboards(*rank_args, **rank_kwargs):
+        return recorder.run("ranking", real_rank_leaderboards, *rank_args, **rank_kwargs)
+    real_rank_leaderboards = ranking.rank_leaderboards
+
+    all_month_tables = []
+    running_totals = player_platinum_tracker = None
+    with mock.patch.object(ranking, "rank_leaderboards", rank_leaderboards), quiet():
+        for month_date, months_data in zip(month_dates, all_months_data):
+            month_tables, running_totals, player_platinum_tracker, _, aborted = recorder.run(
+                "tables", compute_monthly_tables, None, month_date, running_totals, player_platinum_tracker,
+                months_data=months_data)
+            if not aborted:
+                all_month_tables.append(month_tables)
+
+    if args.renderer == "jinja":
+        render = LeaderboardRenderer(report_fields_dict, starting_date, len(month_dates)).render
+    else:
+        def render(month_tables):
+            return render_month_page(report_fields_dict, starting_date, month_tables, len(month_dates))
+
+    def serialize():
+        return [(month_tables.month_year, render(month_tables),
+                 json.dumps(month_data(month_tables), separators=(",", ":")))
+                for month_tables in all_month_tables]
+    documents = recorder.run("serialize", serialize)
+
+    def write():
+        for month_year, html, data in documents:
+            for ext, text in [(".html", html), (".json", data)]:
+                with open(os.path.join(output_dir, month_year + ext), 'w') as fw:
+                    fw.write(text)
+    recorder.run("write", write)
+    recorder.run("precompress", precompress_dir, output_dir)
+    return sum(len(dates) for dates in entries.values()), len(documents)
+
+
+def run_once(db_specifier, args, trace_memory=False):
+    """One run_dashboard(), into a scratch output directory. Returns (PhaseRecorder, responses, pages)"""
+    recorder = PhaseRecorder(trace_memory)
+    with tempfile.TemporaryDirectory() as output_dir:
+        if trace_memory:
+            tracemalloc.start()
+        try:
+            responses, pages = run_dashboard(recorder, db_specifier, output_dir, args)
+        finally:
+            if trace_memory:
+                tracemalloc.stop()
+    return recorder, responses, pages
+
+
+def git_commit():
+    """Short hash of the checked-out commit (with "+" if there are local changes), or None"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit + ("+" if dirty else "")
+
+
+def load_results(path):
+    """The runs saved in a results file, or [] if there's none yet"""
+    try:
+        with open(path, 'r') as fr:
+            return json.load(fr)
+    except FileNotFoundError:
+        return []
+
+
+def previous_result(results, settings):
+    """The latest saved run with the same settings, or None"""
+    for result in reversed(results):
+        if result.get("version") == RESULTS_VERSION and result["settings"] == settings:
+            return result
+    return None
+
+
+def main(args):
+    settings = {"renderer": args.renderer, "monthly_changes": args.monthly_changes}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        if args.db_file:
+            db_path = args.db_file
+            settings["db_file"] = os.path.abspath(db_path)
+        else:
+            db_path = os.path.join(tmpdir, "synthetic.db")
+            settings.update(synthetic_db_kwargs(args))
+            with Timer() as timer, quiet():
+                _, response_count = build_synthetic_db(db_path, response_values=False, **synthetic_db_kwargs(args))
+            print(f"Built a synthetic db of {response_count} responses by {args.trainers} trainers over "
+                  f"{args.months} months in {timer.elapsed:.1f} s")
+        db_specifier = local_db_specifier_from_file(db_path)
+        db_bytes = os.path.getsize(db_path)
+
+        seconds = None
+        for _ in range(args.repeat):
+            recorder, responses, pages = run_once(db_specifier, args)
+            if seconds is None:
+                seconds = dict(recorder.seconds)
+            else:
+                seconds = {phase: min(seconds[phase], recorder.seconds[phase]) for phase in PHASES}
+        recorder, _, _ = run_once(db_specifier, args, trace_memory=True)
+        peak_bytes = recorder.peak_bytes
+
+    result = {"version": RESULTS_VERSION,
+              "when": datetime.datetime.now().isoformat(timespec="seconds"),
+              "commit": git_commit(),
+              "settings": settings,
+              "db_bytes": db_bytes,
+              "responses": responses,
+              "pages": pages,
+              "seconds": seconds,
+              "total_seconds": sum(seconds.values()),
+              "peak_traced_bytes": peak_bytes,
+              # Of this whole process, including building the db; KiB on Linux
+              "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+              }
+
+    results = load_results(args.results)
+    previous = previous_result(results, settings)
+    print(f"{responses} responses ({db_bytes / 1e6:.1f} MB db), {pages} pages; best of {args.repeat}:")
+    for phase in PHASES + ["total"]:
+        elapsed = result["total_seconds"] if phase == "total" else seconds[phase]
+        line = f"    {phase:20} {elapsed:8.3f} s"
+        if phase != "total":
+            line += f"  peak traced memory {peak_bytes[phase] / 1e6:8.1f} MB"
+        if previous is not None:
+            before = previous["total_seconds"] if phase == "total" else previous["seconds"][phase]
+            if before > 0:
+                line += f"  ({100 * (elapsed / before - 1):+.0f}% vs. {previous['commit'] or previous['when']})"
+        print(line)
+
+    results.append(result)
+    with open(args.results, 'w') as fw:
+        json.dump(results, fw, indent=1)
+    print(f"Saved the results to {args.results}")
+
+
+def make_parser():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    add_arguments(parser)
+    parser.add_argument("--db-file", default=None,
+                        help="Benchmark with this db instead of building a synthetic one (the synthetic db "
+                             "options are then ignored)")
+    parser.add_argument("--renderer", choices=["jinja", "dominate"], default="jinja", help="Default: %(default)s")
+    parser.add_argument("--monthly-changes", choices=sorted(MONTHLY_CHANGES_FUNCTIONS), default="numpy",
+                        help="Default: %(default)s")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of this many timed runs. Default: %(default)s")
+    parser.add_argument("--results", default="bench_dashboard_results.json",
+                        help="JSON file to append the results to. Default: %(default)s")
+    return parser
+
+
+if __name__ == "__main__":
+    main(make_parser().parse_args())
@@ -0,0 +1,92 @@
+#! /usr/bin/env python3
+
+"""Concurrent survey POSTs and GETs against a scratch db, with default create_engine() vs settings.get_engine()
+
+Simulates the 1st-of-the-month rush: several threads each alternate submitting a survey and
+loading their survey page. Reports throughput, latency percentiles and failed requests
+(typically "database is locked") for each engine flavor.
+
+    python3 -m benchmarks.bench_engine --threads 8 --requests 40
+"""
+
+# Standard library
+from argparse import ArgumentParser
+import os
+import tempfile
+import threading
+
+# Third party
+from sqlalchemy import create_engine
+
+# Local
+from benchmarks.common import Timer, make_benchmark_db, percentile, quiet, survey_post_values
+from settings import get_engine
+import app as app_module
+
+
+def run_clients(engine, n_threads, n_requests):
+    """Run n_threads clients doing n_requests each (alternating POST and GET)
+
+    Returns:
+        dict of results
+    """
+    app_module.engine = engine
+    app_module.app.config["TESTING"] = False  # count exceptions as 500s instead of raising in the client
+    latencies = {"POST": [], "GET": []}
+    errors = []
+    lock = threading.Lock()
+
+    def client(thread_idx):
+        test_client = app_module.app.test_client()
+        trainer = f"benchtrainer{thread_idx}"
+        for iteration in range(n_requests):
+            method = "POST" if iteration % 2 == 0 else "GET"
+            with Timer() as timer:
+                if method == "POST":
+                    resp = test_client.post("/survey", data=survey_post_values(trainer, iteration))
+                else:
+                    resp = test_client.get(f"/survey/{trainer}")
+            with lock:
+                latencies[method].append(timer.elapsed)
+                if resp.status_code != 200 or (method == "POST" and b"Thanks" not in resp.data):
+                    errors.append((method, resp.status_code))
+
+    threads = [threading.Thread(target=client, args=(idx,)) for idx in range(n_threads)]
+    with quiet(), Timer() as total:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    results = {"total_s": total.elapsed,
+               "requests_per_s": n_threads * n_requests / total.elapsed,
+               "errors": len(errors)}
+    for method, vals in latencies.items():
+        vals.sort()
+        results[f"{method}_p50_ms"] = 1000 * percentile(vals, 50)
+        results[f"{method}_p95_ms"] = 1000 * percentile(vals, 95)
+    return results
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for label, make_engine in [("create_engine (default)", create_engine),
+                                   ("settings.get_engine", get_engine)]:
+            db_specifier = make_benchmark_db(os.path.join(tmpdir, f"bench_{len(label)}.db"),
+                                             n_trainers=args.trainers)
+            engine = make_engine(db_specifier)
+            results = run_clients(engine, args.threads, args.requests)
+            engine.dispose()
+            print(f"{label}:")
+            for key, val in results.items():
+                print(f"    {key:>16}: {val:.1f}" if isinstance(val, float) else f"    {key:>16}: {val}")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent clients. Default: %(default)s")
+    parser.add_argument("--requests", type=int, default=40,
+                        help="Requests per client, alternating POST/GET. Default: %(default)s")
+    parser.add_argument("--trainers", type=int, default=200,
+                        help="Trainers already in the db. Default: %(default)s")
+    main(parser.parse_args())
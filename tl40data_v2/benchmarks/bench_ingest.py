@@ -0,0 +1,85 @@
+#! /usr/bin/env python3
+
+"""Submission throughput: saving in each request thread vs. the queued single-writer ingest
+
+Several threads submit surveys concurrently, as the Flask request threads do on the 1st of the
+month. "direct" saves each submission in the submitting thread with Response.save_response;
+"queued" hands it to ingest.SubmissionIngester. Reported per mode: request-side latency (how long
+the submitting thread is held up), and submissions per second until everything is in the db.
+
+    python3 -m benchmarks.bench_ingest --submissions 1000 --threads 8
+"""
+
+# Standard library
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import os
+import tempfile
+
+# Third party
+from sqlalchemy.orm import Session
+
+# Local
+from benchmarks.common import Timer, make_benchmark_db, percentile, quiet, survey_post_values
+from ingest import SubmissionIngester
+from settings import get_engine
+from tables import Response
+
+
+def run(mode, engine, spill_path, args):
+    """Returns (sorted request latencies, total seconds, ingester stats or None)"""
+    ingester = None
+    if mode == "queued":
+        ingester = SubmissionIngester(engine, spill_path, maxsize=args.submissions)
+        ingester.start()
+
+    def submit(idx):
+        values = survey_post_values(f"trainer{idx % args.trainers}", 1 + idx)
+        with Timer() as timer:
+            if ingester is not None:
+                ingester.submit(values)
+            else:
+                session = Session(engine)
+                Response.save_response(session, values)
+                session.close()
+        return timer.elapsed
+
+    with quiet(), Timer() as total:
+        with ThreadPoolExecutor(max_workers=args.threads) as pool:
+            latencies = sorted(pool.map(submit, range(args.submissions)))
+        if ingester is not None:
+            ingester.stop()
+    stats = ingester.stats() if ingester is not None else None
+    return latencies, total.elapsed, stats
+
+
+def main(args):
+    for mode in ["direct", "queued"]:
+        with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmpdir:
+            db_specifier = make_benchmark_db(os.path.join(tmpdir, "bench.db"), n_trainers=args.trainers)
+            engine = get_engine(db_specifier)
+            latencies, elapsed, stats = run(mode, engine, os.path.join(tmpdir, "spill.jsonl"), args)
+            session = Session(engine)
+            saved = session.query(Response).count() - args.trainers
+            session.close()
+            engine.dispose()
+
+        print(f"{mode}: {saved}/{args.submissions} saved in {elapsed:.2f} s "
+              f"({args.submissions / elapsed:.0f} submissions/s)")
+        print(f"    request latency: mean {1000 * sum(latencies) / len(latencies):.2f} ms, "
+              f"p50 {1000 * percentile(latencies, 50):.2f} ms, p95 {1000 * percentile(latencies, 95):.2f} ms")
+        if stats:
+            print(f"    writer: {stats['batches']} commits, "
+                  f"{stats['written'] / stats['batches']:.1f} submissions per commit, "
+                  f"{stats['writes_per_second']:.0f} submissions per busy second")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=1000, help="Default: %(default)s")
+    parser.add_argument("--threads", type=int, default=8, help="Submitting threads. Default: %(default)s")
+    parser.add_argument("--trainers", type=int, default=100,
+                        help="Returning trainers already in the db. Default: %(default)s")
+    parser.add_argument("--tmpdir", default=None,
+                        help="Where to put the scratch db and spill file; use a real disk to include fsync costs")
+    main(parser.parse_args())
@@ -0,0 +1,125 @@
+#! /usr/bin/env python3
+
+"""Render time and peak memory of the leaderboard pages: dominate vs. the Jinja2 templates
+
+Builds a year of synthetic MonthTables (every stat in report_fields_1.json, full-length tables of
+made-up trainers), then renders every month page with
+  - dashboard_html_from_db.render_month_page (a dominate element per cell, then str(doc))
+  - LeaderboardRenderer.render (compiled templates, header rendered once)
+  - LeaderboardRenderer.generate, streamed to a file chunk by chunk, as main() does with --jobs 1
+checking that all three produce the same HTML. Time is measured without tracemalloc running;
+peak memory (tracemalloc) is measured in a separate pass.
+
+    python3 -m benchmarks.bench_render --months 12 --total-rows 50
+"""
+
+# Standard library
+from argparse import ArgumentParser
+import datetime
+import json
+import os
+import random
+import tempfile
+import tracemalloc
+
+# Third party
+from dateutil.relativedelta import relativedelta
+
+# Local
+from benchmarks.common import Timer
+from dashboard_html_from_db import (LeaderboardRenderer, MonthTables, StatTables, render_month_page,
+                                    report_fields_path)
+
+
+def synthetic_month_tables(rng, report_fields_dict, starting_date, months, total_rows, change_rows):
+    """MonthTables for the `months` months before starting_date, with every table full"""
+    trainers = [f"Trainer{idx}" for idx in range(max(total_rows, change_rows))]
+    all_month_tables = []
+    for n in range(-months, 0):
+        month_date = starting_date + relativedelta(months=n + 1, days=-1)
+        month_year = month_date.strftime("%Y-%m")
+        stat_tables = []
+        for stat, keyname in report_fields_dict.items():
+            totals = sorted(((player, rng.randint(0, 10 ** 8),
+                              month_year if rng.random() < 0.9 else " (old)") for player in trainers),
+                            key=lambda row: -row[1])[:total_rows]
+            changes = sorted(((player, rng.choice([rng.randint(0, 10 ** 5), rng.uniform(0, 100)]))
+                              for player in trainers), key=lambda row: -row[1])[:change_rows]
+            stat_tables.append(StatTables(stat, keyname, totals, changes, None))
+        all_month_tables.append(MonthTables(month_date, month_year, stat_tables, len(trainers)))
+    return all_month_tables
+
+
+def render_dominate(report_fields_dict, starting_date, all_month_tables, path):
+    for month_tables in all_month_tables:
+        with open(path, 'w') as fw:
+            fw.write(render_month_page(report_fields_dict, starting_date, month_tables))
+
+
+def render_jinja(report_fields_dict, starting_date, all_month_tables, path):
+    renderer = LeaderboardRenderer(report_fields_dict, starting_date)
+    for month_tables in all_month_tables:
+        with open(path, 'w') as fw:
+            fw.write(renderer.render(month_tables))
+
+
+def render_jinja_streamed(report_fields_dict, starting_date, all_month_tables, path):
+    renderer = LeaderboardRenderer(report_fields_dict, starting_date)
+    for month_tables in all_month_tables:
+        with open(path, 'w') as fw:
+            fw.writelines(renderer.generate(month_tables))
+
+
+RENDERERS = {"dominate": render_dominate,
+             "jinja": render_jinja,
+             "jinja, streamed": render_jinja_streamed,
+             }
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    with open(report_fields_path, 'r') as fr:
+        report_fields_dict = json.load(fr)
+    starting_date = datetime.date(2026, 1, 1)
+    all_month_tables = synthetic_month_tables(rng, report_fields_dict, starting_date, args.months,
+                                              args.total_rows, args.change_rows)
+    rows = sum(len(tables.totals) + len(tables.changes)
+               for month_tables in all_month_tables for tables in month_tables.stat_tables)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Same HTML from each
+        pages = {}
+        for name, render in RENDERERS.items():
+            path = os.path.join(tmpdir, f"{name}.html")
+            render(report_fields_dict, starting_date, all_month_tables[-1:], path)
+            with open(path, 'r') as fr:
+                pages[name] = fr.read()
+        assert len(set(pages.values())) == 1, "renderers disagree"
+
+        print(f"{args.months} month pages, {len(report_fields_dict)} stats, {rows} table rows "
+              f"({len(pages['dominate']) / 1e3:.0f} kB/page)")
+        for name, render in RENDERERS.items():
+            path = os.path.join(tmpdir, "page.html")
+            best = None
+            for _ in range(args.repeat):
+                with Timer() as timer:
+                    render(report_fields_dict, starting_date, all_month_tables, path)
+                best = timer.elapsed if best is None else min(best, timer.elapsed)
+            tracemalloc.start()
+            render(report_fields_dict, starting_date, all_month_tables, path)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"    {name:16} {best:.3f} s ({1e3 * best / args.months:.1f} ms/page), "
+                  f"peak traced memory {peak / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--months", type=int, default=12, help="Default: %(default)s")
+    parser.add_argument("--total-rows", type=int, default=50,
+                        help="Rows per all-time table (the dashboard shows 50 for Total XP, 20 otherwise). "
+                             "Default: %(default)s")
+    parser.add_argument("--change-rows", type=int, default=20, help="Rows per monthly table. Default: %(default)s")
+    parser.add_argument("--repeat", type=int, default=3, help="Best of this many timed runs. Default: %(default)s")
+    parser.add_argument("--seed", type=int, default=0, help="Default: %(default)s")
+    main(parser.parse_args())
@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+
+"""Per-submission latency and sqlite write-lock hold time of Response.save_response
+
+Saves a run of survey submissions (a mix of returning and new trainers) to a scratch db, one at a
+time like the survey POST handler does. Lock hold time is measured from the first INSERT/UPDATE of a
+transaction until its commit returns, summed over all commits of one save_response call.
+
+    python3 -m benchmarks.bench_save_response --submissions 300
+"""
+
+# Standard library
+from argparse import ArgumentParser
+import os
+import tempfile
+import time
+
+# Third party
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Local
+from benchmarks.common import Timer, make_benchmark_db, percentile, quiet, survey_post_values
+from settings import get_engine
+from tables import Response
+
+
+def main(args):
+    with tempfile.TemporaryDirectory(dir=args.tmpdir) as tmpdir:
+        db_specifier = make_benchmark_db(os.path.join(tmpdir, "bench.db"), n_trainers=args.trainers)
+        engine = get_engine(db_specifier)
+        session = Session(engine)
+
+        state = {"first_write": None, "hold": 0.0, "commits": 0}
+
+        @event.listens_for(engine, "before_cursor_execute")
+        def note_first_write(conn, cursor, statement, parameters, context, executemany):
+            if state["first_write"] is None and statement.lstrip().split(None, 1)[0].upper() in \
+                    ("INSERT", "UPDATE", "DELETE"):
+                state["first_write"] = time.perf_counter()
+
+        @event.listens_for(session, "after_commit")
+        def note_commit(session):
+            state["commits"] += 1
+            if state["first_write"] is not None:
+                state["hold"] += time.perf_counter() - state["first_write"]
+                state["first_write"] = None
+
+        latencies = []
+        holds = []
+        commits = 0
+        with quiet():
+            for idx in range(args.submissions):
+                # Every 4th submission is from a new trainer
+                trainer = f"trainer{idx % args.trainers}" if idx % 4 else f"newtrainer{idx}"
+                values = survey_post_values(trainer, 1 + idx)
+                state["hold"] = 0.0
+                state["commits"] = 0
+                with Timer() as timer:
+                    Response.save_response(session, values)
+                latencies.append(timer.elapsed)
+                holds.append(state["hold"])
+                commits += state["commits"]
+        session.close()
+        engine.dispose()
+
+    latencies.sort()
+    holds.sort()
+    print(f"{args.submissions} submissions, {commits / args.submissions:.2f} commits per submission")
+    for label, vals in [("latency", latencies), ("lock hold", holds)]:
+        print(f"    {label:>10}: mean {1000 * sum(vals) / len(vals):.2f} ms, "
+              f"p50 {1000 * percentile(vals, 50):.2f} ms, p95 {1000 * percentile(vals, 95):.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--submissions", type=int, default=300, help="Default: %(default)s")
+    parser.add_argument("--trainers", type=int, default=100,
+                        help="Returning trainers already in the db. Default: %(default)s")
+    parser.add_argument("--tmpdir", default=None,
+                        help="Where to put the scratch db; use a real disk to include fsync costs")
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+"""Helpers shared by the benchmark scripts"""
+
+# Standard library
+from contextlib import contextmanager, redirect_stderr, redirect_stdout
+import io
+import json
+import os
+import time
+
+# Third party
+from sqlalchemy.orm import Session
+
+# Local
+from fill_static_tables import fill_stats
+from settings import get_engine, local_db_specifier_from_file
+from tables import Base, Response
+
+
+def make_benchmark_db(path, n_trainers=0):
+    """Create a db file at path with the stat table filled from stats.json, and optionally
+    one survey response each for n_trainers trainers named "trainer0", "trainer1", ...
+
+    Returns:
+        The db specifier for path
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    db_specifier = local_db_specifier_from_file(path)
+    engine = get_engine(db_specifier)
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    with quiet():
+        fill_stats(session)
+        session.commit()
+        for idx in range(n_trainers):
+            Response.save_response(session, survey_post_values(f"trainer{idx}", 0))
+    session.close()
+    engine.dispose()
+    return db_specifier
+
+
+def survey_post_values(trainer_name, iteration):
+    """Form values for a valid survey POST; values grow with iteration so monotonic stats validate
+
+    Returns:
+        dict of {stat icon or "trainername": value string}
+    """
+    static_stat_info = json.load(open("stats.json", 'r'))
+    stat_keys = static_stat_info["key"]
+    values = {"trainername": trainer_name}
+    for stat_name, stat_vals in static_stat_info["data"].items():
+        stat = dict(zip(stat_keys, stat_vals))
+        if stat["required"] == -1:
+            continue
+        if stat_name == "Trainer Level":
+            value = 50
+        elif stat["maximum"] > 0:
+            value = stat["maximum"]
+        else:
+            value = 1000 + 10 * iteration
+        values[stat["icon"]] = str(float(value)) if stat["numtype"] == "Float" else str(value)
+    return values
+
+
+@contextmanager
+def quiet():
+    """Swallow the (plentiful) debug prints of app.py and tables.py"""
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        yield
+
+
+def percentile(sorted_vals, pct):
+    """pct-th percentile of an already sorted list, or None if empty"""
+    if not sorted_vals:
+        return None
+    idx = min(len(sorted_vals) - 1, int(round(pct / 100 * (len(sorted_vals) - 1))))
+    return sorted_vals[idx]
+
+
+class Timer():
+    """Context manager measuring wall time in seconds, in .elapsed"""
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,265 @@
+#! /usr/bin/env python3
+
+"""Build a synthetic pogo_sj.db: many trainers, years of monthly surveys
+
+The stat table comes from stats.json, as for the real db. Each trainer joins in some month (a
+share of them before the first one), then submits in most months, mostly around the month's end
+as real trainers do. Their stats grow along a growth curve from a made-up starting point, at a
+trainer-specific pace, capped at each stat's maximum; non-monotonic stats (Stardust) wander.
+
+The rows are written with bulk inserts rather than Response.save_response, so years of history
+for thousands of trainers take seconds to minutes rather than hours. They're what save_response
+would have written: strdata and bindata, the response_value rows (optional), monthly_snapshot and
+each trainer's newest_response.
+
+    python3 -m benchmarks.synthetic_db synthetic.db --trainers 2000 --months 60 --curve logistic
+"""
+
+# Standard library
+from argparse import ArgumentParser
+from collections import namedtuple
+import datetime
+import json
+
+# Third party
+from dateutil.relativedelta import relativedelta
+import numpy as np
+from sqlalchemy.orm import Session
+
+# Local
+from benchmarks.common import Timer, make_benchmark_db
+from settings import get_engine
+from tables import MonthlySnapshot, Response, ResponseValue, Stat, Trainer
+
+
+# Starting values and pace are relative to a stat's "scale": its platinum medal count, else its
+# maximum, else this (or an override below)
+DEFAULT_SCALE = 2000
+SCALE_OVERRIDES = {"Total XP": 5e7, "Stardust": 5e6, "Pilot": 1e7}
+# Median monthly growth rate (the curve's parameter; roughly the monthly growth as a fraction)
+GROWTH_RATES = {"linear": 0.04, "exponential": 0.03, "logistic": 0.08}
+# Where a logistic curve levels off, for stats with no maximum, as a multiple of the scale
+LOGISTIC_CEILING = 4
+# Submissions count for a month within 3 days of its end (see find_near_date); the last one of a month lands there
+LAST_SUBMISSION_DAYS = (-3, 3)  # from the month's last day, [start, stop)
+BATCH_SIZE = 5000
+# The dashboard checks which stats a month has against this trainer's response, so they submit every month
+TRAINER_ZERO_NAME = "Gertlex"
+
+# stat: Stat row values and stats.json info needed to make up values, in strdata order
+StatModel = namedtuple("StatModel", ["name", "is_float", "scale", "maximum", "monotonic", "surveyed"])
+
+
+def linear_curve(v0, rate, ceiling, months):
+    return v0 * (1 + rate * months)
+
+
+def exponential_curve(v0, rate, ceiling, months):
+    return v0 * (1 + rate) ** months
+
+
+def logistic_curve(v0, rate, ceiling, months):
+    return ceiling / (1 + (ceiling / v0 - 1) * np.exp(-rate * months))
+
+
+# Value of a stat `months` (array) after joining, from its value v0 at joining; arrays broadcast
+GROWTH_CURVES = {"linear": linear_curve,
+                 "exponential": exponential_curve,
+                 "logistic": logistic_curve,
+                 }
+
+
+def stat_models(session):
+    """StatModel per stat in the db's stat table, in strdata order, from stats.json"""
+    with open("stats.json", 'r') as fr:
+        static_stat_info = json.load(fr)
+    stat_keys = static_stat_info["key"]
+    models = []
+    for name in Stat.get_schema(session).names:
+        stat = dict(zip(stat_keys, static_stat_info["data"][name]))
+        maximum = stat["maximum"] if stat["maximum"] > 0 else None
+        scale = SCALE_OVERRIDES.get(name) or stat["platinum"] or maximum or DEFAULT_SCALE
+        models.append(StatModel(name, stat["numtype"] == "Float", scale, maximum,
+                                stat["monotonic"], stat["required"] != -1))
+    return models
+
+
+def month_end_dates(months, end_date=None):
+    """The last days of the `months` months before end_date's month (default: the current month)"""
+    first_of_month = (end_date or datetime.date.today()).replace(day=1)
+    return [first_of_month + relativedelta(months=n, days=-1) for n in range(-months + 1, 1)]
+
+
+def submission_times(rng, month_end, count):
+    """`count` sorted epoch timestamps for a trainer's submissions counting for the month ending on month_end
+
+    The last is near the month's end; any others are earlier in the month.
+    """
+    month_start = datetime.datetime(month_end.year, month_end.month, 1).timestamp()
+    end = datetime.datetime(month_end.year, month_end.month, month_end.day, 12).timestamp()
+    last = end + rng.uniform(*LAST_SUBMISSION_DAYS) * 86400
+    earlier = rng.uniform(month_start, end - 5 * 86400, size=count - 1)
+    return np.append(np.sort(earlier), last)
+
+
+def trainer_values(rng, models, curve, join_time, times):
+    """Made-up stat values for one trainer, at the given epoch timestamps
+
+    Returns:
+        float array, shape (len(times), len(models)); 0 for stats the survey doesn't ask for
+    """
+    scales = np.array([model.scale for model in models], dtype=float)
+    maxima = np.array([model.maximum or np.inf for model in models])
+    v0 = np.minimum(scales * rng.uniform(0.05, 0.6, size=len(models)), maxima * 0.9)
+    v0 = np.maximum(v0, 1)
+    # Some trainers play much more than others; the same pace for all of their stats, give or take
+    pace = rng.lognormal(0, 0.6) * rng.lognormal(0, 0.3, size=len(models))
+    rate = GROWTH_RATES[curve] * pace
+    ceiling = np.where(np.isfinite(maxima), maxima, scales * LOGISTIC_CEILING)
+    ceiling = np.maximum(ceiling, v0 * 1.01)
+    months = (times[:, None] - join_time) / (86400 * 30.44)
+    values = np.minimum(GROWTH_CURVES[curve](v0, rate, ceiling, months), maxima)
+    for idx, model in enumerate(models):
+        if not model.monotonic:
+            values[:, idx] *= rng.uniform(0.3, 1.7, size=len(times))
+        if not model.surveyed:
+            values[:, idx] = 0
+    return values
+
+
+def strdata_for(models, values):
+    """A strdata string for one row of trainer_values()"""
+    return ";".join(f"{val:.1f}" if model.is_float else str(int(val)) for model, val in zip(models, values))
+
+
+def synthetic_responses(rng, models, month_dates, trainers, curve="logistic", submissions_per_month=1.3,
+                        participation=0.7, initial_fraction=0.3):
+    """Made-up survey responses
+
+    Args:
+        rng (numpy.random.Generator)
+        models: StatModel per stat, from stat_models()
+        month_dates: The months' last days, in order
+        trainers (int): Number of trainers
+        curve (str): A GROWTH_CURVES key
+        submissions_per_month (float): Mean submissions by a trainer in a month they submit in (at least 1)
+        participation (float): Chance that a trainer submits in a month, once they've joined. Except
+            for trainer 0 (Gertlex), who submits every month: the dashboard expects that.
+        initial_fraction (float): Share of the trainers who joined before the first month
+
+    Returns:
+        List of (epoch timestamp, trainer index, strdata), in timestamp order
+    """
+    responses = []
+    for trainer_idx in range(trainers):
+        first_month = 0 if trainer_idx == 0 or rng.random() < initial_fraction \
+                else int(rng.integers(len(month_dates)))
+        months = [month_end for month_end in month_dates[first_month:]
+                  if trainer_idx == 0 or rng.random() < participation]
+        if not months:
+            months = [month_dates[first_month]]
+        times = np.concatenate([submission_times(rng, month_end, 1 + rng.poisson(submissions_per_month - 1))
+                                for month_end in months])
+        join_time = times[0] - rng.uniform(0, 3 * 365) * 86400 if first_month == 0 else times[0]
+        values = trainer_values(rng, models, curve, join_time, times)
+        responses += [(float(epoch), trainer_idx, strdata_for(models, row)) for epoch, row in zip(times, values)]
+    responses.sort()
+    return responses
+
+
+def insert_batches(session, table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        session.execute(table.insert(), rows[start:start + BATCH_SIZE])
+
+
+def build_synthetic_db(path, trainers=500, months=36, submissions_per_month=1.3, participation=0.7,
+                       initial_fraction=0.3, curve="logistic", end_date=None, seed=0, response_values=True):
+    """Create (or replace) a db file at path full of synthetic surveys; see synthetic_responses() for the args
+
+    Args:
+        end_date (datetime.date, optional): The surveys are for the `months` months before this
+            date's month. Defaults to today, as dashboard_html_from_db.py uses.
+        response_values (bool): Also fill the response_value table (dashboard_html_from_db.py
+            doesn't read it, and it's most of the db's size and of the time taken)
+
+    Returns:
+        (db specifier, number of responses)
+    """
+    db_specifier = make_benchmark_db(path)
+    engine = get_engine(db_specifier)
+    session = Session(engine)
+    schema = Stat.get_schema(session)
+    models = stat_models(session)
+    rng = np.random.default_rng(seed)
+    responses = synthetic_responses(rng, models, month_end_dates(months, end_date), trainers, curve,
+                                    submissions_per_month, participation, initial_fraction)
+
+    trainer_rows = {}  # by trainer index
+    response_rows = []
+    for response_id, (epoch, trainer_idx, strdata) in enumerate(responses, start=1):
+        timestamp = str(epoch)
+        trainer = trainer_rows.get(trainer_idx)
+        if trainer is None:
+            proper_name = TRAINER_ZERO_NAME if trainer_idx == 0 else f"Trainer{trainer_idx}"
+            trainer = trainer_rows[trainer_idx] = {"id": trainer_idx + 1, "name": proper_name.lower(),
+                                                   "proper_name": proper_name, "start_date": timestamp}
+        trainer["newest_response"] = response_id
+        trainer["newest_response_date"] = timestamp
+        response_rows.append({"id": response_id, "trainer_id": trainer_idx + 1, "timestamp": timestamp,
+                              "timestamp_epoch": epoch, "strdata": strdata,
+                              "bindata": Response.bindata_from_strdata(strdata), "revision": 1})
+    insert_batches(session, Trainer.__table__, list(trainer_rows.values()))
+    insert_batches(session, Response.__table__, response_rows)
+    insert_batches(session, MonthlySnapshot.__table__, MonthlySnapshot.rows_from_responses(
+        (row["id"], row["trainer_id"], row["timestamp_epoch"]) for row in response_rows))
+    if response_values:
+        for start in range(0, len(response_rows), BATCH_SIZE):
+            value_rows = []
+            for row in response_rows[start:start + BATCH_SIZE]:
+                value_rows += ResponseValue.rows_from_strdata(row["id"], row["strdata"], schema.ids)
+            session.execute(ResponseValue.__table__.insert(), value_rows)
+    session.commit()
+    session.close()
+    engine.dispose()
+    return db_specifier, len(response_rows)
+
+
+def add_arguments(parser):
+    """The synthetic db's options, shared with bench_dashboard.py"""
+    parser.add_argument("--trainers", type=int, default=500, help="Default: %(default)s")
+    parser.add_argument("--months", type=int, default=36,
+                        help="Months of surveys, up to the last one. Default: %(default)s")
+    parser.add_argument("--submissions-per-month", type=float, default=1.3,
+                        help="Mean submissions by a trainer in a month they submit in. Default: %(default)s")
+    parser.add_argument("--participation", type=float, default=0.7,
+                        help="Chance that a trainer submits in a given month. Default: %(default)s")
+    parser.add_argument("--initial-fraction", type=float, default=0.3,
+                        help="Share of the trainers who were around before the first month; the rest join "
+                             "in a random month. Default: %(default)s")
+    parser.add_argument("--curve", choices=sorted(GROWTH_CURVES), default="logistic",
+                        help="How stats grow over time. Default: %(default)s")
+    parser.add_argument("--seed", type=int, default=0, help="Default: %(default)s")
+
+
+def synthetic_db_kwargs(args):
+    """build_synthetic_db() keyword arguments from add_arguments()' options"""
+    return {"trainers": args.trainers, "months": args.months,
+            "submissions_per_month": args.submissions_per_month, "participation": args.participation,
+            "initial_fraction": args.initial_fraction, "curve": args.curve, "seed": args.seed}
+
+
+def main(args):
+    with Timer() as timer:
+        _, response_count = build_synthetic_db(args.db_file, response_values=args.response_values,
+                                               **synthetic_db_kwargs(args))
+    print(f"Wrote {response_count} responses by {args.trainers} trainers over {args.months} months "
+          f"to {args.db_file} in {timer.elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("db_file", help="Where to write the db (replaced if it exists)")
+    add_arguments(parser)
+    parser.add_argument("--no-response-values", dest="response_values", action="store_false",
+                        help="Leave the response_value table empty")
+    main(parser.parse_args())
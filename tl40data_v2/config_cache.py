@@ -0,0 +1,155 @@
+"""stats.json and stat_help.json, parsed once and reloaded only when they change
+
+The survey and visualization pages used to json.load these files on every request. Instead,
+get_stats() and get_stat_help() return structures parsed once, and check the file's mtime (and
+size) per call: if it changed, the file is read and hashed, and only parsed again if its content
+did change. So a stats.json uploaded by upload_stat_limits.bash takes effect without restarting
+the app, and a touched-but-identical file keeps the same objects (and digest).
+
+The returned structures are read-only (tuples, namedtuples, MappingProxyType), since they're
+shared by every request thread.
+"""
+
+# Standard library
+from collections import namedtuple
+import hashlib
+import json
+import os
+import threading
+from types import MappingProxyType
+
+
+STATS_PATH = "stats.json"
+STAT_HELP_PATH = "stat_help.json"
+# A stat's category if stats.json doesn't give one
+DEFAULT_CATEGORY = "General"
+
+# One stats.json entry. thresholds: (bronze, silver, gold, platinum); all 0 for stats without medals
+StatInfo = namedtuple("StatInfo", ["name", "numtype", "bronze", "silver", "gold", "platinum", "maximum",
+                                   "monotonic", "required", "icon", "category", "thresholds"])
+# Fields that are also Stat (tables.py) columns; see stat_kwargs()
+STAT_COLUMN_FIELDS = ("numtype", "bronze", "silver", "gold", "platinum", "maximum", "monotonic", "required", "icon")
+
+
+class StatsConfig():
+    """stats.json, pre-indexed
+
+    Attributes:
+        stats: Tuple of StatInfo, in survey order (the file's order)
+        by_name: {stat name: StatInfo}
+        by_icon: {icon: StatInfo}
+        categories: Sorted tuple of the categories in use
+        digest: sha256 of the file's content
+    """
+    def __init__(self, static_stat_info, digest=None):
+        stat_keys = static_stat_info["key"]
+        stats = []
+        for name, values in static_stat_info["data"].items():
+            stat = dict(zip(stat_keys, values))  # extra trailing values (comments) are ignored
+            stats.append(StatInfo(name=name,
+                                  numtype=stat["numtype"],
+                                  bronze=stat["bronze"],
+                                  silver=stat["silver"],
+                                  gold=stat["gold"],
+                                  platinum=stat["platinum"],
+                                  maximum=stat["maximum"],
+                                  monotonic=stat["monotonic"],
+                                  required=stat["required"],
+                                  icon=stat["icon"],
+                                  category=stat.get("category", DEFAULT_CATEGORY),
+                                  thresholds=(stat["bronze"], stat["silver"], stat["gold"], stat["platinum"]),
+                                  ))
+        self.stats = tuple(stats)
+        self.by_name = MappingProxyType({stat.name: stat for stat in self.stats})
+        self.by_icon = MappingProxyType({stat.icon: stat for stat in self.stats})
+        self.categories = tuple(sorted({stat.category for stat in self.stats}))
+        self.digest = digest
+
+    def __len__(self):
+        return len(self.stats)
+
+
+def stat_kwargs(stat):
+    """Keyword arguments for a (transient) tables.Stat of a StatInfo, besides name"""
+    return {field: getattr(stat, field) for field in STAT_COLUMN_FIELDS}
+
+
+class ConfigFile():
+    """A file's parsed content, re-parsed only once the file changes
+
+    Thread-safe; concurrent calls during a reload wait for it rather than each parsing the file.
+    """
+    def __init__(self, path, parse, missing=None):
+        """
+        Args:
+            path (str): The file, relative to the working directory as elsewhere in the app
+            parse: Function of (bytes, sha256 hex digest) returning the parsed structure
+            missing: What get() returns while the file doesn't exist. If None,
+                FileNotFoundError is raised instead.
+        """
+        self.path = path
+        self.parse = parse
+        self.missing = missing
+        self.loads = 0  # number of times the file was actually parsed
+        self.digest = None  # sha256 of the content last parsed, None while the file's missing
+        self._lock = threading.Lock()
+        self._stat_key = None  # (mtime_ns, size) the value is for, or None
+        self._value = None
+
+    def get(self):
+        try:
+            stat_result = os.stat(self.path)
+        except FileNotFoundError:
+            if self.missing is None:
+                raise
+            with self._lock:
+                self._stat_key = self.digest = self._value = None
+            return self.missing
+        stat_key = (stat_result.st_mtime_ns, stat_result.st_size)
+        if stat_key == self._stat_key:
+            return self._value
+        with self._lock:
+            if stat_key != self._stat_key:
+                with open(self.path, 'rb') as fr:
+                    data = fr.read()
+                digest = hashlib.sha256(data).hexdigest()
+                if digest != self.digest:
+                    self._value = self.parse(data, digest)
+                    self.digest = digest
+                    self.loads += 1
+                self._stat_key = stat_key
+            return self._value
+
+    def invalidate(self):
+        """Check the file's content on the next get(), even if its mtime and size are the same"""
+        with self._lock:
+            self._stat_key = None
+
+
+def parse_stats(data, digest):
+    return StatsConfig(json.loads(data), digest)
+
+
+def parse_stat_help(data, digest):
+    return MappingProxyType(json.loads(data))
+
+
+stats_file = ConfigFile(STATS_PATH, parse_stats)
+stat_help_file = ConfigFile(STAT_HELP_PATH, parse_stat_help, missing=MappingProxyType({}))
+
+
+def get_stats():
+    """StatsConfig of stats.json"""
+    return stats_file.get()
+
+
+def get_stat_help():
+    """{stat name: help text} from stat_help.json, or empty if there's no such file"""
+    return stat_help_file.get()
+
+
+def config_version():
+    """Hashable; changes whenever the content of stats.json or stat_help.json does"""
+    get_stats()
+    get_stat_help()
+    return stats_file.digest, stat_help_file.digest
@@ -6,7 +6,11 @@
 # Standard library
 from argparse import ArgumentParser
 import calendar
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 import datetime
+import functools
+import hashlib
 import json
 import os
 import random
@@ -16,17 +20,33 @@ import shutil
 import dominate
 from dominate.tags import a, b, img, link, option, select, table, tr, td, th, div, script, meta, sup
 from dateutil.relativedelta import relativedelta
-from sqlalchemy import create_engine
+from jinja2 import Environment, FileSystemLoader
+from markupsafe import Markup
+import numpy as np
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 # Local
-from tables import Stat, Response, Trainer
-from settings import LOCAL_DB_SPECIFIER
+from tables import MonthlySnapshot, Stat, Response, Trainer
+from settings import LOCAL_DB_SPECIFIER, get_engine, local_db_specifier_from_file
+import ranking
+from static_assets import precompress_dir, publish_assets
+from submission_index import SubmissionIndex
 
 
 # TODO these should be pulled from DB
 report_fields_path = "../report_fields_1.json"
 platinum_counts_path = "../platinum_counts.json"
+# In the output dir; per-page digests of the inputs each page was last generated from
+MANIFEST_FILENAME = ".manifest.json"
+LEADERBOARD_TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "leaderboard_templates")
+PAGE_TITLE = 'PoGo Stats - San Jose'
+MONTH_DATA_VERSION = 1  # of the <month>.json files; bump along with the reader in leaderboard_templates/shell.html
+MONTHS_INDEX_FILENAME = "months.json"
+SHELL_FILENAME = "leaderboards.html"
+ASSET_SOURCE_DIR = "../html"  # style.css, scroll2.js
+# How the pages refer to each asset, given its (possibly content-hashed) file name
+ASSET_URL_FORMATS = {"style.css": "{}", "scroll2.js": "static/{}"}
 
 DAY_TO_INT = dict(zip(calendar.day_name, range(7)))
 SURVEY_LINK = "http://pogo.gertlex.com/survey"
@@ -224,6 +244,161 @@ def add_monthly_changes(entries, quantity_names):
                     entries[user][d][stat]["calculated_with_tdelta"] = tdelta
 
 
+def month_length_for_changes(date):
+    """Days in the month a change reported on `date` is normalized to; see add_monthly_changes()"""
+    if date.day < 3:  # Simple criteria: For both 11-2 and 10-31, use 'the length of month 10'
+        prev_month = date.month - 1
+        year = date.year
+        if prev_month == 0:
+            prev_month = 12
+            year = date.year - 1
+        return calendar.monthrange(year, prev_month)[1]
+    return calendar.monthrange(date.year, date.month)[1]
+
+
+def add_monthly_changes_numpy(entries, quantity_names):
+    """Same as add_monthly_changes(), but per trainer, on arrays of all their dates x stats at once
+
+    Gives numerically identical results (including int() truncating float stats before subtracting).
+    """
+    stats = [stat for stat in quantity_names if stat != "Platinum Badges"]  # TODO not implemented
+    month_lengths = {}  # by (year, month, day < 3)
+    for user in entries:
+        try:
+            dates = sorted(entries[user])  # list of dates (datetime.date)
+        except TypeError:
+            print(user)
+            print(entries[user])
+            continue
+        if not dates:
+            continue
+        user_entries = [entries[user][d] for d in dates]
+
+        # Previous month's submission: the latest one at least 20 days earlier, else the first one
+        ordinals = np.array([d.toordinal() for d in dates])
+        prev_idx = np.maximum(np.searchsorted(ordinals, ordinals - 20, side='right') - 1, 0)
+        tdeltas = ordinals - ordinals[prev_idx]  # days; 0 for the first submission
+        lengths = np.array([month_lengths.setdefault((d.year, d.month, d.day < 3), month_length_for_changes(d))
+                            for d in dates])
+        scale_factors = lengths / np.maximum(tdeltas, 1)
+
+        # dates x stats; entries in report_fields_1.json that are not used yet are simply absent
+        present = np.array([[stat in entry for stat in stats] for entry in user_entries], dtype=bool)
+        raw = [[entry[stat]["value"] if stat in entry else None for stat in stats] for entry in user_entries]
+        blank = np.array([[val is None or val == '' for val in row] for row in raw], dtype=bool)
+        values = np.array([[0 if val is None or val == '' else val for val in row] for row in raw],
+                          dtype=np.float64).reshape(len(dates), len(stats))
+        values = np.trunc(values)  # like int() in add_monthly_changes
+        changes = scale_factors[:, None] * (values - values[prev_idx])
+        # Assumption: None means this value didn't exist in current/previous surveys
+        valid = ~blank & ~blank[prev_idx]
+        valid[0] = False
+
+        changes = changes.tolist()
+        valid = valid.tolist()
+        present = present.tolist()
+        tdeltas = tdeltas.tolist()
+        for idx, entry in enumerate(user_entries):
+            for stat_idx, stat in enumerate(stats):
+                if not present[idx][stat_idx]:
+                    continue
+                if valid[idx][stat_idx]:
+                    entry[stat]["calculated_monthly_change"] = changes[idx][stat_idx]
+                    entry[stat]["calculated_with_tdelta"] = tdeltas[idx]
+                else:
+                    entry[stat]["calculated_monthly_change"] = None
+                    entry[stat]["calculated_with_tdelta"] = None
+
+
+# Selectable with --monthly-changes
+MONTHLY_CHANGES_FUNCTIONS = {"loops": add_monthly_changes,
+                             "numpy": add_monthly_changes_numpy,
+                             }
+
+
+class MonthlyChangeTracker():
+    """add_monthly_changes(), one submission at a time, for submissions arriving in date order
+
+    Per trainer, only keeps what a later submission may be compared against: their first
+    submission, their latest one from at least 20 days before the newest, and the ones since.
+    """
+    def __init__(self, quantity_names):
+        self.stats = [stat for stat in quantity_names if stat != "Platinum Badges"]  # TODO not implemented
+        self.trainers = {}  # by user: [first (date, entry), latest (date, entry) 20+ days old or None, deque of recent]
+
+    def add(self, user, date, entry):
+        """Set entry's calculated_monthly_change and calculated_with_tdelta fields
+
+        A second submission for the same user and date replaces the first, as in load_entries_from_db().
+        """
+        if user not in self.trainers or self.trainers[user][0][0] == date:  # Case 1: first submission for user
+            self.trainers[user] = [(date, entry), None, deque([(date, entry)])]
+            for stat in self.stats:
+                if stat in entry:  # else an entry in report_fields_1.json that is not used yet?
+                    entry[stat]["calculated_monthly_change"] = None
+                    entry[stat]["calculated_with_tdelta"] = None
+            return
+        state = self.trainers[user]
+        first, recent = state[0], state[2]
+        if recent[-1][0] == date:
+            recent.pop()
+        while recent and (date - recent[0][0]).days >= 20:
+            state[1] = recent.popleft()
+        d_prev, prev_entry = state[1] or first
+        recent.append((date, entry))
+
+        tdelta = (date - d_prev).days
+        scale_factor = month_length_for_changes(date) / tdelta
+        for stat in self.stats:
+            if stat not in entry:
+                continue
+            current = entry[stat]["value"]
+            previous = prev_entry[stat]["value"]
+            if current is None or previous is None or current == '' or previous == '':
+                entry[stat]["calculated_monthly_change"] = None
+                entry[stat]["calculated_with_tdelta"] = None
+                continue  # Assumption: None means this value didn't exist in current/previous surveys
+            entry[stat]["calculated_monthly_change"] = scale_factor * (int(current) - int(previous))
+            entry[stat]["calculated_with_tdelta"] = tdelta
+
+
+def stream_months(responses, quantity_names, month_dates, day_delta=3):
+    """Each month's find_near_date() data, from one pass over responses in date order
+
+    Args:
+        responses: Iterable of (user, date, entry), sorted by date; e.g. iter_responses()
+        quantity_names: As for add_monthly_changes()
+        month_dates: Ascending month end dates, at least 2 * day_delta days apart
+        day_delta: As for find_near_date()
+
+    Yields:
+        (month_date, months_data) per month date: months_data is what find_near_date(entries, month_date)
+        gives after add_monthly_changes(entries, quantity_names), with entries of every response.
+        Trainers are ordered by their first response.
+    """
+    changes = MonthlyChangeTracker(quantity_names)
+    first_seen = {}
+    delta = datetime.timedelta(days=day_delta)
+    month_dates = iter(month_dates)
+    month_date = next(month_dates, None)
+    window = {}  # by user: their latest entry within month_date +/- delta
+    for user, date, entry in responses:
+        while month_date is not None and date > month_date + delta:
+            yield month_date, {user: window[user] for user in sorted(window, key=first_seen.get)}
+            window = {}
+            month_date = next(month_dates, None)
+        if month_date is None:
+            return  # nothing later is rendered
+        changes.add(user, date, entry)
+        first_seen.setdefault(user, len(first_seen))
+        if date >= month_date - delta:
+            window[user] = entry
+    while month_date is not None:
+        yield month_date, {user: window[user] for user in sorted(window, key=first_seen.get)}
+        window = {}
+        month_date = next(month_dates, None)
+
+
 def find_near_date(all_data, target_date, day_delta=3):  # TODO be smarter/more reasonable about the day_delta. Used to be '1'.
     """Find form submissions near specific date (typically look for last day of month +/- 1 day)
 
@@ -294,26 +469,28 @@ def to_increment_str(val):
     else:
         return f"{int(float(val)):,}"
 
-def render_monthly_html(entries, month_date=None, running_totals=None, player_platinum_tracker=None):
-    """Return a list of HTML divs, one per calendar month, and data derived from entries
 
-    These are meant to be (one at a time) added to a parent HTML document.
+# One month's leaderboards as plain data, from compute_monthly_tables(); see render_month_content()
+MonthTables = namedtuple("MonthTables", ["month_date", "month_year", "stat_tables", "player_count"])
+# One stat's pair of leaderboards, already ranked and cut to length.
+# totals: [(player, all-time total, month_year it was reported)], changes: [(player, change)],
+# quip: April fools text for the top change, or None
+StatTables = namedtuple("StatTables", ["stat", "keyname", "totals", "changes", "quip"])
 
-    Args:
-        entries: List of responses from Responses table in DB
-        month_date: Can specify month, but defaults to current month based on datetime.date.today().
-            This is a date object of the first day of a month.
-        running_totals: None or a dictionary. Stores latest data from previous months, so diffs
-            can be calculated
-        player_platinum_tracker: None or a dictionary
+
+def compute_monthly_tables(entries, month_date=None, running_totals=None, player_platinum_tracker=None,
+                           months_data=None):
+    """Compute a month's leaderboards as plain data, and update the state carried between months
+
+    This is the sequential part of generating the pages: each month needs the running totals and
+    platinum badges of all earlier months. Turning the result into HTML (render_month_content)
+    doesn't, so that can happen for all months at once, e.g. in parallel.
+
+    Args: see render_monthly_html()
 
     Returns:
-        content_div: HTML
-        running_totals: Updated dictionary
-        player_platinum_tracker: Updated dictionary
-        player_count: Number of players with diffs in the current month.
-        aborted (bool): If True, did not have (valid) data to render for the month. Other
-            return values may simply be None, and should not be used
+        month_tables: MonthTables, or None if aborted
+        running_totals, player_platinum_tracker, player_count, aborted: see render_monthly_html()
     """
     with open(report_fields_path, 'r') as fr:
         report_fields_dict = json.load(fr)  # expect a list of strings matching field keys
@@ -333,13 +510,14 @@ def render_monthly_html(entries, month_date=None, running_totals=None, player_pl
         starting_date = datetime.date(day=1, year=today_date.year, month=today_date.month)
         month_date = starting_date
 
-    months_data = find_near_date(entries, month_date)
+    if months_data is None:
+        months_data = find_near_date(entries, month_date)
     monthname = calendar.month_name[month_date.month]
     month_year = f" ({monthname} {month_date.year})"
 
     if len(months_data.keys()) == 0:
         print("Debug: Seems to be no data for this month. Skipping...")
-        return None, None, None, True
+        return None, running_totals, player_platinum_tracker, None, True
 
     if not running_totals:
         running_totals = {}  # dict of dicts by stat; subdicts are: [ {player: all-time-total,  ... } ]
@@ -358,174 +536,198 @@ def render_monthly_html(entries, month_date=None, running_totals=None, player_pl
                                  for player in months_data.keys()}
     player_count = "(unset)"  # Number of players that responded to the survey for the being-generated month
 
-    content_div = div(cls="content")
-    with content_div:
-        for stat in all_fields:
-            # Skip stats that are defined but not yet recorded by survey
-            if stat not in months_data["gertlex"] and stat != "Platinum Badges" and stat != STATNAME_DEX_SUM:
-                print("Skipping", stat)
-                continue
+    stat_tables = []
+    to_rank = {}  # by keyname: (totals, changes) rows for ranking.rank_leaderboards()
+    for stat in all_fields:
+        # Skip stats that are defined but not yet recorded by survey
+        if stat not in months_data["gertlex"] and stat != "Platinum Badges" and stat != STATNAME_DEX_SUM:
+            print("Skipping", stat)
+            continue
 
-            plat_badge_threshold = plat_badge_thresholds.get(stat, 0)
-
-            if stat not in running_totals:
-                running_totals[stat] = {}
-
-            # Note: Expect this stat to be the last one in the for loop
-            if stat == "Platinum Badges":
-                data = []
-                for player in player_platinum_tracker:
-                    count = sum([1 for platname in plat_badge_thresholds.keys()
-                                 if player_platinum_tracker[player][platname]])
-                    running_totals["Platinum Badges"][player] = [count, month_year]
-                    data.append([count,
-                                 0,
-                                 player,
-                                 0,
-                                 0])
-                # Changedata for Platinum badges
-                # TODO in next comment line, last two may be swapped.
-                # list of tuples of: new val, ???, player, raw change, time averaged change
-                changedata = []
-                for player in player_platinum_increment.keys():
-                    # Also filter out new players, or first time adding type medals
-                    total_platinum_badges = sum(list(player_platinum_tracker[player].values()))
-                    # Only set changedata for players that had non-zero change
-                    if player_platinum_increment[player] != total_platinum_badges:
-                        # Crude: detect first time reporting type medals
-                        if player_platinum_increment[player] >= N_TYPE_MEDALS:
-                            player_platinum_increment[player] -= N_TYPE_MEDALS
-                        changedata.append((player_platinum_tracker[player],
-                                           player_platinum_increment[player],
-                                           player,
-                                           player_platinum_increment[player],  # TODO month-averaged not implemented
-                                           player_platinum_increment[player]
-                                           ))
-
-            elif stat == STATNAME_DEX_SUM:
-                #for player, dex_sum in dex_sums.items():
-                #    running_totals[STATNAME_DEX_SUM][player] = [dex_sum, month_year]
-                # TODO in next comment line, last two may be swapped.
-                # list of tuples of: new val, ???, player, raw change, time averaged change
-                changedata = []
-                # fill in running_totals and changedata
-                for player, dex_sum in dex_sums.items():
-                    # Skip for new players who have no running total
-                    if player not in running_totals[STATNAME_DEX_SUM]:
-                        running_totals[STATNAME_DEX_SUM][player] = [dex_sum, month_year]
-                        continue
-                    change = dex_sum - running_totals[STATNAME_DEX_SUM][player][0]
+        plat_badge_threshold = plat_badge_thresholds.get(stat, 0)
+
+        if stat not in running_totals:
+            running_totals[stat] = {}
+
+        # Note: Expect this stat to be the last one in the for loop
+        if stat == "Platinum Badges":
+            data = []
+            for player in player_platinum_tracker:
+                count = sum([1 for platname in plat_badge_thresholds.keys()
+                             if player_platinum_tracker[player][platname]])
+                running_totals["Platinum Badges"][player] = [count, month_year]
+                data.append([count,
+                             0,
+                             player,
+                             0,
+                             0])
+            # Changedata for Platinum badges
+            # TODO in next comment line, last two may be swapped.
+            # list of tuples of: new val, ???, player, raw change, time averaged change
+            changedata = []
+            for player in player_platinum_increment.keys():
+                # Also filter out new players, or first time adding type medals
+                total_platinum_badges = sum(list(player_platinum_tracker[player].values()))
+                # Only set changedata for players that had non-zero change
+                if player_platinum_increment[player] != total_platinum_badges:
+                    # Crude: detect first time reporting type medals
+                    if player_platinum_increment[player] >= N_TYPE_MEDALS:
+                        player_platinum_increment[player] -= N_TYPE_MEDALS
+                    changedata.append((player_platinum_tracker[player],
+                                       player_platinum_increment[player],
+                                       player,
+                                       player_platinum_increment[player],  # TODO month-averaged not implemented
+                                       player_platinum_increment[player]
+                                       ))
+
+        elif stat == STATNAME_DEX_SUM:
+            #for player, dex_sum in dex_sums.items():
+            #    running_totals[STATNAME_DEX_SUM][player] = [dex_sum, month_year]
+            # TODO in next comment line, last two may be swapped.
+            # list of tuples of: new val, ???, player, raw change, time averaged change
+            changedata = []
+            # fill in running_totals and changedata
+            for player, dex_sum in dex_sums.items():
+                # Skip for new players who have no running total
+                if player not in running_totals[STATNAME_DEX_SUM]:
                     running_totals[STATNAME_DEX_SUM][player] = [dex_sum, month_year]
-                    # Also filter out new players, or first time adding type medals
-                    #total_platinum_badges = sum(list(player_platinum_tracker[player].values()))
-                    # Only set changedata for players that had non-zero change
-                    if change:
-                    #if player_dex_sum_increment[player] != dex_sum:
-                        #if player_dex_sum_increment[player] >= N_TYPE_MEDALS:
-                        #    player_dex_sum_increment[player] -= N_TYPE_MEDALS
-                        changedata.append((dex_sum,
-                                           player_dex_sum_increment[player],
-                                           player,
-                                           change,  # TODO month-averaged not implemented
-                                           change
-                                           ))
-
-            elif stat not in report_fields:
-                # Typically this block is type medals and regional dex values;
-                # which we just want to see if the platinum threshold is crossed
-                if plat_badge_threshold > 0:
-                    for player in months_data.keys():
-                        # Some players didn't submit a row with type medal entries, so skip them here
-                        if stat not in months_data[player]:
-                            continue
-
-                        # The value here can be None, e.g. for many folks' Wayfarer badge
-                        if months_data[player][stat]["value"] \
-                                and months_data[player][stat]["value"] >= plat_badge_threshold:
-                            # TODO check if False -> True, and increment a platinum badge count change dict
-                            if not player_platinum_tracker[player][stat]:
-                                player_platinum_increment[player] += 1
-                            player_platinum_tracker[player][stat] = True
-            else:
-                # TODO(cleanup) Don't need these two list comprehensions to duplicate so much of each other.
-                # Update the ALL-TIME data (Absolutely a weird spot to do this, but feels nice to overoptimize sometimes)
-                # Build month's data: For a report field: [ [month-reported-total, diff, player], ...]
-                data = [(months_data[player][stat]["value"],
-                         'null',
-                         player,
-                         months_data[player][stat]["calculated_monthly_change"],
-                         months_data[player][stat]["calculated_with_tdelta"]
-                         ) for player in months_data.keys()
-                        if months_data[player][stat]["value"] != None]
-                # list of tuples of: new val, ???, player, raw change, time averaged change
-                changedata = [(months_data[player][stat]["value"],
-                               'null',  #months_data[player][stat]["change"],
-                               player,
-                               months_data[player][stat]["calculated_monthly_change"],
-                               months_data[player][stat]["calculated_with_tdelta"]
-                              )
-                              for player in months_data.keys()
-                              if months_data[player][stat]["calculated_monthly_change"] != None]
-
-                # Update each player's platinum badge dictionary
-                if plat_badge_threshold > 0:
-                    for player in months_data.keys():
-                        # The months_data value here can be None, e.g. for many folks' Wayfarer badge
-                        # (TODO the above comment may mostly apply to tl40data surveys?)
-                        if months_data[player][stat]["value"] \
-                                and months_data[player][stat]["value"] >= plat_badge_threshold:
-                            # TODO check if False -> True, and increment a platinum badge count change dict
-                            if not player_platinum_tracker[player][stat]:
-                                player_platinum_increment[player] += 1
-                            player_platinum_tracker[player][stat] = True
-
-            # We don't generate HTML for all stats (e.g. type medals)
-            if stat not in report_fields:
-                continue
-
-            # Update running totals (Note: for now, only for stats we report)
-            for tup in data:
-                month_reported_total = tup[0]
-                player = tup[2]
-                if player not in running_totals[stat]:  # Add for first time for player
-                    running_totals[stat][player] = [month_reported_total, month_year]
-                elif month_reported_total > running_totals[stat][player][0]:  # or update if higher
-                    running_totals[stat][player] = [month_reported_total, month_year]
+                    continue
+                change = dex_sum - running_totals[STATNAME_DEX_SUM][player][0]
+                running_totals[STATNAME_DEX_SUM][player] = [dex_sum, month_year]
+                # Also filter out new players, or first time adding type medals
+                #total_platinum_badges = sum(list(player_platinum_tracker[player].values()))
+                # Only set changedata for players that had non-zero change
+                if change:
+                #if player_dex_sum_increment[player] != dex_sum:
+                    #if player_dex_sum_increment[player] >= N_TYPE_MEDALS:
+                    #    player_dex_sum_increment[player] -= N_TYPE_MEDALS
+                    changedata.append((dex_sum,
+                                       player_dex_sum_increment[player],
+                                       player,
+                                       change,  # TODO month-averaged not implemented
+                                       change
+                                       ))
+
+        elif stat not in report_fields:
+            # Typically this block is type medals and regional dex values;
+            # which we just want to see if the platinum threshold is crossed
+            if plat_badge_threshold > 0:
+                for player in months_data.keys():
+                    # Some players didn't submit a row with type medal entries, so skip them here
+                    if stat not in months_data[player]:
+                        continue
 
-                if stat in DEX_NAMES:
-                    dex_sums[player] = dex_sums.get(player, 0) + month_reported_total
+                    # The value here can be None, e.g. for many folks' Wayfarer badge
+                    if months_data[player][stat]["value"] \
+                            and months_data[player][stat]["value"] >= plat_badge_threshold:
+                        # TODO check if False -> True, and increment a platinum badge count change dict
+                        if not player_platinum_tracker[player][stat]:
+                            player_platinum_increment[player] += 1
+                        player_platinum_tracker[player][stat] = True
+        else:
+            # TODO(cleanup) Don't need these two list comprehensions to duplicate so much of each other.
+            # Update the ALL-TIME data (Absolutely a weird spot to do this, but feels nice to overoptimize sometimes)
+            # Build month's data: For a report field: [ [month-reported-total, diff, player], ...]
+            data = [(months_data[player][stat]["value"],
+                     'null',
+                     player,
+                     months_data[player][stat]["calculated_monthly_change"],
+                     months_data[player][stat]["calculated_with_tdelta"]
+                     ) for player in months_data.keys()
+                    if months_data[player][stat]["value"] != None]
+            # list of tuples of: new val, ???, player, raw change, time averaged change
+            changedata = [(months_data[player][stat]["value"],
+                           'null',  #months_data[player][stat]["change"],
+                           player,
+                           months_data[player][stat]["calculated_monthly_change"],
+                           months_data[player][stat]["calculated_with_tdelta"]
+                          )
+                          for player in months_data.keys()
+                          if months_data[player][stat]["calculated_monthly_change"] != None]
+
+            # Update each player's platinum badge dictionary
+            if plat_badge_threshold > 0:
+                for player in months_data.keys():
+                    # The months_data value here can be None, e.g. for many folks' Wayfarer badge
+                    # (TODO the above comment may mostly apply to tl40data surveys?)
+                    if months_data[player][stat]["value"] \
+                            and months_data[player][stat]["value"] >= plat_badge_threshold:
+                        # TODO check if False -> True, and increment a platinum badge count change dict
+                        if not player_platinum_tracker[player][stat]:
+                            player_platinum_increment[player] += 1
+                        player_platinum_tracker[player][stat] = True
+
+        # We don't generate HTML for all stats (e.g. type medals)
+        if stat not in report_fields:
+            continue
 
+        # Update running totals (Note: for now, only for stats we report)
+        for tup in data:
+            month_reported_total = tup[0]
+            player = tup[2]
+            if player not in running_totals[stat]:  # Add for first time for player
+                running_totals[stat][player] = [month_reported_total, month_year]
+            elif month_reported_total > running_totals[stat][player][0]:  # or update if higher
+                running_totals[stat][player] = [month_reported_total, month_year]
+
+            if stat in DEX_NAMES:
+                dex_sums[player] = dex_sums.get(player, 0) + month_reported_total
+
+        # Copy the table rows now, since later months keep updating running_totals; ranked below
+        keyname = report_fields_dict[stat]
+        to_rank[keyname] = ([(player, total, reported_month)
+                             for player, (total, reported_month) in running_totals[stat].items()],
+                            [(item[2], item[3]) for item in changedata])  # normalized values
+        quip = random_quip() if APRIL_FOOLS and changedata else None
+        stat_tables.append(StatTables(stat, keyname, None, None, quip))
+
+        # Populate player response count from the first field we track
+        # This doesn't count players that took survey for first time;
+        # they have no month-to-month comparison to count here.
+        # NOTE: If I were to ever revisit how I handle surveys from the
+        # middle of a month, maybe this would be found to have edge cases.
+        if keyname == "total_xp":
+            player_count = len(changedata)
+
+    # Keep only each table's top rows
+    ranked = ranking.rank_leaderboards(to_rank)
+    stat_tables = [tables._replace(totals=ranked[tables.keyname][0], changes=ranked[tables.keyname][1])
+                   for tables in stat_tables]
+    month_tables = MonthTables(month_date, month_year, stat_tables, player_count)
+    return month_tables, running_totals, player_platinum_tracker, player_count, False
+
+
+def render_month_content(month_tables):
+    """Build the HTML div of a month's leaderboards from compute_monthly_tables() data
+
+    Like any dominate element, it's added to the enclosing document if called within a `with doc:`.
+    """
+    monthname = calendar.month_name[month_tables.month_date.month]
+    month_year = month_tables.month_year
+    content_div = div(cls="content")
+    with content_div:
+        for stat, keyname, totals, changes, quip in month_tables.stat_tables:
             # Generate the HTML for this stat
             metric_row = div(cls="row")
             with metric_row:
-                keyname = report_fields_dict[stat]
                 a(cls="anchor", id=keyname)  # link anchor, with negative y offset in stylesheet typically
                 div_icon = div(cls="iconcolumn")
                 with div_icon:
                     a(img(width=50, title=keyname, alt=keyname, src=f"{keyname}.png"), href=f"#{keyname}")
 
                 # Total all-time
-                totals_data = list(running_totals[stat].items())  # list of [player, total, datestr]
-                try:
-                    # TODO shouldn't need this int here, but we forgot to cast somewhere
-                    totals_data.sort(key=lambda x: -int(x[1][0]))
-                except TypeError:
-                    print(totals_data)
-                    raise
                 div_table1 = div(cls="column")
                 with div_table1:
-                    ranklength = 50 if keyname == "total_xp" else 20  # Treat total XP specially: show everyone!
                     table1 = table()
                     with table1:
                         th(f"{stat} — Total all time", colspan=3)
                         tr(td(b("Rank")), td(b("Player")), td(b(stat)))
                         [tr(td(cnt+1),
-                            td(item[0] + f"{item[1][1] if item[1][1] != month_year else ''}"),
-                            td(f"{item[1][0]:,}")
-                           ) for cnt, item in enumerate(totals_data[:ranklength])]
+                            td(player + f"{reported_month if reported_month != month_year else ''}"),
+                            td(f"{total:,}")
+                           ) for cnt, (player, total, reported_month) in enumerate(totals)]
 
                 # Monthly gains rankings
-                changedata.sort(key=lambda x: -x[3]) # normalized values
                 div_table2 = div(cls="column")
                 with div_table2:
                     table2_div = table()
@@ -534,32 +736,60 @@ def render_monthly_html(entries, month_date=None, running_totals=None, player_pl
                         tr(td(b("Rank")), td(b("Player")), td(b(stat)))
 
                         # Regular
-                        if not APRIL_FOOLS:
-                            [tr(td(cnt+1), td(item[2]), td(to_increment_str(item[3])))
-                                    for cnt, item in enumerate(changedata[:20])] # normalized value
+                        if quip is None:
+                            [tr(td(cnt+1), td(player), td(to_increment_str(change)))
+                                    for cnt, (player, change) in enumerate(changes)] # normalized value
 
                         # April fools
                         else:
-                            [tr(td(cnt+1), td(item[2]), td(to_increment_str(item[3]), img(width=25, src="prof_willow_round.webp"), sup(random_quip())))
-                                    for cnt, item in enumerate(changedata[0:1])] # normalized value # 1
-                            [tr(td(cnt+2), td(item[2]), td(to_increment_str(item[3])))
-                                    for cnt, item in enumerate(changedata[1:20])] # normalized value #s 2-20
+                            [tr(td(cnt+1), td(player), td(to_increment_str(change), img(width=25, src="prof_willow_round.webp"), sup(quip)))
+                                    for cnt, (player, change) in enumerate(changes[0:1])] # normalized value # 1
+                            [tr(td(cnt+2), td(player), td(to_increment_str(change)))
+                                    for cnt, (player, change) in enumerate(changes[1:20])] # normalized value #s 2-20
                         # End April fools
+    return content_div
 
-                # Populate player response count from the first field we track
-                # This doesn't count players that took survey for first time;
-                # they have no month-to-month comparison to count here.
-                # NOTE: If I were to ever revisit how I handle surveys from the
-                # middle of a month, maybe this would be found to have edge cases.
-                if keyname == "total_xp":
-                    player_count = len(changedata)
 
-    return content_div, running_totals, player_platinum_tracker, player_count, False
+def render_monthly_html(entries, month_date=None, running_totals=None, player_platinum_tracker=None,
+                        months_data=None):
+    """Return a list of HTML divs, one per calendar month, and data derived from entries
 
+    These are meant to be (one at a time) added to a parent HTML document.
+
+    Args:
+        entries: List of responses from Responses table in DB
+        month_date: Can specify month, but defaults to current month based on datetime.date.today().
+            This is a date object of the first day of a month.
+        running_totals: None or a dictionary. Stores latest data from previous months, so diffs
+            can be calculated
+        player_platinum_tracker: None or a dictionary
+        months_data: find_near_date(entries, month_date), if the caller already has it
 
-def load_entries_from_db():
+    Returns:
+        content_div: HTML
+        running_totals: Updated dictionary
+        player_platinum_tracker: Updated dictionary
+        player_count: Number of players with diffs in the current month.
+        aborted (bool): If True, did not have (valid) data to render for the month. Other
+            return values may simply be None, and should not be used
+    """
+    month_tables, running_totals, player_platinum_tracker, player_count, aborted = \
+            compute_monthly_tables(entries, month_date, running_totals, player_platinum_tracker, months_data)
+    if aborted:
+        return None, running_totals, player_platinum_tracker, None, True
+    return render_month_content(month_tables), running_totals, player_platinum_tracker, player_count, False
+
+
+def load_entries_from_db(snapshots_only=False, db_specifier=LOCAL_DB_SPECIFIER):
     """Read all entries from db into a giant dictionary
 
+    Args:
+        snapshots_only (bool): Only read each trainer's latest response per survey month, from the
+            monthly_snapshot table. The responses find_near_date picks are the same either way, but
+            add_monthly_changes may then compare against an older response for trainers who
+            submitted more than once in a month.
+        db_specifier (str): Defaults to LOCAL_DB_SPECIFIER
+
     Returns:
         entries: dict by user (lowercase), to subdict by "Response Date" (datetime.date) list values, containing
             dictionary of stat values.
@@ -567,8 +797,7 @@ def load_entries_from_db():
     entries = {}
 
     # Open DB
-    db_specifier = LOCAL_DB_SPECIFIER
-    engine = create_engine(db_specifier)
+    engine = get_engine(db_specifier, read_only=True)
     session = Session(engine)
 
     # Get our user ID lookup from the DB
@@ -576,7 +805,10 @@ def load_entries_from_db():
     users_lookup = {user.id: user.name for user in users}
 
     # Read all responses
-    responses = session.query(Response).all()
+    if snapshots_only:
+        responses = session.query(Response).join(MonthlySnapshot, MonthlySnapshot.response_id == Response.id).all()
+    else:
+        responses = session.query(Response).all()
     for response in responses:
         user = users_lookup[response.trainer_id]
         if user == "test" or user == "*_-#test":
@@ -594,90 +826,446 @@ def load_entries_from_db():
     return entries
 
 
+def iter_responses(db_specifier=LOCAL_DB_SPECIFIER, batch_size=1000):
+    """Every response as (user, date, entry) in timestamp order, read from the db in batches
+
+    Entries are as in load_entries_from_db(), but only one response is held in memory at a time.
+    """
+    engine = get_engine(db_specifier, read_only=True)
+    session = Session(engine)
+    users_lookup = {user.id: user.name for user in session.query(Trainer).all()}
+    responses = session.query(Response.trainer_id, Response.timestamp, Response.strdata) \
+                       .order_by(Response.timestamp_epoch, Response.id) \
+                       .yield_per(batch_size)
+    try:
+        for trainer_id, timestamp, strdata in responses:
+            user = users_lookup[trainer_id]
+            if user == "test" or user == "*_-#test":
+                continue
+            entry_date = datetime.date.fromtimestamp(float(timestamp))
+            yield user, entry_date, Stat.unpack_strdata(strdata, session, pad_data=True)
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def first_response_date(db_specifier=LOCAL_DB_SPECIFIER):
+    """Date of the oldest response, or None for an empty db"""
+    engine = get_engine(db_specifier, read_only=True)
+    session = Session(engine)
+    oldest = session.query(func.min(Response.timestamp_epoch)).scalar()
+    session.close()
+    engine.dispose()
+    return None if oldest is None else datetime.date.fromtimestamp(oldest)
+
+
+def month_ends(first_date, starting_date, day_delta=3):
+    """Last day of every month from the first one a first_date submission counts for, until starting_date
+
+    A submission within day_delta days after a month's end counts for that month (see find_near_date()).
+    """
+    month_date = first_date.replace(day=1) - datetime.timedelta(days=1)  # end of the previous month
+    if first_date > month_date + datetime.timedelta(days=day_delta):
+        month_date = first_date.replace(day=1) + relativedelta(months=1, days=-1)
+    dates = []
+    while month_date < starting_date:
+        dates.append(month_date)
+        month_date = (month_date + datetime.timedelta(days=1)) + relativedelta(months=1, days=-1)
+    return dates
+
+
+def file_digest(path):
+    """sha256 hex digest of a file's bytes"""
+    with open(path, 'rb') as fr:
+        return hashlib.sha256(fr.read()).hexdigest()
+
+
+def month_inputs_digest(static_digest, months_data, running_totals, player_platinum_tracker):
+    """Digest of everything a month page is generated from
+
+    Args:
+        static_digest: Digest of the inputs shared by all pages (config files, this script, the
+            month list in the page header); see main()
+        months_data: find_near_date() result for the month, including the calculated changes
+        running_totals, player_platinum_tracker: The state carried in from the previous months
+            (before render_monthly_html updates it)
+    """
+    hasher = hashlib.sha256(static_digest.encode())
+    # No sort_keys: dict order decides the order of tied leaderboard entries, so it's an input too
+    for part in (months_data, running_totals, player_platinum_tracker):
+        hasher.update(json.dumps(part).encode())
+    return hasher.hexdigest()
+
+
+def load_manifest(output_dir):
+    """{page date string: inputs digest} from the last run, or {} if there's no (readable) manifest"""
+    try:
+        with open(os.path.join(output_dir, MANIFEST_FILENAME), 'r') as fr:
+            return json.load(fr)["pages"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return {}
+
+
+def save_manifest(output_dir, pages):
+    with open(os.path.join(output_dir, MANIFEST_FILENAME), 'w') as fw:
+        json.dump({"pages": pages}, fw, indent=1)
+
+
+def asset_urls(published=None):
+    """{asset: URL used by the pages}, for the names from static_assets.publish_assets(), else the plain names"""
+    published = published or {}
+    return {asset: url_format.format(published.get(asset, asset)) for asset, url_format in ASSET_URL_FORMATS.items()}
+
+
+def month_options(starting_date, months=12):
+    """(label, page file) for the header's month drop-down, newest first: the months before starting_date"""
+    options = []
+    for m in range(months):
+        monthdate = starting_date + relativedelta(months=-1 * m, days=-1)  # e.g. 10-31-2021
+        month_year_str = calendar.month_name[monthdate.month] + " " + str(monthdate.year)
+        options.append((month_year_str, str(monthdate).rsplit("-", maxsplit=1)[0] + ".html"))
+    return options
+
+
+def render_month_page(report_fields_dict, starting_date, month_tables, months=12, assets=None):
+    """The complete HTML page for a month, as a string
+
+    Only depends on its arguments (plain, picklable data), so main() can run it in worker processes.
+
+    Args:
+        report_fields_dict: report_fields_1.json contents
+        starting_date: First day of the current month; the header links the months before it
+        month_tables: MonthTables from compute_monthly_tables()
+        months: Number of months the header links
+        assets: asset_urls() to link; defaults to the plain asset names
+    """
+    if assets is None:
+        assets = asset_urls()
+    report_fields = list(report_fields_dict.keys())
+    newmonthdate = month_tables.month_date
+
+    # Start of an HTML document
+    doc = dominate.document(title=PAGE_TITLE)
+    with doc.head:
+        link(rel='stylesheet', href=assets["style.css"])
+        meta(charset='utf-8')
+    with doc:
+        # TODO move to func?
+        # Top bar with linked icons, survey link, and dropdown
+        header_box = div(cls="headerbox", id="myHeader")
+        with header_box:
+            with div(cls="iconsbox"):
+                for key in report_fields:
+                    keyname = report_fields_dict[key]
+                    a(img(width=50, title=keyname, alt=keyname, src=f"{keyname}.png"), href=f"#{keyname}")
+                # Build drop-down selection for prior months
+                month_selector = select(name="months", id="months_select", onchange="monthSelect()")
+                with month_selector:
+                    option(calendar.month_name[newmonthdate.month] + " " + str(newmonthdate.year),
+                           value="index.html",  # to redirect to latest
+                           selected="selected")  # this one is the current value (selected) on page-load
+                    option("Latest",
+                           value="index.html")  # to redirect to latest
+                    for month_year_str, page in month_options(starting_date, months):
+                        option(month_year_str, value=page)
+                # Link to survey form
+                a("Submit survey data", href=SURVEY_LINK, cls="headerlinks")
+
+        # Tables for each stat
+        render_month_content(month_tables)
+        script(type='text/javascript', src=assets["scroll2.js"])
+
+    return str(doc)
+
+
+@functools.lru_cache(maxsize=None)
+def leaderboard_environment():
+    """The Jinja2 environment for leaderboard_templates/; one per process, so each template is compiled once"""
+    env = Environment(loader=FileSystemLoader(LEADERBOARD_TEMPLATE_DIR),
+                      autoescape=True,
+                      trim_blocks=True,
+                      lstrip_blocks=True,
+                      keep_trailing_newline=True,
+                      auto_reload=False)
+    env.filters["thousands"] = lambda val: f"{val:,}"
+    env.filters["increment"] = to_increment_str
+    return env
+
+
+class LeaderboardRenderer():
+    """Month pages from the Jinja2 templates in leaderboard_templates/; same HTML as render_month_page()
+
+    render_month_page() builds (and then serializes) a dominate element for every cell of every
+    table. Here the templates loop straight over the MonthTables tuples. The page header is the
+    same on every page except for the selected month, so it's rendered once, here, and reused.
+    Instances only hold strings, so they can be sent to worker processes.
+    """
+    def __init__(self, report_fields_dict, starting_date, months=12, assets=None):
+        """
+        Args: see render_month_page()
+        """
+        if assets is None:
+            assets = asset_urls()
+        env = leaderboard_environment()
+        self.assets = assets
+        self.header_top = Markup(env.get_template("header_top.html").render(
+                title=PAGE_TITLE, keynames=list(report_fields_dict.values()), assets=assets))
+        self.header_bottom = Markup(env.get_template("header_bottom.html").render(
+                months=month_options(starting_date, months), survey_link=SURVEY_LINK))
+
+    def generate(self, month_tables):
+        """The page for month_tables (from compute_monthly_tables()), as an iterator of HTML chunks"""
+        month_date = month_tables.month_date
+        monthname = calendar.month_name[month_date.month]
+        template = leaderboard_environment().get_template("month_page.html")
+        return template.generate(header_top=self.header_top,
+                                 header_bottom=self.header_bottom,
+                                 month_label=f"{monthname} {month_date.year}",
+                                 month_name=monthname,
+                                 month_year=month_tables.month_year,
+                                 stat_tables=month_tables.stat_tables,
+                                 assets=self.assets)
+
+    def render(self, month_tables):
+        """The page for month_tables, as a string"""
+        return "".join(self.generate(month_tables))
+
+
+def month_data(month_tables):
+    """A month's leaderboards as the compact JSON-able data leaderboard_templates/shell.html renders
+
+    Values are as displayed on the pages: all-time totals as is, but floats already formatted
+    (JSON doesn't keep 5760.0 apart from 5760), and monthly changes cut to ints like
+    to_increment_str() does.
+    """
+    month_date = month_tables.month_date
+    stats = []
+    for stat, keyname, totals, changes, quip in month_tables.stat_tables:
+        stat_data = {"stat": stat,
+                     "key": keyname,
+                     # [player, total], plus when it was reported if that's not this month
+                     "totals": [[player, total] if reported_month == month_tables.month_year
+                                else [player, total, reported_month]
+                                for player, total, reported_month in
+                                ((player, total if isinstance(total, int) else f"{total:,}", reported_month)
+                                 for player, total, reported_month in totals)],
+                     "changes": [[player, int(float(change))] for player, change in changes],
+                     }
+        if quip is not None:
+            stat_data["quip"] = quip
+        stats.append(stat_data)
+    return {"version": MONTH_DATA_VERSION,
+            "month": month_date.strftime("%Y-%m"),
+            "label": f"{calendar.month_name[month_date.month]} {month_date.year}",
+            "player_count": month_tables.player_count,
+            "stats": stats,
+            }
+
+
+def data_path_for(page_path):
+    """The <month>.json file next to a <month>.html page"""
+    return os.path.splitext(page_path)[0] + ".json"
+
+
+def write_if_changed(path, text):
+    """Write text to path, unless the file already has exactly that. Returns whether it wrote"""
+    try:
+        with open(path, 'r') as fr:
+            if fr.read() == text:
+                return False
+    except FileNotFoundError:
+        pass
+    with open(path, 'w') as fw:
+        fw.write(text)
+    return True
+
+
+def write_client_files(output_dir, report_fields_dict, months, assets=None):
+    """The months.json index and the leaderboards.html shell that renders the <month>.json files
+
+    Args:
+        output_dir: Where the pages go
+        report_fields_dict: report_fields_1.json contents
+        months: [(date string, label)] of the months with data files, newest first
+        assets: asset_urls() to link; defaults to the plain asset names
+    """
+    index = json.dumps({"version": MONTH_DATA_VERSION, "months": months}, separators=(",", ":"))
+    write_if_changed(os.path.join(output_dir, MONTHS_INDEX_FILENAME), index)
+    shell = leaderboard_environment().get_template("shell.html").render(
+            title=PAGE_TITLE, keynames=list(report_fields_dict.values()), survey_link=SURVEY_LINK,
+            version=MONTH_DATA_VERSION, shell_name=SHELL_FILENAME, assets=assets or asset_urls())
+    if write_if_changed(os.path.join(output_dir, SHELL_FILENAME), shell):
+        print(f"Updated {SHELL_FILENAME}")
+
+
+def write_pages(pages, htmls):
+    """Write rendered pages, in order
+
+    Args:
+        pages: (date_string, page_path, month_tables) per page
+        htmls: Iterable with, per page, its HTML as a string or as an iterable of string chunks
+    """
+    for (date_string, page_path, month_tables), html in zip(pages, htmls):
+        print("Generated page for", date_string, f"({month_tables.player_count} returning trainers)")
+        with open(page_path, 'w') as fr:
+            if isinstance(html, str):
+                fr.write(html)
+            else:
+                fr.writelines(html)
+        with open(data_path_for(page_path), 'w') as fw:
+            json.dump(month_data(month_tables), fw, separators=(",", ":"))
+
+
 def main(args):
     # ...
     with open(report_fields_path, 'r') as fr:
         report_fields_dict = json.load(fr)  # expect a list of strings matching field keys
     report_fields = list(report_fields_dict.keys())
 
-    entries = load_entries_from_db()
-
-    # Calculate monthly diffs
-    add_monthly_changes(entries, list(report_fields_dict.keys()))
+    db_specifier = local_db_specifier_from_file(args.db_file) if args.db_file else LOCAL_DB_SPECIFIER
 
     # Generate HTML for each month
     today_date = datetime.date.today()
     starting_date = datetime.date(day=1, year=today_date.year, month=today_date.month)
     #starting_date = datetime.date(day=1, year=2022, month=2)  # Manual override for testing
+    if args.all_history:
+        # Every month since the first survey, streaming the responses through once
+        first_date = first_response_date(db_specifier)
+        month_dates = month_ends(first_date, starting_date) if first_date else []
+        month_stream = stream_months(iter_responses(db_specifier), report_fields, month_dates)
+    else:
+        entries = load_entries_from_db(snapshots_only=args.from_snapshots, db_specifier=db_specifier)
+
+        # Calculate monthly diffs
+        MONTHLY_CHANGES_FUNCTIONS[args.monthly_changes](entries, list(report_fields_dict.keys()))
+
+        # last 12 months, starting from 12 months ago
+        month_dates = [starting_date + relativedelta(months=n, days=-1) for n in range(-11, 1)]  # e.g. 10-31-2021
+        month_stream = zip(month_dates, SubmissionIndex(entries).find_near_dates(month_dates))
     running_totals = None  # will become a dict
     player_platinum_tracker = None  # will become a dict
-    for n in range(-11, 1):  # last 12 months, starting from 12 months ago
-        newmonthdate = starting_date + relativedelta(months=n, days=-1)  # e.g. 10-31-2021
-
-        # Start of an HTML document
-        doc = dominate.document(title='PoGo Stats - San Jose')
-        with doc.head:
-            link(rel='stylesheet', href='style.css')
-            meta(charset='utf-8')
-        with doc:
-            # TODO move to func?
-            # Top bar with linked icons, survey link, and dropdown
-            header_box = div(cls="headerbox", id="myHeader")
-            with header_box:
-                with div(cls="iconsbox"):
-                    for key in report_fields:
-                        keyname = report_fields_dict[key]
-                        a(img(width=50, title=keyname, alt=keyname, src=f"{keyname}.png"), href=f"#{keyname}")
-                    # Build drop-down selection for prior months
-                    month_selector = select(name="months", id="months_select", onchange="monthSelect()")
-                    with month_selector:
-                        option(calendar.month_name[newmonthdate.month] + " " + str(newmonthdate.year),
-                               value="index.html",  # to redirect to latest
-                               selected="selected")  # this one is the current value (selected) on page-load
-                        option("Latest",
-                               value="index.html")  # to redirect to latest
-                        for m in range(12):
-                            monthdate = starting_date + relativedelta(months=-1 * m, days=-1)  # e.g. 10-31-2021
-                            month_year_str = calendar.month_name[monthdate.month] + " " + str(monthdate.year)
-                            option(month_year_str, value=str(monthdate).rsplit("-", maxsplit=1)[0] + ".html")
-                    # Link to survey form
-                    a("Submit survey data", href=SURVEY_LINK, cls="headerlinks")
-
-            # Tables for each stat
-            content, running_totals, player_platinum_tracker, player_count, aborted = \
-                    render_monthly_html(entries,
-                                        newmonthdate,
-                                        running_totals,
-                                        player_platinum_tracker)
-            if aborted:
-                print(f"Skipped month ending on: {newmonthdate} (render_monthly_html aborted; "
-                      "no or invalid data for month)")
-                continue
-            script(type='text/javascript', src='static/scroll2.js')
 
+    # Shared assets, under names that change with their content, so they can be cached for good
+    output_dir = args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+    assets = asset_urls(publish_assets(ASSET_SOURCE_DIR, output_dir) if args.hashed_assets else None)
+
+    # Only rewrite pages whose inputs changed since the last run. Inputs shared by every page:
+    static_hasher = hashlib.sha256()
+    code_paths = [__file__, ranking.__file__]
+    code_paths += [os.path.join(LEADERBOARD_TEMPLATE_DIR, name)
+                   for name in sorted(os.listdir(LEADERBOARD_TEMPLATE_DIR))]
+    for path in [report_fields_path, platinum_counts_path] + code_paths:
+        static_hasher.update(file_digest(path).encode())
+    static_hasher.update(f"{starting_date} {len(month_dates)} {APRIL_FOOLS} {sorted(assets.items())}".encode())
+    static_digest = static_hasher.hexdigest()
+    old_manifest = load_manifest(output_dir)
+    manifest = {}
+    skipped = []
+
+    # Phase one: each month's tables and carried state, in order
+    pages = []  # (date_string, page_path, month_tables) for the pages to (re)write
+    index_source = None
+    for newmonthdate, months_data in month_stream:
         date_string = str(newmonthdate).rsplit("-", maxsplit=1)[0]
-        print("Generated page for", date_string, f"({player_count} returning trainers)")
-        with open(f"html/{date_string}.html", 'w') as fr:
-            fr.write(str(doc))
-
-        if n == 0:  # copy first generated page to be our 'html/index.html'
-            try:
-                shutil.copy(f"html/{date_string}.html", "html/index.html")
-                print("Copied most recent month to 'html/index.html'")
-            except shutil.SameFileError:
-                pass
-            except PermissionError:
-                print("Weird. A permission error when copying to 'html/index.html'...")
-            except Exception as e:
-                print("an unexpected Exception occurred that I was too lazy to predict...")
-                raise
+        page_path = os.path.join(output_dir, f"{date_string}.html")
+        inputs_digest = month_inputs_digest(static_digest, months_data, running_totals, player_platinum_tracker)
+
+        # Tables for each stat
+        month_tables, running_totals, player_platinum_tracker, player_count, aborted = \
+                compute_monthly_tables(None,  # months_data is all it needs
+                                       newmonthdate,
+                                       running_totals,
+                                       player_platinum_tracker,
+                                       months_data=months_data)
+        if aborted:
+            print(f"Skipped month ending on: {newmonthdate} (compute_monthly_tables aborted; "
+                  "no or invalid data for month)")
+            continue
 
+        manifest[date_string] = inputs_digest
+        if not args.force and old_manifest.get(date_string) == inputs_digest and os.path.exists(page_path) \
+                and os.path.exists(data_path_for(page_path)):
+            skipped.append(date_string)
+        else:
+            pages.append((date_string, page_path, month_tables))
+        if newmonthdate == month_dates[-1]:
+            index_source = page_path
+
+    # Phase two: the HTML documents, which only depend on their month's tables
+    if args.renderer == "jinja":
+        renderer = LeaderboardRenderer(report_fields_dict, starting_date, len(month_dates), assets)
+        render, generate = renderer.render, renderer.generate
+    else:
+        render = generate = functools.partial(render_month_page, report_fields_dict, starting_date,
+                                              months=len(month_dates), assets=assets)
+    if args.jobs > 1 and len(pages) > 1:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(pages))) as pool:
+            write_pages(pages, pool.map(render, [month_tables for _, _, month_tables in pages]))
+    else:
+        # Stream each page to its file rather than building it in memory first
+        write_pages(pages, map(generate, [month_tables for _, _, month_tables in pages]))
 
-if __name__ == "__main__":
+    if index_source:  # copy the latest month's page to be our 'html/index.html'
+        try:
+            shutil.copy(index_source, os.path.join(output_dir, "index.html"))
+            print("Copied most recent month to 'html/index.html'")
+        except shutil.SameFileError:
+            pass
+        except PermissionError:
+            print("Weird. A permission error when copying to 'html/index.html'...")
+        except Exception as e:
+            print("an unexpected Exception occurred that I was too lazy to predict...")
+            raise
+
+    # Client-side rendering of the same data: the newest month's data file is all that changes monthly
+    months = [(date_string, f"{calendar.month_name[int(date_string[5:])]} {date_string[:4]}")
+              for date_string in sorted(manifest, reverse=True)]
+    write_client_files(output_dir, report_fields_dict, months, assets)
+
+    if args.compress:
+        written = precompress_dir(output_dir)
+        if written:
+            print(f"Wrote {written} precompressed file(s) (.gz/.br) for the server to send as is")
+
+    save_manifest(output_dir, manifest)
+    if skipped:
+        print(f"Skipped {len(skipped)} unchanged page(s): {', '.join(skipped)} (use --force to regenerate)")
+
+
+def make_parser():
     parser = ArgumentParser(description="Load/process the sqlite3 database, "
                                         "and generate HTML stat pages for past several months.")
     #parser.add_argument("file", default="pogo_sj_stats_oct2021.csv",
     #                    help="CSV file from google sheets, containing entire history of form responses")
-    args = parser.parse_args()
+    parser.add_argument("--force", action="store_true",
+                        help="Regenerate every month page, even if its inputs are unchanged since the last run "
+                             f"(per <output-dir>/{MANIFEST_FILENAME}).")
+    parser.add_argument("--jobs", "-j", type=int, default=1,
+                        help="Render month pages in this many worker processes. Default: %(default)s")
+    parser.add_argument("--renderer", choices=["jinja", "dominate"], default="jinja",
+                        help="How to build the HTML pages (same output): the templates in leaderboard_templates/, "
+                             "or dominate. Default: %(default)s")
+    parser.add_argument("--monthly-changes", choices=sorted(MONTHLY_CHANGES_FUNCTIONS), default="numpy",
+                        help="Implementation of add_monthly_changes to use (same results). Default: %(default)s")
+    parser.add_argument("--output-dir", default="html", help="Default: %(default)s")
+    parser.add_argument("--no-hashed-assets", dest="hashed_assets", action="store_false",
+                        help=f"Link style.css and scroll2.js as is, instead of copies from {ASSET_SOURCE_DIR} "
+                             "named by a hash of their content.")
+    parser.add_argument("--no-compress", dest="compress", action="store_false",
+                        help="Don't write .gz (and .br, if the brotli module is installed) copies of the pages, "
+                             "data files and assets.")
+    parser.add_argument("--db-file", default=None,
+                        help="sqlite db file to read, instead of the one configured in settings.py")
+    parser.add_argument("--all-history", action="store_true",
+                        help="Generate a page for every month since the first survey (not just the last 12), "
+                             "with all-time totals from the whole history. Reads the responses one at a time, "
+                             "in one pass.")
+    parser.add_argument("--from-snapshots", action="store_true",
+                        help="Read only each trainer's latest response per month (the monthly_snapshot table) "
+                             "instead of every response. See load_entries_from_db().")
+    return parser
 
-    main(args)
+
+if __name__ == "__main__":
+    main(make_parser().parse_args())
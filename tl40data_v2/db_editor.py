@@ -7,13 +7,13 @@ import datetime
 # Third party
 from thefuzz import process
 from sqlalchemy.orm import registry, declarative_base, relationship, Session
-from sqlalchemy import create_engine, event
+from sqlalchemy import event
 from sqlalchemy.orm.exc import NoResultFound, UnmappedInstanceError
 import sqlite3
 
 # Local
-from tables import Stat, Response, Trainer
-from settings import LOCAL_DB_SPECIFIER, local_db_specifier_from_file
+from tables import Stat, Response, Trainer, survey_month
+from settings import LOCAL_DB_SPECIFIER, get_engine, local_db_specifier_from_file
 
 # Use: Launch this from my generate-stats bash script.
 
@@ -66,7 +66,7 @@ class Editor():
             db_specifier = local_db_specifier_from_file(db_filepath)
         else:
             db_specifier = LOCAL_DB_SPECIFIER
-        engine = create_engine(db_specifier)
+        engine = get_engine(db_specifier)
         self.session = Session(engine)
 
         self.changed = False
@@ -139,10 +139,8 @@ class Editor():
             #    stat_data_dict[k] = v
             # Then make the values a single string.
             stats_strdata = Stat.repack_strdata(self.stats)
-            survey.strdata = stats_strdata  # Untested
+            survey.update_strdata(self.session, stats_strdata)  # Untested
 
-            self.session.add(survey)  # A response object
-            self.session.flush()
             self.session.commit()
             self.changed = False
 
@@ -162,23 +160,12 @@ class Editor():
 
 
 def report_month_year(timestamp):
-    # Convert the timestamp to a datetime object
-    date = datetime.datetime.fromtimestamp(float(timestamp))
-    
-    # Check if the day is one of the first three days
-    if date.day <= 3:
-        # Move to the previous month
-        first_day_of_current_month = date.replace(day=1)
-        last_day_of_previous_month = first_day_of_current_month - datetime.timedelta(days=1)
-        month = last_day_of_previous_month.month
-        year = last_day_of_previous_month.year
-    else:
-        month = date.month
-        year = date.year
-    
+    # Submissions in the first few days of a month count for the previous month
+    year, month = (int(part) for part in survey_month(timestamp).split("-"))
+
     # Convert month to a full month name
     month_name = datetime.datetime(year, month, 1).strftime("%B")
-    
+
     return month_name, year
 
 def confirm(prompt):
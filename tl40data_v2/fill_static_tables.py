@@ -3,18 +3,17 @@
 # Standard library
 from argparse import ArgumentParser
 import json
-from tables import Stat
+from tables import Stat, bump_schema_version
 
 # Third party
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.exc import OperationalError
-from sqlalchemy import create_engine
 from sqlalchemy.engine import ExceptionContext
 
 # Local
-from settings import LOCAL_DB_SPECIFIER, LOCAL_DB_FILENAME
+from settings import LOCAL_DB_SPECIFIER, LOCAL_DB_FILENAME, get_engine
 
 
 def fill_stats(session: Session, changed: bool = False):
@@ -50,13 +49,19 @@ def fill_stats(session: Session, changed: bool = False):
             stat.order_idx = existing_stat_idx
         else:  # add new stat in the database; its idx is essentially len(stats)
             print(f"Adding '{stat_name}' to 'stats' table...")
-            stat = Stat(name=stat_name, order_idx=new_stat_order_idx,
-                        **dict(zip(json_stat_names, json_stat_vals[stat_name])))
+            stat_data = dict(zip(json_stat_names, json_stat_vals[stat_name]))
+            stat_data.pop('category', None)  # Only in stats.json; not a Stat column
+            stat = Stat(name=stat_name, order_idx=new_stat_order_idx, **stat_data)
             changed = True
             new_stat_order_idx += 1  # increment idx for the next new stat
 
         session.add(stat)
 
+    if changed:
+        # Let anything caching the stat table's ordering (see tables.Stat.get_schema) know
+        session.flush()
+        bump_schema_version(session)
+
     return changed
 
 # No static trainer or response data, unless we're testing something
@@ -70,8 +75,7 @@ def main(args):
     changed = False
 
     db_specifier = LOCAL_DB_SPECIFIER
-    #engine = get_engine(db_specifier)
-    engine = create_engine(db_specifier)
+    engine = get_engine(db_specifier)
     session = Session(engine, autoflush=True)
     changed = fill_stats(session) or changed
     try:
@@ -1,10 +1,14 @@
 # Read config.toml; just need the login line
 login=$(grep login config.toml | cut -d' ' -f3 | tr -d '"')
+source "$(dirname "$0")/remote_db.bash"
 
 local_db_location="pogo_sj.db"  # TODO get this from config.toml
 remote_db_location="/home/public/db/pogo_sj.db"
 # Grab database from server
 echo "Grabbing current DB from server..."
+# The app keeps the db in WAL mode (see settings.get_engine), so recent submissions can still be in
+# pogo_sj.db-wal. Fold them into the main db file first, so that the copy is complete.
+checkpoint_remote_db $remote_db_location
 scp $login:/home/public/db/pogo_sj.db .
 
 if [ "$EXIT_AFTER_GRAB" = 'true' ]; then
@@ -38,7 +42,7 @@ if [[ "$answer" = "y" ]]; then
     echo "Did you make changes and want to upload the modified DB to the server? (y/n)"
     read -r answer
     if [[ "$answer" = "y" ]]; then
-        scp $local_db_location $login:$remote_db_location
+        replace_remote_db $local_db_location $remote_db_location
     fi
 fi
 
@@ -62,9 +66,13 @@ if [[ "$answer" != "y" ]]; then
     exit 0
 fi
 
-# Upload
-python3 upload_prompter.py
-files=$(cat upload_list.txt)
-#echo scp $files $login:/home/public/static/
-scp $files $login:/home/public/static/
+# Upload only the files that changed since the last upload (see upload_planner.py), in one transfer
+python3 upload_planner.py --tar upload.tar
+if [ ! -f upload.tar ]; then
+    echo "All done!"
+    exit 0
+fi
+scp upload.tar $login:/home/public/static/ \
+    && ssh $login "cd /home/public/static && tar -xf upload.tar && rm upload.tar" \
+    && python3 upload_planner.py --mark-uploaded
 echo "All done!"
@@ -0,0 +1,247 @@
+#! /usr/bin/env python3
+
+"""Asynchronous ingest of survey submissions, for the 1st-of-the-month rush.
+
+Instead of every Flask request thread opening a session and competing for the sqlite write lock,
+validated submissions are put in a bounded queue, and a single writer thread saves them in batches
+(many Response rows per commit).
+
+Each submission is first appended to a spill file (a JSON-lines journal) and fsync'd, so a
+submission that was accepted but not yet written survives a restart of the app: on start(),
+journal entries that were never marked done are queued again. Replays are idempotent, since a
+response with the same trainer and timestamp is not saved twice.
+"""
+
+# Standard library
+import json
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+
+# Third party
+from sqlalchemy.orm import Session
+
+# Local
+from tables import Response, Trainer, notify_response_saved
+
+
+_STOP = object()  # queue sentinel for the writer thread
+
+
+class SubmissionIngester():
+    """Bounded queue of survey submissions, saved to the db by one writer thread with group commits
+
+    Usage:
+        ingester = SubmissionIngester(engine, "ingest_spill.jsonl")
+        ingester.start()
+        ingester.submit(request.values.to_dict())  # returns once journaled and queued
+        ...
+        ingester.stop()
+    """
+    def __init__(self, engine, spill_path, maxsize=1000, batch_size=50, batch_wait=0.05, fsync=True):
+        """
+        Args:
+            engine: sqlalchemy engine for the db, e.g. from settings.get_engine()
+            spill_path (str): The journal file of not-yet-written submissions
+            maxsize (int): Queue bound; submit() raises queue.Full beyond this
+            batch_size (int): Most submissions saved per commit
+            batch_wait (float): Seconds the writer waits for more submissions to fill a batch
+            fsync (bool): fsync the journal on each submit, so an accepted submission survives a crash
+        """
+        self.engine = engine
+        self.spill_path = spill_path
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.fsync = fsync
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._journal_lock = threading.Lock()  # guards the spill file, _next_seq and _pending
+        self._journal = None
+        self._next_seq = 0
+        self._pending = set()  # seqs journaled but not written yet
+        self._thread = None
+        self._counts = {"submitted": 0, "replayed": 0, "written": 0, "duplicates": 0, "failed": 0, "batches": 0}
+        self._write_seconds = 0.0
+
+    def start(self):
+        """Replay unfinished submissions from the spill file, then start the writer thread"""
+        pending = self._read_journal()
+        torn = self._ends_with_torn_line()
+        self._journal = open(self.spill_path, 'a', encoding="utf-8")
+        if torn:
+            # Don't append the next entry to the torn line, where it couldn't be read back either
+            self._journal.write("\n")
+            self._journal.flush()
+        with self._journal_lock:
+            self._pending.update(item["seq"] for item in pending)
+        self._counts["replayed"] = len(pending)
+        if pending:
+            print(f"ingest: replaying {len(pending)} unsaved submission(s) from {self.spill_path}")
+        self._thread = threading.Thread(target=self._writer, name="ingest-writer", daemon=True)
+        self._thread.start()
+        # After starting the writer: there can be more pending submissions than fit in the queue
+        # (a full queue plus the batch being written)
+        for item in pending:
+            self._queue.put(item)
+
+    def submit(self, response_values, timestamp=None):
+        """Journal and enqueue one validated submission; does not wait for the db write.
+
+        Args:
+            response_values (dict): {stat icon: value}, plus "trainername"; see Response.save_response
+            timestamp (str, optional): Defaults to now, i.e. when the trainer submitted
+
+        Raises:
+            queue.Full: The writer is too far behind; caller should save synchronously instead
+        """
+        if not timestamp:
+            timestamp = str(time.time())
+        with self._journal_lock:
+            if self._queue.full():
+                raise queue.Full
+            item = {"seq": self._next_seq, "timestamp": timestamp, "values": dict(response_values)}
+            self._next_seq += 1
+            self._journal.write(json.dumps(item) + "\n")
+            self._journal.flush()
+            if self.fsync:
+                os.fsync(self._journal.fileno())
+            self._pending.add(item["seq"])
+            self._queue.put_nowait(item)
+            self._counts["submitted"] += 1
+
+    def stop(self, timeout=None):
+        """Write everything still queued, then stop the writer thread"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+        self._thread = None
+        with self._journal_lock:
+            self._journal.close()
+            self._journal = None
+
+    def stats(self):
+        """Counters for monitoring/benchmarking, plus writer throughput in submissions per busy second"""
+        stats = dict(self._counts)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["write_seconds"] = self._write_seconds
+        stats["writes_per_second"] = self._counts["written"] / self._write_seconds if self._write_seconds else None
+        return stats
+
+    def _read_journal(self):
+        """Submissions in the spill file that were never marked done, in submission order"""
+        if not os.path.exists(self.spill_path):
+            return []
+        items = {}
+        with open(self.spill_path, 'r', encoding="utf-8") as fr:
+            for line in fr:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash mid-write; it was never acknowledged
+                if "done" in entry:
+                    for seq in entry["done"]:
+                        items.pop(seq, None)
+                else:
+                    items[entry["seq"]] = entry
+        if items:
+            self._next_seq = max(items) + 1
+        return [items[seq] for seq in sorted(items)]
+
+    def _ends_with_torn_line(self):
+        """Whether the spill file's last line is missing its newline, i.e. was cut off by a crash"""
+        if not os.path.exists(self.spill_path) or os.path.getsize(self.spill_path) == 0:
+            return False
+        with open(self.spill_path, 'rb') as fr:
+            fr.seek(-1, os.SEEK_END)
+            return fr.read(1) != b"\n"
+
+    def _mark_done(self, seqs):
+        with self._journal_lock:
+            self._pending.difference_update(seqs)
+            if not self._pending:
+                # Nothing outstanding: start the journal over rather than letting it grow forever
+                self._journal.truncate(0)
+                self._journal.seek(0)
+            else:
+                self._journal.write(json.dumps({"done": seqs}) + "\n")
+            self._journal.flush()
+
+    def _writer(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            start = time.perf_counter()
+            self._write_batch(batch)
+            self._write_seconds += time.perf_counter() - start
+            self._counts["batches"] += 1
+            self._mark_done([item["seq"] for item in batch])
+
+    def _write_batch(self, batch):
+        """Save a batch with one commit; if that fails, fall back to one commit per submission
+
+        The response_saved_listeners are called for the saved trainers once it's all committed.
+        """
+        session = Session(self.engine)
+        saved = []  # trainers of committed submissions
+        try:
+            try:
+                batch_saved = [self._save(session, item) for item in batch]
+                session.commit()
+                saved.extend(batch_saved)
+                self._count_saved(batch_saved)
+            except Exception:
+                session.rollback()
+                traceback.print_exc()
+                print("ingest: batch failed; retrying its submissions one at a time", file=sys.stderr)
+                for item in batch:
+                    try:
+                        trainer = self._save(session, item)
+                        session.commit()
+                        saved.append(trainer)
+                        self._count_saved([trainer])
+                    except Exception:
+                        session.rollback()
+                        self._counts["failed"] += 1
+                        traceback.print_exc()
+                        # Keep a copy to recover by hand; the journal entry gets marked done regardless
+                        with open(self.spill_path + ".failed", 'a', encoding="utf-8") as fw:
+                            fw.write(json.dumps(item) + "\n")
+        finally:
+            session.close()
+        notify_response_saved(sorted({trainer for trainer in saved if trainer}))
+
+    def _count_saved(self, saved):
+        """Count committed submissions, given _save()'s results for them"""
+        self._counts["duplicates"] += saved.count(None)
+        self._counts["written"] += len(saved) - saved.count(None)
+
+    def _save(self, session, item):
+        """Save one journaled submission in the session's transaction, unless already saved
+
+        Returns:
+            The trainer's (lowercase) name if saved, None for a duplicate
+        """
+        already_saved = session.query(Response.id).join(Trainer, Trainer.id == Response.trainer_id) \
+                               .filter(Trainer.name == item["values"]["trainername"].lower(),
+                                       Response.timestamp_epoch == float(item["timestamp"])).first()
+        if already_saved:
+            return None
+        Response.save_response(session, item["values"], timestamp=item["timestamp"], commit=False)
+        return item["values"]["trainername"].lower()
@@ -0,0 +1,80 @@
+"""A small in-memory cache of rendered pages, bounded by size and age
+
+app.py keeps the survey page of returning trainers here (see survey_page_key()): it only changes
+when the trainer submits again, or stats.json, stat_help.json or the stat table change, all of
+which are part of the key. Saving a response also drops the trainer's pages right away
+(tables.response_saved_listeners), and the age bound covers edits made outside the app, e.g.
+with db_editor.py.
+"""
+
+# Standard library
+from collections import OrderedDict, namedtuple
+import hashlib
+import threading
+import time
+
+
+# html: the page; etag: an ETag for it (from its content); created: clock() when cached
+CachedPage = namedtuple("CachedPage", ["html", "etag", "created"])
+
+
+def page_etag(html):
+    return hashlib.sha256(html.encode()).hexdigest()[:32]
+
+
+class PageCache():
+    """LRU cache of CachedPage by key, where keys are tuples starting with a trainer's (lowercase) name
+
+    Thread-safe.
+    """
+    def __init__(self, max_entries=256, ttl=600, clock=time.monotonic):
+        """
+        Args:
+            max_entries (int): Least recently used pages are dropped beyond this
+            ttl (float): Seconds a page is served from the cache for
+            clock: Function returning the current time in seconds
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pages)
+
+    def get(self, key):
+        """The CachedPage for key, or None if there's none (or it's expired)"""
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None and self.clock() - page.created >= self.ttl:
+                del self._pages[key]
+                page = None
+            if page is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key, html):
+        """Cache html for key. Returns the CachedPage"""
+        page = CachedPage(html, page_etag(html), self.clock())
+        with self._lock:
+            self._pages[key] = page
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return page
+
+    def invalidate_trainer(self, name):
+        """Drop every page whose key starts with the trainer's name"""
+        with self._lock:
+            for key in [key for key in self._pages if key[0] == name]:
+                del self._pages[key]
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
@@ -1,5 +1,6 @@
 # Read config.toml; just need the login line
 login=$(grep login config.toml | cut -d' ' -f3 | tr -d '"')
+source "$(dirname "$0")/remote_db.bash"
 
 local_db_location="pogo_sj.db"  # TODO get this from config.toml
 remote_db_location="/home/public/db/pogo_sj.db"
@@ -7,5 +8,5 @@ remote_db_location="/home/public/db/pogo_sj.db"
 echo "Are you sure you want to upload the local DB to the server? (y/n)"
 read -r answer
 if [[ "$answer" = "y" ]]; then
-    scp $local_db_location $login:$remote_db_location
+    replace_remote_db $local_db_location $remote_db_location
 fi
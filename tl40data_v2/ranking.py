@@ -0,0 +1,75 @@
+"""Top-K leaderboard rows, without sorting every trainer
+
+Each leaderboard table only shows its top 20 rows (50 for Total XP), so rather than sorting every
+trainer's value, the k-th largest value is found with numpy's partition (linear time), and only
+the rows at or above it are sorted.
+
+Rows with equal values keep the order they were given in, as with a stable sort. At the cut-off,
+ties are either cut like sorted(...)[:k] does (TIES_FIRST), or all kept (TIES_INCLUDE), so a table
+may then run past k rows.
+"""
+
+# Third party
+import numpy as np
+
+
+TOP_K_DEFAULT = 20
+TOP_K = {"total_xp": 50}  # by report field keyname. Treat total XP specially: show everyone!
+TIES_FIRST = "first"
+TIES_INCLUDE = "include"
+
+
+def top_k_indices(values, k, ties=TIES_FIRST):
+    """Indices of the k largest values, largest first
+
+    Args:
+        values: 1-D sequence of numbers
+        k (int): Number of rows wanted
+        ties: TIES_FIRST or TIES_INCLUDE; what to do with rows tied with the k-th largest value
+
+    Returns:
+        numpy array of indices into values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if n > k:
+        threshold = np.partition(values, n - k)[n - k]  # the k-th largest
+        above = np.flatnonzero(values > threshold)
+        tied = np.flatnonzero(values == threshold)
+        if ties == TIES_FIRST:
+            tied = tied[:k - len(above)]
+        elif ties != TIES_INCLUDE:
+            raise ValueError(f"Unknown ties option: {ties}")
+        candidates = np.sort(np.concatenate([above, tied]))  # back in given order, for the stable sort
+    else:
+        candidates = np.arange(n)
+    return candidates[np.argsort(-values[candidates], kind="stable")]
+
+
+def top_k_rows(rows, k, value_idx=1, ties=TIES_FIRST):
+    """The k rows with the largest rows[i][value_idx], largest first; see top_k_indices()"""
+    return [rows[idx] for idx in top_k_indices([row[value_idx] for row in rows], k, ties)]
+
+
+def rank_leaderboards(tables, top_k=None, default_k=TOP_K_DEFAULT, ties=TIES_FIRST):
+    """Top-K rows of every stat's all-time and monthly-gain tables
+
+    Args:
+        tables: dict by keyname of (totals, changes), unsorted. totals is a list of
+            (player, total, reported_month); changes a list of (player, change).
+        top_k: dict of {keyname: k}, for stats that don't show default_k rows. Defaults to TOP_K.
+        default_k (int): Rows per table for other stats. Monthly-gain tables always use this.
+        ties: TIES_FIRST or TIES_INCLUDE
+
+    Returns:
+        dict by keyname of (totals, changes), each cut to its top-K rows, largest first
+    """
+    if top_k is None:
+        top_k = TOP_K
+    ranked = {}
+    for keyname, (totals, changes) in tables.items():
+        ranked[keyname] = (top_k_rows(totals, top_k.get(keyname, default_k), ties=ties),
+                           top_k_rows(changes, default_k, ties=ties))
+    return ranked
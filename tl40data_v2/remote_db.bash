@@ -0,0 +1,26 @@
+# Shared by push_db.bash and grab_and_push_updates.bash; source it after setting $login.
+# The app keeps the db in WAL mode (see settings.get_engine), so the db file alone isn't the whole db
+# while the app runs, and the app has it open (and memory-mapped). So:
+
+# Fold recent writes from <remote db>-wal into the db file itself, e.g. before copying it.
+# Usage: checkpoint_remote_db <remote db path>
+checkpoint_remote_db() {
+    ssh $login "python3 -c 'import sqlite3; sqlite3.connect(\"$1\").execute(\"PRAGMA wal_checkpoint(TRUNCATE)\")'"
+}
+
+# Replace the server's db with a local file: upload it next to the live db first, then with the app
+# stopped, checkpoint the old db and move the new file into place, dropping the old -wal/-shm files
+# so none of their frames get applied to the new db. Then the app can be started again.
+# Usage: replace_remote_db <local db path> <remote db path>
+replace_remote_db() {
+    local local_db=$1
+    local remote_db=$2
+    local remote_tmp="$remote_db.upload"
+    scp "$local_db" "$login:$remote_tmp" || return 1
+    echo "Uploaded to $remote_tmp. Now stop the app on the server, then press enter to swap the DB in."
+    read -r
+    checkpoint_remote_db "$remote_db" \
+        && ssh $login "mv '$remote_tmp' '$remote_db' && rm -f '$remote_db-wal' '$remote_db-shm'" \
+        || { echo "Replacing the DB failed; the server's DB is unchanged (upload left at $remote_tmp)."; return 1; }
+    echo "DB replaced. Start the app on the server again."
+}
@@ -1,6 +1,10 @@
 # Standard library
 import os
 
+# Third party
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
 
 # sqlite3/sqlalchemy
 LOCAL_DB_DIR = os.path.abspath(os.curdir)  # may need to modify this path depending on hosting provider setup
@@ -12,6 +16,14 @@ LOCAL_DB_SPECIFIER = (LOCAL_DB_SPECIFIER_BASE
                       + LOCAL_DB_OPTIONS)
 TEST_USER = "test_user"
 PLOT_DIR = LOCAL_DB_DIR
+INGEST_SPILL_PATH = os.path.join(LOCAL_DB_DIR, "ingest_spill.jsonl")  # see ingest.py
+
+# sqlite tuning, applied to every connection made by get_engine()
+SQLITE_CACHE_SIZE_KIB = 64 * 1024  # page cache per connection
+SQLITE_MMAP_SIZE = 256 * 1024 * 1024  # the whole db fits in this for the foreseeable future
+SQLITE_BUSY_TIMEOUT_MS = 10000  # wait this long on a locked db before "database is locked"
+ENGINE_POOL_SIZE = 5  # roughly the number of concurrent flask request threads we expect
+ENGINE_MAX_OVERFLOW = 10
 
 def local_db_specifier_from_file(filepath):
     """Returns a DB specifier to use instead of the default LOCAL_DB_SPECIFIER
@@ -20,3 +32,47 @@ def local_db_specifier_from_file(filepath):
                     + os.path.abspath(filepath)  # TODO check if this is robust for various scenarios
                     + LOCAL_DB_OPTIONS)
     return db_specifier
+
+
+def get_engine(db_specifier=LOCAL_DB_SPECIFIER, read_only=False):
+    """Create an sqlalchemy engine for the sqlite db, tuned for our usage. Use this instead of create_engine().
+
+    Every connection gets:
+    - WAL journal mode, so readers (survey GETs, the API) don't block on the survey writer or vice versa
+    - synchronous=NORMAL, which is safe with WAL; only the last commits can be lost on power loss
+    - a larger page cache, memory-mapped reads, and a busy timeout instead of immediate "database is locked"
+
+    Args:
+        db_specifier (str): Defaults to LOCAL_DB_SPECIFIER; see also local_db_specifier_from_file()
+        read_only (bool): For batch jobs like dashboard generation; connections refuse writes
+            (PRAGMA query_only), and a single pooled connection is kept.
+
+    Returns:
+        sqlalchemy.engine.Engine
+    """
+    url = make_url(db_specifier)
+    in_memory = url.database in (None, "", ":memory:")
+    kwargs = {}
+    if not in_memory:
+        if read_only:
+            kwargs.update(pool_size=1, max_overflow=0)
+        else:
+            kwargs.update(pool_size=ENGINE_POOL_SIZE, max_overflow=ENGINE_MAX_OVERFLOW)
+    engine = create_engine(db_specifier, **kwargs)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        if not in_memory and not read_only:
+            # Persistent setting, stored in the db file. (Read-only connections can't change it.)
+            cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KIB}")
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        if read_only:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    return engine
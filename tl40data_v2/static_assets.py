@@ -0,0 +1,134 @@
+"""Content-hashed asset names, and precompressed copies of the generated pages
+
+The leaderboard pages share style.css and scroll2.js (in the repo's html/ directory). Copies
+named by their content, e.g. style.3f2a9c01d4.css, can be cached by browsers forever, since a
+changed file gets a new name (and the pages that use it are regenerated).
+
+Every page, data file and asset also gets a .gz sibling (and .br, if the brotli module is
+installed), so app.py can send the compressed bytes as they are, instead of compressing on
+every request or not at all.
+"""
+
+# Standard library
+import gzip
+import hashlib
+import io
+import os
+import re
+import shutil
+
+# Third party
+try:
+    import brotli
+except ImportError:
+    brotli = None  # optional: `pip3 install brotli` to also write .br files
+
+
+ASSETS = ["style.css", "scroll2.js"]
+HASH_LENGTH = 10
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{%d}\.[A-Za-z0-9]+$" % HASH_LENGTH)
+COMPRESSIBLE_EXTENSIONS = (".html", ".css", ".js", ".json", ".svg")
+# (Content-Encoding, file suffix), most preferred first
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+def hashed_name(filename, data):
+    """e.g. style.css -> style.<first HASH_LENGTH hex digits of sha256(data)>.css"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{hashlib.sha256(data).hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+def is_hashed_name(filename):
+    return HASHED_NAME_RE.search(filename) is not None
+
+
+def publish_assets(src_dir, output_dir, names=ASSETS):
+    """Copy assets to output_dir under their content-hashed names
+
+    Older hashed copies are left alone, for cached pages that still refer to them.
+
+    Returns:
+        dict of {asset name: hashed name}, for the assets found in src_dir
+    """
+    published = {}
+    for name in names:
+        src_path = os.path.join(src_dir, name)
+        if not os.path.exists(src_path):
+            print(f"Asset {src_path} not found; pages will refer to plain {name}")
+            continue
+        with open(src_path, 'rb') as fr:
+            data = fr.read()
+        published[name] = hashed_name(name, data)
+        out_path = os.path.join(output_dir, published[name])
+        if not os.path.exists(out_path):
+            shutil.copyfile(src_path, out_path)
+    return published
+
+
+def gzip_bytes(data):
+    """gzip at the highest level, with no timestamp, so the same input gives the same file"""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(filename="", mode='wb', compresslevel=9, fileobj=buffer, mtime=0) as fw:
+        fw.write(data)
+    return buffer.getvalue()
+
+
+def precompress(path):
+    """Write path.gz (and path.br, with brotli installed) unless they're already newer than path
+
+    Returns:
+        Number of compressed files written
+    """
+    compressors = [(".gz", gzip_bytes)]
+    if brotli is not None:
+        compressors.append((".br", lambda data: brotli.compress(data, quality=11)))
+    written = 0
+    data = None
+    for suffix, compress in compressors:
+        out_path = path + suffix
+        if os.path.exists(out_path) and os.path.getmtime(out_path) >= os.path.getmtime(path):
+            continue
+        if data is None:
+            with open(path, 'rb') as fr:
+                data = fr.read()
+        with open(out_path, 'wb') as fw:
+            fw.write(compress(data))
+        written += 1
+    return written
+
+
+def precompress_dir(directory):
+    """precompress() every page, data file and asset directly in directory. Returns files written"""
+    written = 0
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(COMPRESSIBLE_EXTENSIONS):
+            written += precompress(os.path.join(directory, filename))
+    return written
+
+
+def precompressed_variant(directory, filename, accept_encodings):
+    """The precompressed sibling of directory/filename to send, if any
+
+    A sibling older than the file itself (e.g. only the page was re-uploaded) isn't used.
+
+    Args:
+        accept_encodings: Mapping of encoding to the client's quality for it, 0 if not accepted,
+            e.g. flask's request.accept_encodings
+
+    Returns:
+        (Content-Encoding, sibling filename), or (None, filename) to send the file itself
+    """
+    path = os.path.join(directory, filename)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None, filename
+    for encoding, suffix in ENCODINGS:
+        if not accept_encodings[encoding]:
+            continue
+        try:
+            if os.path.getmtime(path + suffix) >= mtime:
+                return encoding, filename + suffix
+        except OSError:
+            continue
+    return None, filename
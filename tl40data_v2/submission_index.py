@@ -0,0 +1,65 @@
+"""Sorted per-trainer submission dates, for "latest submission near this date" lookups
+
+find_near_date() in dashboard_html_from_db.py scans every date of every trainer on each call.
+SubmissionIndex sorts each trainer's dates once, then answers with bisect; find_near_dates() does a
+batch of target dates (e.g. every month end being rendered) in one go. (The older, standalone
+parse_forms_csv.py has its own small find_near_dates().)
+"""
+
+# Standard library
+from bisect import bisect_right
+import datetime
+
+
+class SubmissionIndex():
+    """Each trainer's submission dates, sorted
+
+    Built from the usual `entries` structure: dict by trainer of dict by date (datetime.date)
+    of that submission's data. Trainers keep the order of `entries`, so results iterate in the
+    same order find_near_date's do (which decides the order of tied leaderboard rows).
+    """
+    def __init__(self, entries):
+        self.entries = entries
+        self.dates = {user: sorted(user_entries) for user, user_entries in entries.items()}
+
+    def latest_in_range(self, user, min_date, max_date):
+        """The user's latest submission date in [min_date, max_date], or None"""
+        dates = self.dates.get(user)
+        if not dates:
+            return None
+        idx = bisect_right(dates, max_date) - 1
+        if idx >= 0 and dates[idx] >= min_date:
+            return dates[idx]
+        return None
+
+    def find_near_date(self, target_date, day_delta=3):
+        """Same result as find_near_date(entries, target_date, day_delta)
+
+        Returns:
+            dict by user of their latest submission's data within target_date +/- day_delta days.
+                Users without a submission in that window aren't included.
+        """
+        return self.find_near_dates([target_date], day_delta)[0]
+
+    def find_near_dates(self, target_dates, day_delta=3):
+        """find_near_date() for many target dates at once
+
+        Returns:
+            List of dicts as returned by find_near_date(), one per target date, in the given order
+        """
+        delta = datetime.timedelta(days=day_delta)
+        # Walk the targets in date order, so each bisect only searches past the previous hit
+        order = sorted(range(len(target_dates)), key=lambda idx: target_dates[idx])
+        results = [{} for _ in target_dates]
+        for user, dates in self.dates.items():
+            user_entries = self.entries[user]
+            lo = 0
+            for target_idx in order:
+                target_date = target_dates[target_idx]
+                idx = bisect_right(dates, target_date + delta, lo) - 1
+                if idx < 0:
+                    continue
+                lo = idx
+                if dates[idx] >= target_date - delta:
+                    results[target_idx][user] = user_entries[dates[idx]]
+        return results
@@ -2,21 +2,43 @@
 
 # Standard library
 from argparse import ArgumentParser
+from collections import namedtuple
 import datetime
+import struct
+import weakref
 
 # Third party
+import numpy as np
 import sqlalchemy
-from sqlalchemy import (Boolean, Column, DateTime, ForeignKey,
-                        Integer, String)
+from sqlalchemy import (Boolean, Column, DateTime, Float, ForeignKey, Index,
+                        Integer, LargeBinary, String, case)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import declarative_base, relationship, Session
 from sqlalchemy import create_engine, event
 
 # Local
-from settings import LOCAL_DB_SPECIFIER
+from settings import LOCAL_DB_SPECIFIER, get_engine
 
 
 Base = declarative_base()
 
+# Trainers submit around the end of each month; a submission in the first few days of a month
+# counts for the previous month's leaderboards.
+SURVEY_MONTH_GRACE_DAYS = 3
+
+
+def survey_month(timestamp):
+    """The survey month a submission counts for, e.g. "2025-10" for 2025-10-04 through 2025-11-03
+
+    Args:
+        timestamp: POSIX timestamp, as a float or the Response.timestamp string (local time is used)
+    """
+    date = datetime.datetime.fromtimestamp(float(timestamp))
+    if date.day <= SURVEY_MONTH_GRACE_DAYS:
+        date = date.replace(day=1) - datetime.timedelta(days=1)
+    return date.strftime("%Y-%m")
+
+
 #class Responses_and_Trainers(Base):
 #    __tablename__ = 'responses_and_trainers'
 #    ## Schema
@@ -54,6 +76,100 @@ class AgeSurveyResponse(Base):
 
 
 
+# Result of Stat.unpack_strdata_many(); see there.
+StrdataMatrix = namedtuple("StrdataMatrix", ["values", "missing", "response_ids", "trainer_ids",
+                                             "timestamps", "names"])
+
+# Response.bindata format, see encode_bindata(). Bump the version for any layout change, and keep
+# decode_bindata() able to read the old versions (or migrate the column).
+BINDATA_VERSION = 1
+_BINDATA_HEADER = struct.Struct("<BH")  # version, width (number of stats when written)
+# Integers are stored with the fewest of these bytes that fit each one, by 2-bit size code
+_BINDATA_INT_DTYPES = [np.dtype("<i1"), np.dtype("<i2"), np.dtype("<i4"), np.dtype("<i8")]
+
+
+def encode_bindata(values):
+    """Pack one response's stat values into a compact binary blob for Response.bindata
+
+    Layout (little-endian): header (version, width), a bitmap of blank values, a bitmap of float
+    values, 2-bit size codes per value, then the integer values grouped by size (1, 2, 4, then
+    8 bytes; in stat order within each group), then the float values as float64. Blanks take
+    no payload space, and most stats (medal counts etc.) take a byte or two.
+
+    Args:
+        values (list): int, float or None per stat, in strdata order (see parse_strdata_value)
+
+    Returns:
+        bytes
+    """
+    width = len(values)
+    is_null = np.array([val is None for val in values], dtype=bool)
+    is_float = np.array([isinstance(val, float) for val in values], dtype=bool)
+    ints = np.array([val for val in values if val is not None and not isinstance(val, float)], dtype=np.int64)
+    floats = np.array([val for val in values if isinstance(val, float)], dtype="<f8")
+    int_codes = sum(((ints < np.iinfo(dtype).min) | (ints > np.iinfo(dtype).max)).astype(np.uint8)
+                    for dtype in _BINDATA_INT_DTYPES[:-1])
+    codes = np.zeros(width, dtype=np.uint8)
+    codes[~is_null & ~is_float] = int_codes
+    code_bits = ((codes[:, None] >> np.array([0, 1], dtype=np.uint8)) & 1).ravel()
+    return b"".join([_BINDATA_HEADER.pack(BINDATA_VERSION, width),
+                     np.packbits(is_null, bitorder="little").tobytes(),
+                     np.packbits(is_float, bitorder="little").tobytes(),
+                     np.packbits(code_bits, bitorder="little").tobytes()]
+                    + [ints[int_codes == code].astype(dtype).tobytes()
+                       for code, dtype in enumerate(_BINDATA_INT_DTYPES)]
+                    + [floats.tobytes()])
+
+
+def _decode_bindata_arrays(blob):
+    """Returns (width, is_null, is_float, ints, floats) arrays of a Response.bindata blob
+
+    ints holds the integer values (int64) in stat order, i.e. for the positions neither blank nor float.
+    """
+    version, width = _BINDATA_HEADER.unpack_from(blob)
+    if version != BINDATA_VERSION:
+        raise ValueError(f"Unknown bindata version {version}")
+    bitmap_bytes = (width + 7) // 8
+    code_bytes = (2 * width + 7) // 8
+    offset = _BINDATA_HEADER.size
+    bits = np.unpackbits(np.frombuffer(blob, dtype=np.uint8, count=2 * bitmap_bytes + code_bytes, offset=offset),
+                         bitorder="little")
+    is_null = bits[:width].astype(bool)
+    is_float = bits[8 * bitmap_bytes:8 * bitmap_bytes + width].astype(bool)
+    code_bits = bits[16 * bitmap_bytes:16 * bitmap_bytes + 2 * width]
+    offset += 2 * bitmap_bytes + code_bytes
+
+    int_codes = (code_bits[0::2] + 2 * code_bits[1::2])[~is_null & ~is_float]
+    ints = np.empty(len(int_codes), dtype=np.int64)
+    for code, count in enumerate(np.bincount(int_codes, minlength=len(_BINDATA_INT_DTYPES)).tolist()):
+        if count:
+            dtype = _BINDATA_INT_DTYPES[code]
+            ints[int_codes == code] = np.frombuffer(blob, dtype=dtype, count=count, offset=offset)
+            offset += count * dtype.itemsize
+    floats = np.frombuffer(blob, dtype="<f8", count=int(np.count_nonzero(is_float)), offset=offset)
+    return width, is_null, is_float, ints, floats
+
+
+def decode_bindata(blob, width=None):
+    """Unpack a Response.bindata blob to a list of int, float or None per stat
+
+    Args:
+        blob (bytes): From encode_bindata()
+        width (int, optional): Number of stats now (see Stat.get_schema). Blobs written before newer
+            stats existed are padded with None up to this.
+    """
+    blob_width, is_null, is_float, ints, floats = _decode_bindata_arrays(blob)
+    if width is None:
+        width = blob_width
+    elif blob_width > width:
+        raise ValueError(f"bindata has {blob_width} values, but there are only {width} stats")
+    ints = iter(ints.tolist())
+    floats = iter(floats.tolist())
+    values = [None if null else next(floats) if flt else next(ints)
+              for null, flt in zip(is_null.tolist(), is_float.tolist())]
+    return values + [None] * (width - blob_width)
+
+
 class Stat(Base):
     __tablename__ = 'stat'
     ## Schema
@@ -68,7 +184,7 @@ class Stat(Base):
     gold = Column(Integer)  # NOTE Unused; stats.json used instead
     platinum = Column(Integer)  # NOTE Unused; stats.json used instead
     maximum = Column(Integer)  # NOTE Unused; stats.json used instead
-    required = Column(Boolean)  # NOTE Unused; stats.json used instead; also now using signed integers
+    required = Column(Integer)  # NOTE Unused; stats.json used instead; signed integers (-1/0/1), so not Boolean
     monotonic = Column(Boolean)  # TODO nullable? what has been stored to-date?
     order_idx = Column(Integer)  # NOTE Unused; dictates stat order aka position in response.strdata
                                  # Note that survey display order is DIFFERENT (it's from stats.json)
@@ -107,8 +223,7 @@ class Stat(Base):
         Returns:
             dict: A dictionary of stat names and values
         """
-        names = cls.get_all_stat_names(session)
-        names = [name[0] for name in names]
+        names = cls.get_schema(session).names
         # strdata is inserted in db-matching order, so we know the order after splitting.
         strdata_vals = strdata.split(";")
         # This assertion would point at a database mismatch, maybe.
@@ -134,6 +249,121 @@ class Stat(Base):
                 retdict[name]["value"] = 0
         return retdict
 
+    @classmethod
+    def unpack_strdata_many(cls, rows, session, pad_data=False):
+        """Decode many responses at once into a (responses x stats) NumPy matrix
+
+        The bulk counterpart of unpack_strdata(), for when we'd otherwise build one
+        {name: {"value": x}} dict per response. Not used by the app or dashboard yet (they still
+        want unpack_strdata()'s int/float values); see benchmarks/bench_codec.py.
+
+        Args:
+            rows: Iterable of Response objects, or of (id, trainer_id, timestamp, strdata) tuples
+                e.g. from session.query(Response.id, Response.trainer_id, Response.timestamp, Response.strdata)
+            session (sqlalchemy.orm.session.Session): A session object
+            pad_data (bool, optional): If True, allow strdata that is shorter than the stat table
+                (old surveys from before new stats were added); the missing trailing stats are 0 and
+                flagged in `missing`. If False, every strdata must have one value per stat.
+
+        Returns:
+            StrdataMatrix namedtuple of:
+                values: float64 array, shape (len(rows), number of stats), column order is Stat.order_idx.
+                    Blank and padded entries are 0, like unpack_strdata.
+                missing: bool array, same shape; True where the strdata entry was blank or padded
+                response_ids, trainer_ids: int64 arrays, one per row
+                timestamps: float64 array of Response.timestamp, one per row
+                names: tuple of stat names, one per column
+        """
+        names = cls.get_schema(session).names
+        width = len(names)
+        response_ids = []
+        trainer_ids = []
+        timestamps = []
+        flat_vals = []  # strdata entries for all rows, each row padded/cut to width
+        for row in rows:
+            if isinstance(row, Response):
+                row = (row.id, row.trainer_id, row.timestamp, row.strdata)
+            response_id, trainer_id, timestamp, strdata = row
+            strdata_vals = strdata.split(";")
+            if pad_data:
+                if zeros_to_append := width - len(strdata_vals):
+                    strdata_vals += [""] * zeros_to_append
+            else:
+                assert len(strdata_vals) == width
+            flat_vals.extend(strdata_vals[:width])
+            response_ids.append(response_id)
+            trainer_ids.append(trainer_id)
+            timestamps.append(float(timestamp))
+
+        strings = np.array(flat_vals, dtype=str).reshape(len(response_ids), width)
+        missing = strings == ""
+        strings[missing] = "0"
+        return StrdataMatrix(values=strings.astype(np.float64),
+                             missing=missing,
+                             response_ids=np.array(response_ids, dtype=np.int64),
+                             trainer_ids=np.array(trainer_ids, dtype=np.int64),
+                             timestamps=np.array(timestamps, dtype=np.float64),
+                             names=names)
+
+    @classmethod
+    def unpack_bindata_many(cls, rows, session):
+        """Like unpack_strdata_many(), but decoding Response.bindata instead of splitting strdata
+
+        Blobs record how many stats existed when they were written, so older, shorter ones are
+        always padded (as with pad_data=True).
+
+        Args:
+            rows: Iterable of Response objects, or of (id, trainer_id, timestamp, bindata) tuples
+            session (sqlalchemy.orm.session.Session): A session object
+
+        Returns:
+            StrdataMatrix namedtuple; see unpack_strdata_many()
+        """
+        names = cls.get_schema(session).names
+        width = len(names)
+        rows = [(row.id, row.trainer_id, row.timestamp, row.bindata) if isinstance(row, Response) else row
+                for row in rows]
+        values = np.zeros((len(rows), width), dtype=np.float64)
+        missing = np.ones((len(rows), width), dtype=bool)
+        for row_idx, (_, _, _, blob) in enumerate(rows):
+            blob_width, is_null, is_float, ints, floats = _decode_bindata_arrays(blob)
+            if blob_width > width:
+                raise ValueError(f"bindata has {blob_width} values, but there are only {width} stats")
+            row_values = values[row_idx, :blob_width]
+            row_values[~is_null & ~is_float] = ints
+            row_values[is_float] = floats
+            missing[row_idx, :blob_width] = is_null
+        return StrdataMatrix(values=values,
+                             missing=missing,
+                             response_ids=np.array([row[0] for row in rows], dtype=np.int64),
+                             trainer_ids=np.array([row[1] for row in rows], dtype=np.int64),
+                             timestamps=np.array([float(row[2]) for row in rows], dtype=np.float64),
+                             names=names)
+
+    @classmethod
+    def get_schema(cls, session, revalidate=False):
+        """Get the (process-wide cached) StatSchema for the session's database
+
+        The stat table is only read the first time, or after invalidate_schema(). Pass
+        revalidate=True to also pick up a schema version bump made by another process
+        (e.g. fill_static_tables.py run against the live DB); this costs one cheap PRAGMA query.
+        """
+        key = session.get_bind().engine
+        cached = _stat_schema_cache.get(key)
+        if cached is not None and revalidate:
+            if get_schema_version(session) != cached.version:
+                cached = None
+        if cached is None:
+            rows = session.query(Stat.id, Stat.name, Stat.icon, Stat.order_idx).order_by(Stat.order_idx).all()
+            cached = StatSchema(rows, version=get_schema_version(session))
+            _stat_schema_cache[key] = cached
+        return cached
+
+    @classmethod
+    def invalidate_schema(cls):
+        """Forget all cached StatSchemas, e.g. after adding or reordering rows in the stat table"""
+        _stat_schema_cache.clear()
+
     @classmethod
     def repack_strdata(cls, stat_data_dict):
         """Recreate a valid strdata string from the dictionary style provided by unpack_strdata()
@@ -145,12 +375,69 @@ class Stat(Base):
         return strdata
 
 
+class StatSchema():
+    """The stat table's ordering (i.e. strdata positions) with precomputed lookups
+
+    Get one via Stat.get_schema(session) rather than creating it directly.
+
+    Attributes:
+        ids, names, icons, order_idxs: Tuples of Stat columns, in strdata order
+        name_to_idx, icon_to_idx, id_to_idx: dicts giving the strdata position of a stat
+        version: The db's schema version (see get_schema_version()) when this was loaded
+    """
+    def __init__(self, rows, version=0):
+        """rows: (id, name, icon, order_idx) tuples, ordered by order_idx"""
+        self.ids = tuple(row[0] for row in rows)
+        self.names = tuple(row[1] for row in rows)
+        self.icons = tuple(row[2] for row in rows)
+        self.order_idxs = tuple(row[3] for row in rows)
+        self.id_to_idx = {stat_id: idx for idx, stat_id in enumerate(self.ids)}
+        self.name_to_idx = {name: idx for idx, name in enumerate(self.names)}
+        self.icon_to_idx = {icon: idx for idx, icon in enumerate(self.icons)}
+        self.version = version
+
+    def __len__(self):
+        return len(self.ids)
+
+
+# Functions called with the trainer's (lowercase) name whenever a response of theirs has been
+# saved and committed, e.g. to drop app.py's cached survey pages for them; see notify_response_saved()
+response_saved_listeners = []
+
+
+def notify_response_saved(trainers):
+    """Call the response_saved_listeners for each trainer; only once their responses are committed,
+    so listeners (and whatever reads the db right after) see them
+
+    Args:
+        trainers: Lowercase trainer names
+    """
+    for trainer in trainers:
+        for listener in response_saved_listeners:
+            listener(trainer)
+
+# StatSchema by Engine; see Stat.get_schema()
+_stat_schema_cache = weakref.WeakKeyDictionary()
+
+
+def get_schema_version(session):
+    """Stat schema version of the db; bumped by bump_schema_version() (sqlite's user_version)"""
+    return session.execute(sqlalchemy.text("PRAGMA user_version")).scalar()
+
+
+def bump_schema_version(session):
+    """Mark the stat table as changed, for processes holding a cached StatSchema. Does not commit."""
+    version = get_schema_version(session)
+    session.execute(sqlalchemy.text(f"PRAGMA user_version = {int(version) + 1}"))
+    Stat.invalidate_schema()
+
+
 class Trainer(Base):
     __tablename__ = 'trainer'
 
     ## Schema
     id = Column(Integer, primary_key=True)
-    name = Column(String)#, unique=True)
+    name = Column(String, unique=True, index=True)  # lowercase; every survey GET looks trainers up by this
     proper_name = Column(String)#, unique=True)
     start_date = Column(String, nullable=True)
     # 2-26: implementing One to Many, bidirectionally
@@ -171,7 +458,7 @@ class Trainer(Base):
         """Get a dictionary of latest response information for this trainer
 
         Returns:
-            Dictionary (key: value) for each stat in the response
+            Dictionary (stat name: strdata value string) for each stat in the response
         """
         # TODO Do we need to do a query here? Or can we just return the newest_response attribute
         if not self.newest_response:
@@ -181,16 +468,22 @@ class Trainer(Base):
         # Get the Response object from the integer id self.newest_response
         response = session.query(Response).filter(Response.id == self.newest_response).one()
         response_values = response.strdata.split(";")
-        response_dict = dict(zip(Stat.get_all_stat_names(session), response_values))
+        response_dict = dict(zip(Stat.get_schema(session).names, response_values))
         return response_dict
 
 
 class Response(Base):
     __tablename__ = 'response'
+    __table_args__ = (
+        # A trainer's responses over a date range, e.g. /api/trainer-stats
+        Index('ix_response_trainer_id_timestamp_epoch', 'trainer_id', 'timestamp_epoch'),
+    )
 
     ## Schema
     id = Column(Integer, primary_key=True)
     timestamp= Column(String)  # timestamp, often converted to datetime or date object
+    # Same as timestamp, but numeric so range filters/sorting compare numbers rather than strings
+    timestamp_epoch = Column(Float, nullable=True, index=True)
     #trainer = Column(String)
     # What about bidirectional?
     trainer_id = Column(Integer, ForeignKey('trainer.id'))
@@ -201,6 +494,9 @@ class Response(Base):
     # The save result function will handle a list of tuples of (key,value) and put them in the
     # correct order (per the Stat table), and store the appropriate strdata=[value1,value2,...]
     strdata = Column(String)
+    # The same values as strdata, in the compact binary form of encode_bindata(). strdata stays the
+    # record of truth; save_response() and update_strdata() keep this in sync.
+    bindata = Column(LargeBinary, nullable=True)
     edited = Column(Integer, nullable=True)
     revision = Column(Integer, nullable=True)
 
@@ -208,13 +504,26 @@ class Response(Base):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def save_response(cls, session, response_values, timestamp=None):
+    def save_response(cls, session, response_values, timestamp=None, commit=True):
         """Save a response to the database
 
         We start with an dict of zero values for all stats that the DB knows about.
         We then take the stats the response contains, and use their values to replace the zeros.
         If the response (aka survey the user saw) does not contain all of the stats, some of these
-        will remain zero.  (this lets us retire stats from the survey, without cleaning them up from the db...)
+        will remain zero, unless the trainer's previous response had a value for them, which is carried
+        over. (this lets us retire stats from the survey, without cleaning them up from the db...)
+
+        All of the writes (new trainer, response, its ResponseValue rows, the trainer's MonthlySnapshot
+        and newest_response) happen in a single transaction, so there's one commit/fsync per submission, and the sqlite write
+        lock is only held from the first INSERT until that commit.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A session object
+            response_values: dict-like of {stat icon: value}, plus "trainername"
+            timestamp (str, optional): Defaults to now
+            commit (bool, optional): If False, leave committing to the caller, e.g. to save several
+                responses in one transaction. The caller then also calls notify_response_saved()
+                once committed.
         """
         # TODO simple hack for now: we do a list comprehension below where we skip just the "trainername"
         # response_values is expected to be a:
@@ -226,33 +535,28 @@ class Response(Base):
         # The keys of response_values are the icon names, not the pretty names.
 
         # Stats list from DB
-        stat_data = session.query(Stat.icon).order_by(Stat.order_idx).all()  # list of tuples
-        stat_data_dict = {icon[0]: 0 for icon in stat_data}
+        schema = Stat.get_schema(session)
+        stat_data_dict = {icon: 0 for icon in schema.icons}
 
-        # Get trainer object or create it if needed
         if not timestamp:
             timestamp = str(datetime.datetime.now().timestamp())
         trainer_proper_name = response_values["trainername"]
         trainer = trainer_proper_name.lower()
-        trainer_obj = session.query(Trainer).filter(Trainer.name == trainer).first()
-        if trainer_obj is None:
-            trainer_obj = Trainer(name=trainer, proper_name=trainer_proper_name, start_date=timestamp)
-            session.add(trainer_obj)
-            session.flush()  # copilot
-            session.commit()  # copilot
 
-        # Get previous survey's values (if any)
-        if trainer_obj:
-            # trainer_data will be a dict by stat name of values from previous response
-            # stderr is used ... why?
-            previous_trainer_data = trainer_obj.get_newest_response(session)  # May be None if trainer added above
+        # Get trainer object, and their previous survey's strdata (if any), in one query.
+        # Nothing is written before this point, so we don't hold the write lock while reading.
+        trainer_row = session.query(Trainer, Response.strdata) \
+                             .outerjoin(Response, Response.id == Trainer.newest_response) \
+                             .filter(Trainer.name == trainer).first()
+        if trainer_row is None:
+            trainer_obj, previous_strdata = None, None
+        else:
+            trainer_obj, previous_strdata = trainer_row
+        # dict by stat icon of (string) values from previous response
+        previous_trainer_data = dict(zip(schema.icons, previous_strdata.split(";"))) if previous_strdata else None
 
         # Put response values in DB's order of Stats.
         # Any unfilled values are set to 0...
-        #print(stat_data_dict)
-        #print(len(stat_data_dict))
-        #print(list(response_values.keys()))
-        #print(len(list(response_values.keys())))
         for k, v in response_values.items():
             # Presently, everything but the trainername is a numeric survey value
             if k == "trainername":
@@ -260,47 +564,273 @@ class Response(Base):
             stat_data_dict[k] = v
         # Any stats with value 0 are checked against the previous survey to get an alternate value. See above for more info
         if previous_trainer_data:
-            printed_keys = False
             for k, v in stat_data_dict.items():
-                try:
-                    if v == 0 and previous_trainer_data[k] != 0:
-                        stat_data_dict[k] = previous_trainer_data[k]
-                except KeyError as e:
-                    print(repr(e))
-                    if not printed_keys:
-                        print("tables.save_response: above key was not seen in previous_trainer_data; available keys:")
-                        print(list(previous_trainer_data.keys()))
-                        printed_keys = True
+                if v == 0 and previous_trainer_data.get(k, "") not in ("", "0"):
+                    stat_data_dict[k] = previous_trainer_data[k]
         # Then make the values a single string
         # The values are in order of the order in the DB (NOT the orderidx column though)
         strdata = ";".join(str(val) for val in stat_data_dict.values())
 
+        # Writes start here
+        if trainer_obj is None:
+            # Only if still missing: a concurrent first submission of theirs may have created them since
+            # we looked, and Trainer.name is unique
+            inserted = session.execute(sqlite_insert(Trainer.__table__)
+                                       .values(name=trainer, proper_name=trainer_proper_name, start_date=timestamp)
+                                       .on_conflict_do_nothing(index_elements=['name'])).rowcount
+            if not inserted:
+                # Start over, now reading the trainer (and carrying over from their response)
+                return cls.save_response(session, response_values, timestamp=timestamp, commit=commit)
+            trainer_obj = session.query(Trainer).filter(Trainer.name == trainer).one()
+
         # Response DB object
-        response = cls(trainer_id=trainer_obj.id, timestamp=timestamp, strdata=strdata, revision=1)
+        response = cls(trainer_id=trainer_obj.id, timestamp=timestamp, timestamp_epoch=float(timestamp),
+                       strdata=strdata, bindata=cls.bindata_from_strdata(strdata), revision=1)
 
-        # Add response object, so we can get the id
+        # Add response object, and flush so .id is actually set
         session.add(response)
-        # Flush and commit, so .id is actually set
         session.flush()
-        session.commit()
+        # Per-stat copy of strdata, see ResponseValue
+        ResponseValue.write_values(session, response, stat_ids=schema.ids, replace=False)
+        MonthlySnapshot.record(session, response)
 
         # Set trainer's newest_response, and use whichever name capitalization they gave this time
-        if trainer_obj.newest_response_date is None or timestamp > trainer_obj.newest_response_date:
+        if trainer_obj.newest_response_date is None \
+                or float(timestamp) > float(trainer_obj.newest_response_date):
             trainer_obj.newest_response_date = timestamp
             trainer_obj.newest_response = response.id
         trainer_obj.proper_name = trainer_proper_name
 
-        session.add(trainer_obj)
         session.flush()
-        session.commit()
+        if commit:
+            session.commit()
+            notify_response_saved([trainer])
 
         return response
 
+    def update_strdata(self, session, strdata):
+        """Replace this response's strdata, keeping the per-stat ResponseValue rows in sync.
+
+        Use this instead of assigning to .strdata directly (e.g. from db_editor.py). Does not commit.
+        """
+        self.strdata = strdata
+        self.bindata = self.bindata_from_strdata(strdata)
+        session.add(self)
+        session.flush()
+        ResponseValue.write_values(session, self)
+
+    @staticmethod
+    def bindata_from_strdata(strdata):
+        """Encode a strdata string for the bindata column"""
+        return encode_bindata([parse_strdata_value(val) for val in strdata.split(";")])
+
+    @classmethod
+    def rebuild_bindata(cls, session):
+        """Re-encode bindata for every response from its strdata. Does not commit.
+
+        Returns:
+            Number of responses processed
+        """
+        count = 0
+        for response_id, strdata in session.query(cls.id, cls.strdata).filter(cls.strdata.isnot(None)).all():
+            session.query(cls).filter(cls.id == response_id) \
+                   .update({cls.bindata: cls.bindata_from_strdata(strdata)}, synchronize_session=False)
+            count += 1
+        return count
+
     def list_responses(cls, session, trainername):
         # TODO
         pass
 
 
+def parse_strdata_value(val):
+    """Convert one semicolon-separated strdata entry to a number, or None if blank"""
+    if val == "" or val is None:
+        return None
+    try:
+        return int(val)
+    except ValueError:
+        return float(val)
+
+
+class ResponseValue(Base):
+    """One stat value from one Response; i.e. a normalized copy of Response.strdata
+
+    Response.strdata stays the record of truth. These rows are rewritten from it whenever a
+    response is saved or edited, so that per-stat filters, aggregates and leaderboards can be
+    done in SQL without splitting every strdata string in Python.
+    """
+    __tablename__ = 'response_value'
+    __table_args__ = (
+        # Per-stat lookups/leaderboards; (response_id, stat_id) lookups use the primary key
+        Index('ix_response_value_stat_id_value', 'stat_id', 'value'),
+    )
+
+    ## Schema
+    response_id = Column(Integer, ForeignKey('response.id'), primary_key=True)
+    stat_id = Column(Integer, ForeignKey('stat.id'), primary_key=True)
+    # Integer affinity, but sqlite stores the few float stats (e.g. Jogger km) as REAL
+    # and gives us back whichever type it stored.
+    value = Column(Integer, nullable=True)  # NULL for a blank strdata entry
+
+    @classmethod
+    def rows_from_strdata(cls, response_id, strdata, stat_ids):
+        """Split a strdata string into a list of row dicts, ready for a bulk insert
+
+        Args:
+            response_id (int): Response.id the strdata belongs to
+            strdata (str): A semicolon-separated string of values, in the order of Stat.order_idx
+            stat_ids (list): Stat.id values in order of Stat.order_idx. Older, shorter strdata
+                simply produce fewer rows.
+        """
+        return [{"response_id": response_id, "stat_id": stat_id, "value": parse_strdata_value(val)}
+                for stat_id, val in zip(stat_ids, strdata.split(";"))]
+
+    @classmethod
+    def write_values(cls, session, response, stat_ids=None, replace=True):
+        """(Re)write the rows for a single response from its strdata. Does not commit.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A session object
+            response (Response): A response that has been flushed (so .id is set)
+            stat_ids (list, optional): Stat.id values in strdata order; from Stat.get_schema() if not given.
+            replace (bool, optional): Delete any existing rows for the response first. Can be
+                skipped for brand new responses.
+        """
+        if stat_ids is None:
+            stat_ids = Stat.get_schema(session).ids
+        if replace:
+            session.query(cls).filter(cls.response_id == response.id).delete(synchronize_session=False)
+        rows = cls.rows_from_strdata(response.id, response.strdata, stat_ids)
+        if rows:
+            session.execute(cls.__table__.insert(), rows)
+
+    @classmethod
+    def read_values(cls, session, response_id, stat_names=None):
+        """Get {stat name: value} for one response, optionally limited to some stats
+
+        Blank values come back as None (unlike Stat.unpack_strdata, which uses 0).
+        """
+        query = session.query(Stat.name, cls.value).join(Stat, Stat.id == cls.stat_id) \
+                       .filter(cls.response_id == response_id)
+        if stat_names is not None:
+            query = query.filter(Stat.name.in_(list(stat_names)))
+        return dict(query.order_by(Stat.order_idx).all())
+
+    @classmethod
+    def query_stat(cls, session, stat_name):
+        """Query of (Response, value) for every response that has a value for stat_name
+
+        Meant as a starting point for per-stat SQL filters and aggregates, e.g.
+            ResponseValue.query_stat(session, "Total XP").filter(ResponseValue.value > 1e8)
+        """
+        return session.query(Response, cls.value) \
+                      .join(cls, cls.response_id == Response.id) \
+                      .join(Stat, Stat.id == cls.stat_id) \
+                      .filter(Stat.name == stat_name, cls.value.isnot(None))
+
+    @classmethod
+    def rebuild_all(cls, session):
+        """Drop and recreate every row from Response.strdata. Does not commit.
+
+        Returns:
+            Number of responses processed
+        """
+        stat_ids = Stat.get_schema(session).ids
+        session.query(cls).delete(synchronize_session=False)
+        count = 0
+        for response_id, strdata in session.query(Response.id, Response.strdata).all():
+            if strdata is None:
+                continue
+            rows = cls.rows_from_strdata(response_id, strdata, stat_ids)
+            if rows:
+                session.execute(cls.__table__.insert(), rows)
+            count += 1
+        return count
+
+
+class MonthlySnapshot(Base):
+    """The response that counts for a trainer in a survey month: their latest one (see survey_month())
+
+    Kept up to date by Response.save_response, in the same transaction, so readers get one row per
+    trainer-month instead of grouping every response. rebuild_all() regenerates it from scratch.
+    """
+    __tablename__ = 'monthly_snapshot'
+    __table_args__ = (
+        # Everyone's snapshot for one month, e.g. for a leaderboard
+        Index('ix_monthly_snapshot_survey_month', 'survey_month'),
+    )
+
+    ## Schema
+    trainer_id = Column(Integer, ForeignKey('trainer.id'), primary_key=True)
+    survey_month = Column(String, primary_key=True)  # "YYYY-MM"
+    response_id = Column(Integer, ForeignKey('response.id'), nullable=False)
+    timestamp_epoch = Column(Float, nullable=False)  # of response_id
+    response_count = Column(Integer, nullable=False, default=1)  # submissions by the trainer for the month
+
+    @classmethod
+    def record(cls, session, response):
+        """Count a newly saved response in its trainer's snapshot for the month. Does not commit.
+
+        A single upsert; the snapshot only moves to this response if it's the newest for the month,
+        so replayed or backdated submissions don't displace a later one.
+        """
+        stmt = sqlite_insert(cls.__table__).values(trainer_id=response.trainer_id,
+                                                   survey_month=survey_month(response.timestamp_epoch),
+                                                   response_id=response.id,
+                                                   timestamp_epoch=response.timestamp_epoch,
+                                                   response_count=1)
+        newer = stmt.excluded.timestamp_epoch >= cls.__table__.c.timestamp_epoch
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['trainer_id', 'survey_month'],
+            set_={"response_id": case((newer, stmt.excluded.response_id), else_=cls.__table__.c.response_id),
+                  "timestamp_epoch": case((newer, stmt.excluded.timestamp_epoch),
+                                          else_=cls.__table__.c.timestamp_epoch),
+                  "response_count": cls.__table__.c.response_count + 1,
+                  })
+        session.execute(stmt)
+
+    @classmethod
+    def rows_from_responses(cls, responses):
+        """Snapshot row dicts from (response id, trainer id, timestamp_epoch) tuples, in any order"""
+        snapshots = {}
+        for response_id, trainer_id, timestamp_epoch in responses:
+            key = (trainer_id, survey_month(timestamp_epoch))
+            snapshot = snapshots.get(key)
+            if snapshot is None:
+                snapshots[key] = {"trainer_id": trainer_id, "survey_month": key[1], "response_id": response_id,
+                                  "timestamp_epoch": timestamp_epoch, "response_count": 1}
+                continue
+            snapshot["response_count"] += 1
+            if timestamp_epoch >= snapshot["timestamp_epoch"]:
+                snapshot["response_id"] = response_id
+                snapshot["timestamp_epoch"] = timestamp_epoch
+        return list(snapshots.values())
+
+    @classmethod
+    def rebuild_all(cls, session):
+        """Drop and recreate every row from the response table. Does not commit.
+
+        Returns:
+            Number of snapshot rows written
+        """
+        session.query(cls).delete(synchronize_session=False)
+        # Ordered by id so that of two responses with the same timestamp, the later saved one wins, like record()
+        responses = session.query(Response.id, Response.trainer_id, Response.timestamp_epoch) \
+                           .filter(Response.timestamp_epoch.isnot(None)).order_by(Response.id).all()
+        rows = cls.rows_from_responses(responses)
+        if rows:
+            session.execute(cls.__table__.insert(), rows)
+        return len(rows)
+
+    @classmethod
+    def query_responses(cls, session):
+        """Query of (MonthlySnapshot, Response) pairs, to be filtered by trainer and/or month, e.g.
+            MonthlySnapshot.query_responses(session).filter(MonthlySnapshot.survey_month == "2025-10")
+        """
+        return session.query(cls, Response).join(Response, Response.id == cls.response_id)
+
+
 #def create_tables(engine: sqlalchemy.future.engine.Engine = None):
 #    """ Creates the tables in the specified database.
 #
@@ -317,10 +847,43 @@ def main():
     """ Get command line args, and call the function that fill the static tables.
     """
     parser = ArgumentParser("Fill in non-user-submitted data to a db")
+    parser.add_argument("--rebuild-response-values", action="store_true",
+                        help="Regenerate the response_value table from every Response.strdata, "
+                             "e.g. after hand-editing strdata with sqlitebrowser.")
+    parser.add_argument("--rebuild-bindata", action="store_true",
+                        help="Re-encode every Response.bindata from its strdata, "
+                             "e.g. after hand-editing strdata with sqlitebrowser.")
+    parser.add_argument("--rebuild-monthly-snapshots", action="store_true",
+                        help="Regenerate the monthly_snapshot table from every Response, "
+                             "e.g. after deleting or re-dating responses by hand.")
     args = parser.parse_args()
 
     db_specifier = LOCAL_DB_SPECIFIER
-    engine = create_engine(db_specifier)
+    engine = get_engine(db_specifier)
+
+    if args.rebuild_response_values:
+        session = Session(engine)
+        count = ResponseValue.rebuild_all(session)
+        session.commit()
+        session.close()
+        print(f"Rebuilt response_value rows for {count} responses")
+        return
+
+    if args.rebuild_bindata:
+        session = Session(engine)
+        count = Response.rebuild_bindata(session)
+        session.commit()
+        session.close()
+        print(f"Re-encoded bindata for {count} responses")
+        return
+
+    if args.rebuild_monthly_snapshots:
+        session = Session(engine)
+        count = MonthlySnapshot.rebuild_all(session)
+        session.commit()
+        session.close()
+        print(f"Rebuilt {count} monthly_snapshot rows")
+        return
 
     # Create the tables
     Base.metadata.create_all(engine)
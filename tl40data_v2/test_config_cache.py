@@ -0,0 +1,101 @@
+# Tests for config_cache.py, and the app pages using it
+
+import json
+import os
+import tempfile
+from unittest import TestCase, mock
+
+import app
+import config_cache
+from benchmarks.common import make_benchmark_db
+from config_cache import ConfigFile, StatsConfig, parse_stat_help, parse_stats
+from settings import get_engine
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def write_json(path, data, mtime):
+    with open(path, 'w') as fw:
+        json.dump(data, fw)
+    os.utime(path, (mtime, mtime))
+
+
+class TestConfigFile(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = os.path.join(self.tmpdir.name, "stats.json")
+
+    def test_reloads_only_changed_content(self):
+        stats = {"key": ["numtype", "bronze", "silver", "gold", "platinum", "maximum", "monotonic", "required",
+                         "icon", "category"],
+                 "data": {"Total XP": ["Integer", 0, 0, 0, 0, -1, True, 1, "total_xp", "General"]}}
+        write_json(self.path, stats, 1000)
+        config_file = ConfigFile(self.path, parse_stats)
+        first = config_file.get()
+        self.assertIs(config_file.get(), first)
+        self.assertEqual(config_file.loads, 1)
+        # Uploaded again, unchanged
+        write_json(self.path, stats, 2000)
+        self.assertIs(config_file.get(), first)
+        self.assertEqual(config_file.loads, 1)
+        # Changed
+        stats["data"]["Jogger"] = ["Float", 10, 100, 1000, 10000, -1, True, 0, "travel_km", "Medal"]
+        write_json(self.path, stats, 3000)
+        second = config_file.get()
+        self.assertEqual(config_file.loads, 2)
+        self.assertEqual([stat.name for stat in second.stats], ["Total XP", "Jogger"])
+        self.assertNotEqual(second.digest, first.digest)
+
+    def test_missing(self):
+        config_file = ConfigFile(self.path, parse_stat_help, missing={})
+        self.assertEqual(config_file.get(), {})
+        write_json(self.path, {"Jogger": "Walking distance"}, 1000)
+        self.assertEqual(config_file.get()["Jogger"], "Walking distance")
+        with self.assertRaises(FileNotFoundError):
+            ConfigFile(os.path.join(self.tmpdir.name, "none.json"), parse_stats).get()
+
+
+class TestStatsConfig(TestCase):
+
+    def test_matches_stats_json(self):
+        with open(os.path.join(MODULE_DIR, "stats.json"), 'r') as fr:
+            static_stat_info = json.load(fr)
+        stats_config = StatsConfig(static_stat_info)
+        self.assertEqual([stat.name for stat in stats_config.stats], list(static_stat_info["data"]))
+        for name, values in static_stat_info["data"].items():
+            stat = stats_config.by_name[name]
+            self.assertEqual(list(stat[:10]), [name] + values[:9])
+            self.assertEqual(stat.category, values[9])
+            self.assertEqual(stat.thresholds, tuple(values[1:5]))
+            self.assertIs(stats_config.by_icon[stat.icon], stat)
+        self.assertEqual(stats_config.categories,
+                         tuple(sorted({values[9] for values in static_stat_info["data"].values()})))
+        with self.assertRaises(TypeError):
+            stats_config.by_name["Total XP"] = None
+
+
+class TestVisualizationPage(TestCase):
+
+    def setUp(self):
+        cwd = os.getcwd()
+        os.chdir(MODULE_DIR)
+        self.addCleanup(os.chdir, cwd)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        engine = get_engine(make_benchmark_db(os.path.join(tmpdir.name, "test.db"), n_trainers=2))
+        self.addCleanup(engine.dispose)
+        patcher = mock.patch.object(app, "engine", engine, create=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stats_and_categories(self):
+        response = app.app.test_client().get("/visualization")
+        self.assertEqual(response.status_code, 200)
+        page = response.data.decode()
+        stats_config = config_cache.get_stats()
+        self.assertIn('data-category="Medal"', page)
+        self.assertIn('value="Jogger"', page)
+        self.assertEqual(page.count('class="stat-checkbox"'), len(stats_config))
+        self.assertIn("trainer1", page)
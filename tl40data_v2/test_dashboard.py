@@ -0,0 +1,319 @@
+# Tests for dashboard_html_from_db.py, generating pages from a small scratch db
+
+import copy
+from contextlib import redirect_stdout
+import datetime
+import io
+import json
+import os
+import random
+import tempfile
+from unittest import TestCase
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy.orm import Session
+
+import dashboard_html_from_db
+from benchmarks import bench_dashboard
+from benchmarks.common import make_benchmark_db, survey_post_values
+from benchmarks.synthetic_db import build_synthetic_db, synthetic_db_kwargs
+from settings import get_engine
+from tables import MonthlySnapshot, Response, ResponseValue, Stat, Trainer
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+TRAINERS = ["Gertlex", "TrainerA", "TrainerB", "TrainerC"]
+
+
+def month_end_timestamp(months_ago):
+    """Noon on the last day of the month, months_ago months before the current one"""
+    first_of_month = datetime.date.today().replace(day=1) - relativedelta(months=months_ago)
+    end = first_of_month - datetime.timedelta(days=1)
+    return str(datetime.datetime(end.year, end.month, end.day, 12).timestamp())
+
+
+def save_month(db_specifier, months_ago, trainers=TRAINERS, bonus=0):
+    engine = get_engine(db_specifier)
+    session = Session(engine)
+    for idx, trainer in enumerate(trainers):
+        values = survey_post_values(trainer, (15 - months_ago) * (idx + 1) + bonus)
+        Response.save_response(session, values, timestamp=month_end_timestamp(months_ago))
+    session.close()
+    engine.dispose()
+
+
+class DashboardTestCase(TestCase):
+    """Runs from the script's directory (for stats.json etc.), with a db of 14 months of surveys"""
+
+    def setUp(self):
+        cwd = os.getcwd()
+        os.chdir(MODULE_DIR)
+        self.addCleanup(os.chdir, cwd)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, "test.db")
+        self.db_specifier = make_benchmark_db(self.db_path)
+        for months_ago in range(13, -1, -1):
+            save_month(self.db_specifier, months_ago)
+
+    def run_dashboard(self, output_dir, *argv):
+        """Returns the printed output of main()"""
+        os.makedirs(output_dir, exist_ok=True)
+        args = dashboard_html_from_db.make_parser().parse_args(
+            ["--db-file", self.db_path, "--output-dir", output_dir] + list(argv))
+        out = io.StringIO()
+        with redirect_stdout(out):
+            dashboard_html_from_db.main(args)
+        return out.getvalue()
+
+    def read_pages(self, output_dir):
+        pages = {}
+        for filename in sorted(os.listdir(output_dir)):
+            if filename.endswith(".html"):
+                with open(os.path.join(output_dir, filename), 'r') as fr:
+                    pages[filename] = fr.read()
+        return pages
+
+
+class TestIncrementalRegeneration(DashboardTestCase):
+
+    def test_unchanged_pages_skipped(self):
+        output_dir = os.path.join(self.tmpdir.name, "html")
+        out = self.run_dashboard(output_dir)
+        self.assertEqual(out.count("Generated page for"), 12)
+        first_pages = self.read_pages(output_dir)
+        self.assertEqual(len(first_pages), 14)  # and index.html, leaderboards.html
+
+        out = self.run_dashboard(output_dir)
+        self.assertNotIn("Generated page for", out)
+        self.assertIn("Skipped 12 unchanged page(s)", out)
+        self.assertEqual(self.read_pages(output_dir), first_pages)
+
+        # A late submission for last month changes only last month's page
+        save_month(self.db_specifier, 0, trainers=["TrainerA"], bonus=100)
+        out = self.run_dashboard(output_dir)
+        last_month = (datetime.date.today().replace(day=1) - datetime.timedelta(days=1)).strftime("%Y-%m")
+        self.assertEqual(out.count("Generated page for"), 1)
+        self.assertIn(f"Generated page for {last_month}", out)
+        pages = self.read_pages(output_dir)
+        self.assertNotEqual(pages[f"{last_month}.html"], first_pages[f"{last_month}.html"])
+        self.assertEqual(pages["index.html"], pages[f"{last_month}.html"])
+
+        # A deleted page is regenerated, and --force regenerates everything
+        os.remove(os.path.join(output_dir, f"{last_month}.html"))
+        self.assertEqual(self.run_dashboard(output_dir).count("Generated page for"), 1)
+        self.assertEqual(self.run_dashboard(output_dir, "--force").count("Generated page for"), 12)
+
+
+class TestParallelRendering(DashboardTestCase):
+
+    def test_jobs_byte_identical(self):
+        sequential_dir = os.path.join(self.tmpdir.name, "sequential")
+        parallel_dir = os.path.join(self.tmpdir.name, "parallel")
+        self.run_dashboard(sequential_dir, "--jobs", "1")
+        out = self.run_dashboard(parallel_dir, "--jobs", "3")
+        self.assertEqual(out.count("Generated page for"), 12)
+        self.assertEqual(self.read_pages(parallel_dir), self.read_pages(sequential_dir))
+
+    def test_render_monthly_html_matches_two_phases(self):
+        entries = dashboard_html_from_db.load_entries_from_db(db_specifier=self.db_specifier)
+        with open(dashboard_html_from_db.report_fields_path, 'r') as fr:
+            dashboard_html_from_db.add_monthly_changes(entries, list(json.load(fr).keys()))
+        month_date = datetime.date.today().replace(day=1) - datetime.timedelta(days=1)
+        with redirect_stdout(io.StringIO()):
+            content, _, _, player_count, aborted = dashboard_html_from_db.render_monthly_html(entries, month_date)
+            month_tables = dashboard_html_from_db.compute_monthly_tables(entries, month_date)[0]
+        self.assertFalse(aborted)
+        self.assertEqual(player_count, len(TRAINERS))
+        self.assertEqual(str(content), str(dashboard_html_from_db.render_month_content(month_tables)))
+
+
+class TestRenderers(DashboardTestCase):
+
+    def test_jinja_matches_dominate(self):
+        jinja_dir = os.path.join(self.tmpdir.name, "jinja")
+        dominate_dir = os.path.join(self.tmpdir.name, "dominate")
+        self.run_dashboard(jinja_dir, "--renderer", "jinja")
+        self.run_dashboard(dominate_dir, "--renderer", "dominate")
+        self.assertEqual(self.read_pages(jinja_dir), self.read_pages(dominate_dir))
+
+    def test_edge_cases_match_dominate(self):
+        with open(dashboard_html_from_db.report_fields_path, 'r') as fr:
+            report_fields_dict = json.load(fr)
+        starting_date = datetime.date(2025, 3, 1)
+        month_date = datetime.date(2025, 2, 28)
+        stat_tables = [dashboard_html_from_db.StatTables("Total XP", "total_xp",
+                                                         [("a<b>&c", 12345678, "2025-02"),
+                                                          ("old_trainer", 2.5, " (Dec 2024)")],
+                                                         [("a<b>&c", 100), ("x", 0.5), ("y", 0)],
+                                                         "Nice & easy <3"),  # April fools
+                       dashboard_html_from_db.StatTables("Jogger", "travel_km", [], [], None)]
+        renderer = dashboard_html_from_db.LeaderboardRenderer(report_fields_dict, starting_date)
+        for tables in (stat_tables, []):
+            month_tables = dashboard_html_from_db.MonthTables(month_date, "2025-02", tables, 1)
+            self.assertEqual(renderer.render(month_tables),
+                             dashboard_html_from_db.render_month_page(report_fields_dict, starting_date,
+                                                                      month_tables))
+
+
+class TestClientData(DashboardTestCase):
+
+    def test_month_data_files(self):
+        output_dir = os.path.join(self.tmpdir.name, "html")
+        out = self.run_dashboard(output_dir)
+        self.assertIn("Updated leaderboards.html", out)
+        last_month = (datetime.date.today().replace(day=1) - datetime.timedelta(days=1)).strftime("%Y-%m")
+        with open(os.path.join(output_dir, "months.json"), 'r') as fr:
+            months = json.load(fr)["months"]
+        self.assertEqual(len(months), 12)
+        self.assertEqual(months[0][0], last_month)
+        with open(os.path.join(output_dir, f"{last_month}.json"), 'r') as fr:
+            data = json.load(fr)
+        self.assertEqual(data["version"], dashboard_html_from_db.MONTH_DATA_VERSION)
+        self.assertEqual(data["month"], last_month)
+        page = self.read_pages(output_dir)[f"{last_month}.html"]
+        for stat in data["stats"]:
+            self.assertIn(f'<th colspan="3">{stat["stat"]} — Total all time</th>', page)
+            for player, change in stat["changes"]:
+                self.assertIsInstance(change, int)
+        self.assertLess(os.path.getsize(os.path.join(output_dir, f"{last_month}.json")), len(page) / 4)
+
+        # A missing data file is regenerated, even though its page is up to date
+        os.remove(os.path.join(output_dir, f"{last_month}.json"))
+        out = self.run_dashboard(output_dir)
+        self.assertEqual(out.count("Generated page for"), 1)
+        self.assertNotIn("Updated leaderboards.html", out)
+        self.assertTrue(os.path.exists(os.path.join(output_dir, f"{last_month}.json")))
+
+    def test_month_data_values(self):
+        month_tables = dashboard_html_from_db.MonthTables(
+                datetime.date(2025, 2, 28), " (February 2025)",
+                [dashboard_html_from_db.StatTables("Jogger", "travel_km",
+                                                   [("a", 5760.0, " (February 2025)"), ("b", 12, " (May 2024)")],
+                                                   [("a", 30.9), ("b", -0.5)], None)],
+                2)
+        self.assertEqual(dashboard_html_from_db.month_data(month_tables)["stats"],
+                         [{"stat": "Jogger", "key": "travel_km",
+                           "totals": [["a", "5,760.0"], ["b", 12, " (May 2024)"]],
+                           "changes": [["a", 30], ["b", 0]]}])
+
+
+class TestMonthlyChanges(TestCase):
+
+    def make_entries(self, seed):
+        rng = random.Random(seed)
+        # Like load_entries_from_db, every entry has every stat; "Wayfarer" is a report field that isn't
+        # on the survey yet
+        stats = ["Total XP", "Jogger", "Collector", "Wayfarer"]
+        entries = {}
+        for user_idx in range(20):
+            dates = set()
+            date = datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randint(0, 60))
+            for _ in range(rng.randint(0, 15)):
+                dates.add(date)
+                # Mostly month-ish gaps, sometimes a resubmission a few days later
+                date += datetime.timedelta(days=rng.choice([1, 2, 5, 19, 20, 21, 28, 30, 31, 45]))
+            entries[f"user{user_idx}"] = user_entries = {}
+            total = 0.0
+            for date in sorted(dates):
+                total += rng.randint(0, 5000) + rng.random()
+                entry = {"Total XP": {"value": int(total)},
+                         "Jogger": {"value": round(total / 1000, 1)},
+                         "Collector": {"value": rng.choice([None, '', rng.randint(0, 10 ** 6)])},
+                         }
+                user_entries[date] = entry
+        return entries, stats + ["Platinum Badges"]
+
+    def test_numpy_matches_loops(self):
+        for seed in range(10):
+            entries, quantity_names = self.make_entries(seed)
+            expected = copy.deepcopy(entries)
+            dashboard_html_from_db.add_monthly_changes(expected, quantity_names)
+            dashboard_html_from_db.add_monthly_changes_numpy(entries, quantity_names)
+            self.assertEqual(entries, expected)
+            for user in entries:
+                for date in entries[user]:
+                    for stat, fields in entries[user][date].items():
+                        self.assertIs(type(fields.get("calculated_monthly_change")),
+                                      type(expected[user][date][stat].get("calculated_monthly_change")))
+
+    def test_tracker_matches_loops(self):
+        for seed in range(10):
+            entries, quantity_names = self.make_entries(seed)
+            expected = copy.deepcopy(entries)
+            dashboard_html_from_db.add_monthly_changes(expected, quantity_names)
+            tracker = dashboard_html_from_db.MonthlyChangeTracker(quantity_names)
+            responses = sorted(((date, user) for user in entries for date in entries[user]))
+            for date, user in responses:
+                # A same-day resubmission replaces the first
+                tracker.add(user, date, copy.deepcopy(entries[user][date]))
+                tracker.add(user, date, entries[user][date])
+            self.assertEqual(entries, expected)
+
+
+class TestAllHistory(DashboardTestCase):
+
+    def test_stream_matches_load_entries(self):
+        with open(dashboard_html_from_db.report_fields_path, 'r') as fr:
+            quantity_names = list(json.load(fr).keys())
+        entries = dashboard_html_from_db.load_entries_from_db(db_specifier=self.db_specifier)
+        dashboard_html_from_db.add_monthly_changes(entries, quantity_names)
+        starting_date = datetime.date.today().replace(day=1)
+        month_dates = dashboard_html_from_db.month_ends(dashboard_html_from_db.first_response_date(self.db_specifier),
+                                                        starting_date)
+        self.assertEqual(len(month_dates), 14)
+        streamed = dashboard_html_from_db.stream_months(dashboard_html_from_db.iter_responses(self.db_specifier),
+                                                        quantity_names, month_dates)
+        for month_date, months_data in streamed:
+            self.assertEqual(months_data, dashboard_html_from_db.find_near_date(entries, month_date))
+
+    def test_all_history_pages(self):
+        output_dir = os.path.join(self.tmpdir.name, "html")
+        out = self.run_dashboard(output_dir, "--all-history")
+        self.assertEqual(out.count("Generated page for"), 14)
+        pages = self.read_pages(output_dir)
+        self.assertEqual(len(pages), 16)
+        oldest = (datetime.date.today().replace(day=1) - relativedelta(months=14)).strftime("%Y-%m")
+        self.assertIn(f"{oldest}.html", pages)
+        self.assertIn(f'<option value="{oldest}.html">', pages["index.html"])
+        self.assertEqual(self.run_dashboard(output_dir, "--all-history").count("Generated page for"), 0)
+
+
+class TestSyntheticDb(TestCase):
+
+    def setUp(self):
+        cwd = os.getcwd()
+        os.chdir(MODULE_DIR)
+        self.addCleanup(os.chdir, cwd)
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.db_path = os.path.join(self.tmpdir.name, "synthetic.db")
+
+    def test_rows_match_save_response(self):
+        db_specifier, response_count = build_synthetic_db(self.db_path, trainers=15, months=14, seed=3)
+        engine = get_engine(db_specifier)
+        session = Session(engine)
+        self.addCleanup(engine.dispose)
+        self.addCleanup(session.close)
+        snapshots = sorted((row.trainer_id, row.survey_month, row.response_id, row.response_count)
+                           for row in session.query(MonthlySnapshot).all())
+        MonthlySnapshot.rebuild_all(session)
+        self.assertEqual(snapshots, sorted((row.trainer_id, row.survey_month, row.response_id, row.response_count)
+                                           for row in session.query(MonthlySnapshot).all()))
+        self.assertEqual(session.query(Response).count(), response_count)
+        self.assertEqual(session.query(ResponseValue).count(), response_count * len(Stat.get_schema(session)))
+        for trainer in session.query(Trainer).all():
+            newest = max(trainer.responses, key=lambda response: response.timestamp_epoch)
+            self.assertEqual(trainer.newest_response, newest.id)
+        # Monotonic stats never go down
+        entries = dashboard_html_from_db.load_entries_from_db(db_specifier=db_specifier)
+        for dates in entries.values():
+            xp = [dates[date]["Total XP"]["value"] for date in sorted(dates)]
+            self.assertEqual(xp, sorted(xp))
+
+    def test_benchmark_phases(self):
+        args = bench_dashboard.make_parser().parse_args(["--trainers", "10", "--months", "13", "--curve", "linear"])
+        db_specifier, _ = build_synthetic_db(self.db_path, response_values=False, **synthetic_db_kwargs(args))
+        recorder, responses, pages = bench_dashboard.run_once(db_specifier, args)
+        self.assertEqual(pages, 12)
+        self.assertGreater(responses, 0)
+        self.assertTrue(all(recorder.seconds[phase] > 0 for phase in bench_dashboard.PHASES))
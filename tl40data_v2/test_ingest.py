@@ -0,0 +1,144 @@
+# Unit tests for ingest.py, against a scratch sqlite db file (the writer thread needs its own connection)
+
+import json
+import os
+import queue
+import tempfile
+import threading
+from unittest import TestCase, mock
+
+from sqlalchemy.orm import Session
+
+import tables
+from ingest import SubmissionIngester
+from settings import get_engine, local_db_specifier_from_file
+from tables import Base, Response, Stat, Trainer
+from test_tables import TEST_STATS
+
+
+class TestSubmissionIngester(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.engine = get_engine(local_db_specifier_from_file(os.path.join(self.tmpdir.name, "test.db")))
+        Base.metadata.create_all(self.engine)
+        with Session(self.engine) as session:
+            for idx, (name, icon) in enumerate(TEST_STATS):
+                session.add(Stat(name=name, icon=icon, order_idx=idx))
+            session.commit()
+        self.spill_path = os.path.join(self.tmpdir.name, "spill.jsonl")
+
+    def tearDown(self):
+        self.engine.dispose()
+        self.tmpdir.cleanup()
+
+    def saved(self):
+        with Session(self.engine) as session:
+            return sorted((name, response.strdata) for response, name in
+                          session.query(Response, Trainer.name).join(Trainer, Trainer.id == Response.trainer_id))
+
+    def test_submissions_written_and_spill_emptied(self):
+        ingester = SubmissionIngester(self.engine, self.spill_path, batch_size=3)
+        ingester.start()
+        for idx in range(7):
+            ingester.submit({"trainername": f"T{idx % 2}", "total_xp": str(idx)}, timestamp=str(1700000000 + idx))
+        ingester.stop()
+        self.assertEqual(len(self.saved()), 7)
+        stats = ingester.stats()
+        self.assertEqual(stats["written"], 7)
+        self.assertGreaterEqual(stats["batches"], 3)
+        self.assertEqual(os.path.getsize(self.spill_path), 0)
+        with Session(self.engine) as session:
+            trainer = session.query(Trainer).filter_by(name="t0").one()
+            newest = session.get(Response, trainer.newest_response)
+            self.assertEqual(newest.timestamp_epoch, 1700000006.0)
+
+    def test_listeners_after_commit(self):
+        seen = []  # (trainer, their responses visible to another connection) per listener call
+
+        def listener(trainer):
+            with Session(self.engine) as session:
+                seen.append((trainer, session.query(Response).join(Trainer, Trainer.id == Response.trainer_id)
+                                             .filter(Trainer.name == trainer).count()))
+
+        ingester = SubmissionIngester(self.engine, self.spill_path, batch_size=10, batch_wait=0.5, fsync=False)
+        with mock.patch.object(tables, "response_saved_listeners", [listener]):
+            ingester.start()
+            for idx in range(5):
+                ingester.submit({"trainername": f"T{idx}", "total_xp": str(idx)}, timestamp=str(1700000000 + idx))
+            ingester.submit({"total_xp": "1"})  # no trainer name: fails, and the batch is retried one by one
+            ingester.stop()
+        self.assertEqual(sorted(seen), [(f"t{idx}", 1) for idx in range(5)])
+        stats = ingester.stats()
+        # The rolled back first attempt of the batch isn't counted
+        self.assertEqual((stats["written"], stats["duplicates"], stats["failed"]), (5, 0, 1))
+
+    def test_counts_with_failing_submission(self):
+        ingester = SubmissionIngester(self.engine, self.spill_path, batch_size=10, batch_wait=0.5, fsync=False)
+        ingester.start()
+        ingester.submit({"trainername": "a", "total_xp": "1"}, timestamp="1700000000")
+        ingester.submit({"trainername": "a", "total_xp": "1"}, timestamp="1700000000")  # resubmitted
+        ingester.submit({"trainername": "b", "total_xp": "1"}, timestamp="1700000000")
+        ingester.submit({"total_xp": "1"})
+        ingester.stop()
+        self.assertEqual(len(self.saved()), 2)
+        stats = ingester.stats()
+        self.assertEqual((stats["written"], stats["duplicates"], stats["failed"]), (2, 1, 1))
+
+    def test_replay_more_than_queue_holds(self):
+        # A full queue plus the batch being written were pending at the crash
+        with open(self.spill_path, 'w') as fw:
+            for seq in range(12):
+                fw.write(json.dumps({"seq": seq, "timestamp": str(1700000000 + seq),
+                                     "values": {"trainername": f"T{seq}", "total_xp": str(seq)}}) + "\n")
+        ingester = SubmissionIngester(self.engine, self.spill_path, maxsize=10, batch_size=3, fsync=False)
+        starter = threading.Thread(target=ingester.start, daemon=True)
+        starter.start()
+        starter.join(5)
+        self.assertFalse(starter.is_alive(), "start() blocked")
+        ingester.stop()
+        self.assertEqual(len(self.saved()), 12)
+        self.assertEqual(ingester.stats()["replayed"], 12)
+
+    def test_torn_last_line_not_continued(self):
+        with open(self.spill_path, 'w') as fw:
+            fw.write(json.dumps({"seq": 0, "timestamp": "1700000000",
+                                 "values": {"trainername": "gertlex", "total_xp": "0"}}) + "\n")
+            fw.write('{"seq": 1, "timest')  # torn write, never acknowledged
+        ingester = SubmissionIngester(self.engine, self.spill_path, fsync=False)
+        with mock.patch.object(ingester, "_writer", lambda: None):  # and then the app dies again
+            ingester.start()
+            ingester.submit({"trainername": "b", "total_xp": "1"}, timestamp="1700000001")
+            ingester._journal.close()
+        pending = SubmissionIngester(self.engine, self.spill_path)._read_journal()
+        self.assertEqual([(item["seq"], item["values"]["trainername"]) for item in pending], [(0, "gertlex"), (1, "b")])
+
+    def test_replay_after_crash(self):
+        # Two submissions were journaled, one was written and marked done, then the app died;
+        # the second was also written but the process died before marking it done
+        with open(self.spill_path, 'w') as fw:
+            for seq in range(3):
+                fw.write(json.dumps({"seq": seq, "timestamp": str(1700000000 + seq),
+                                     "values": {"trainername": "gertlex", "total_xp": str(seq)}}) + "\n")
+            fw.write(json.dumps({"done": [0]}) + "\n")
+            fw.write('{"seq": 3, "timest')  # torn write, never acknowledged
+        with Session(self.engine) as session:
+            Response.save_response(session, {"trainername": "gertlex", "total_xp": "0"}, timestamp="1700000000")
+            Response.save_response(session, {"trainername": "gertlex", "total_xp": "1"}, timestamp="1700000001")
+
+        ingester = SubmissionIngester(self.engine, self.spill_path)
+        ingester.start()
+        ingester.submit({"trainername": "gertlex", "total_xp": "9"}, timestamp="1700000009")
+        ingester.stop()
+        stats = ingester.stats()
+        self.assertEqual((stats["replayed"], stats["duplicates"], stats["written"]), (2, 1, 2))
+        self.assertEqual([strdata.split(";")[0] for _, strdata in self.saved()], ["0", "1", "2", "9"])
+
+    def test_full_queue(self):
+        ingester = SubmissionIngester(self.engine, self.spill_path, maxsize=1)
+        # Not started, so nothing drains the queue
+        ingester._journal = open(self.spill_path, 'a')
+        ingester.submit({"trainername": "a", "total_xp": "1"})
+        with self.assertRaises(queue.Full):
+            ingester.submit({"trainername": "b", "total_xp": "1"})
+        ingester._journal.close()
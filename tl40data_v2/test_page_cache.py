@@ -0,0 +1,97 @@
+# Tests for page_cache.py, and app.py's cached survey pages
+
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from sqlalchemy.orm import Session
+
+import app
+from benchmarks.common import make_benchmark_db, survey_post_values
+from page_cache import PageCache
+from settings import get_engine
+from tables import Response
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class FakeClock():
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestPageCache(TestCase):
+
+    def test_lru_and_ttl(self):
+        clock = FakeClock()
+        cache = PageCache(max_entries=2, ttl=10, clock=clock)
+        first = cache.put(("a", 1), "<p>a</p>")
+        self.assertIs(cache.get(("a", 1)), first)
+        self.assertNotEqual(first.etag, cache.put(("b", 1), "<p>b</p>").etag)
+        cache.get(("a", 1))
+        cache.put(("c", 1), "<p>c</p>")  # drops b, the least recently used
+        self.assertIsNone(cache.get(("b", 1)))
+        self.assertEqual(len(cache), 2)
+        clock.now = 10
+        self.assertIsNone(cache.get(("a", 1)))
+        self.assertEqual((cache.hits, cache.misses), (2, 2))
+
+    def test_invalidate_trainer(self):
+        cache = PageCache()
+        cache.put(("gertlex", "Gertlex", 1), "1")
+        cache.put(("gertlex", "gertlex", 1), "2")
+        cache.put(("trainera", "TrainerA", 2), "3")
+        cache.invalidate_trainer("gertlex")
+        self.assertEqual(len(cache), 1)
+        self.assertIsNotNone(cache.get(("trainera", "TrainerA", 2)))
+
+
+class TestCachedSurveyPage(TestCase):
+
+    def setUp(self):
+        cwd = os.getcwd()
+        os.chdir(MODULE_DIR)
+        self.addCleanup(os.chdir, cwd)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.engine = get_engine(make_benchmark_db(os.path.join(tmpdir.name, "test.db"), n_trainers=2))
+        self.addCleanup(self.engine.dispose)
+        for name, value in [("engine", self.engine), ("survey_page_cache", PageCache())]:
+            patcher = mock.patch.object(app, name, value, create=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = app.app.test_client()
+
+    def test_served_from_cache_until_submission(self):
+        first = self.client.get("/survey/trainer1")
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.cache_control.no_cache)
+        etag = first.headers["ETag"]
+        second = self.client.get("/survey/trainer1")
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(app.survey_page_cache.hits, 1)
+        # The browser's copy is still good
+        revalidated = self.client.get("/survey/trainer1", headers={"If-None-Match": etag})
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertEqual(revalidated.data, b"")
+        # Another trainer, or another capitalization (prefilled in the form), is another page
+        self.assertNotEqual(self.client.get("/survey/Trainer1").data, first.data)
+        self.assertEqual(len(app.survey_page_cache), 2)
+
+        session = Session(self.engine)
+        Response.save_response(session, survey_post_values("trainer1", 5))
+        session.close()
+        self.assertEqual(len(app.survey_page_cache), 0)
+        updated = self.client.get("/survey/trainer1", headers={"If-None-Match": etag})
+        self.assertEqual(updated.status_code, 200)
+        self.assertIn(b'placeholder="1050', updated.data)
+        self.assertNotEqual(updated.headers["ETag"], etag)
+
+    def test_posts_not_cached(self):
+        response = self.client.post("/survey/trainer1", data={"trainername": "trainer1", "total_xp": "5"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response.headers)
+        self.assertEqual(len(app.survey_page_cache), 0)
@@ -0,0 +1,41 @@
+# Unit tests for ranking.py, against plain sorts
+
+import random
+from unittest import TestCase
+
+from ranking import TIES_INCLUDE, rank_leaderboards, top_k_indices, top_k_rows
+
+
+class TestTopK(TestCase):
+
+    def test_matches_stable_sort(self):
+        rng = random.Random(15)
+        for _ in range(200):
+            # Few distinct values, so plenty of ties, some of them across the cut-off
+            values = [rng.choice([rng.randint(0, 5), rng.randint(0, 5) + 0.5]) for _ in range(rng.randint(0, 40))]
+            k = rng.randint(0, 45)
+            expected = sorted(range(len(values)), key=lambda idx: -values[idx])[:k]
+            self.assertEqual(top_k_indices(values, k).tolist(), expected)
+
+    def test_ties_include(self):
+        values = [3, 5, 3, 1, 3, 4]
+        self.assertEqual(top_k_indices(values, 3).tolist(), [1, 5, 0])
+        self.assertEqual(top_k_indices(values, 3, ties=TIES_INCLUDE).tolist(), [1, 5, 0, 2, 4])
+        self.assertEqual(top_k_indices(values, 2, ties=TIES_INCLUDE).tolist(), [1, 5])
+        with self.assertRaises(ValueError):
+            top_k_indices(values, 2, ties="random")
+
+    def test_top_k_rows(self):
+        rows = [("a", 10, "x"), ("b", 12.5, "y"), ("c", 12, "z")]
+        self.assertEqual(top_k_rows(rows, 2), [("b", 12.5, "y"), ("c", 12, "z")])
+        self.assertEqual(top_k_rows([], 2), [])
+
+    def test_rank_leaderboards_k_per_stat(self):
+        totals = [(f"p{idx}", idx, "") for idx in range(60)]
+        changes = [(f"p{idx}", idx % 7) for idx in range(60)]
+        ranked = rank_leaderboards({"total_xp": (totals, changes), "travel_km": (totals, changes)},
+                                   top_k={"total_xp": 50, "travel_km": 5}, default_k=20)
+        self.assertEqual(len(ranked["total_xp"][0]), 50)
+        self.assertEqual(ranked["travel_km"][0], totals[::-1][:5])
+        self.assertEqual(ranked["total_xp"][1], ranked["travel_km"][1])
+        self.assertEqual(ranked["travel_km"][1], sorted(changes, key=lambda row: -row[1])[:20])
@@ -0,0 +1,124 @@
+# Tests for static_assets.py, and app.py sending the precompressed files
+
+import gzip
+import os
+import tempfile
+from unittest import TestCase, mock
+
+import app
+import static_assets
+from static_assets import (gzip_bytes, hashed_name, is_hashed_name, precompress, precompress_dir,
+                           precompressed_variant, publish_assets)
+
+PAGE = "<html><body>" + "<tr><td>1</td><td>gertlex</td></tr>" * 200 + "</body></html>"
+
+
+def set_mtime(path, mtime):
+    os.utime(path, (mtime, mtime))
+
+
+class StaticDirTestCase(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.dir = self.tmpdir.name
+
+    def write(self, filename, text):
+        path = os.path.join(self.dir, filename)
+        with open(path, 'w') as fw:
+            fw.write(text)
+        return path
+
+
+class TestStaticAssets(StaticDirTestCase):
+
+    def test_hashed_names(self):
+        name = hashed_name("style.css", b"body {}")
+        self.assertRegex(name, r"^style\.[0-9a-f]{10}\.css$")
+        self.assertNotEqual(name, hashed_name("style.css", b"body { margin: 0; }"))
+        self.assertTrue(is_hashed_name(name))
+        self.assertFalse(is_hashed_name("style.css"))
+        self.assertFalse(is_hashed_name("2025-10.html"))
+
+    def test_publish_assets(self):
+        src_dir = os.path.join(self.dir, "src")
+        out_dir = os.path.join(self.dir, "out")
+        os.makedirs(src_dir)
+        os.makedirs(out_dir)
+        with open(os.path.join(src_dir, "style.css"), 'w') as fw:
+            fw.write("body {}")
+        published = publish_assets(src_dir, out_dir, ["style.css", "missing.js"])
+        self.assertEqual(list(published), ["style.css"])
+        with open(os.path.join(out_dir, published["style.css"]), 'r') as fr:
+            self.assertEqual(fr.read(), "body {}")
+
+    def test_precompress(self):
+        path = self.write("2025-10.html", PAGE)
+        set_mtime(path, 1000)
+        self.assertEqual(precompress(path), 1 + (static_assets.brotli is not None))
+        with open(path + ".gz", 'rb') as fr:
+            compressed = fr.read()
+        self.assertEqual(gzip.decompress(compressed).decode(), PAGE)
+        self.assertEqual(compressed, gzip_bytes(PAGE.encode()))  # no timestamp in it
+        self.assertLess(len(compressed), len(PAGE) / 10)
+        # Up to date until the page changes
+        self.assertEqual(precompress(path), 0)
+        set_mtime(path + ".gz", 500)
+        self.assertGreater(precompress(path), 0)
+        self.write("notes.txt", "not served")
+        self.assertEqual(precompress_dir(self.dir), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "notes.txt.gz")))
+
+    def test_precompressed_variant(self):
+        path = self.write("2025-10.html", PAGE)
+        accepts_gzip = {"gzip": 1, "br": 0}
+        self.assertEqual(precompressed_variant(self.dir, "2025-10.html", accepts_gzip), (None, "2025-10.html"))
+        set_mtime(path, 1000)
+        precompress(path)
+        self.assertEqual(precompressed_variant(self.dir, "2025-10.html", accepts_gzip),
+                         ("gzip", "2025-10.html.gz"))
+        self.assertEqual(precompressed_variant(self.dir, "2025-10.html", {"gzip": 0, "br": 0}),
+                         (None, "2025-10.html"))
+        self.assertEqual(precompressed_variant(self.dir, "missing.html", accepts_gzip), (None, "missing.html"))
+        # A page uploaded after its .gz is sent as is
+        set_mtime(path + ".gz", 500)
+        self.assertEqual(precompressed_variant(self.dir, "2025-10.html", accepts_gzip), (None, "2025-10.html"))
+
+
+class TestSendPrecompressed(StaticDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(app, "STATIC_PAGES_DIR", self.dir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = app.app.test_client()
+        set_mtime(self.write("index.html", PAGE), 1000)
+        self.asset = hashed_name("style.css", b"body {}")
+        set_mtime(self.write(self.asset, "body {}"), 1000)
+        precompress_dir(self.dir)
+
+    def test_gzip_when_accepted(self):
+        response = self.client.get("/", headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.mimetype, "text/html")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertEqual(gzip.decompress(response.data).decode(), PAGE)
+        self.assertEqual(response.cache_control.max_age, app.PAGE_MAX_AGE)
+        response.close()
+
+    def test_plain_otherwise(self):
+        response = self.client.get("/index.html", headers={"Accept-Encoding": "identity"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.data.decode(), PAGE)
+        response.close()
+
+    def test_hashed_asset_cached_for_good(self):
+        response = self.client.get(f"/static/{self.asset}", headers={"Accept-Encoding": "gzip"})
+        self.assertEqual(response.mimetype, "text/css")
+        self.assertEqual(response.cache_control.max_age, app.HASHED_ASSET_MAX_AGE)
+        self.assertTrue(response.cache_control.immutable)
+        self.assertEqual(gzip.decompress(response.data), b"body {}")
+        response.close()
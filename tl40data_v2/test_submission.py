@@ -12,11 +12,11 @@ from sqlalchemy import select
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.exc import OperationalError
-from sqlalchemy import create_engine, event
+from sqlalchemy import event
 from sqlalchemy.engine import ExceptionContext
 
 # Local
-from settings import LOCAL_DB_SPECIFIER, LOCAL_DB_FILENAME, TEST_USER
+from settings import LOCAL_DB_SPECIFIER, LOCAL_DB_FILENAME, TEST_USER, get_engine
 
 
 sub = \
@@ -115,8 +115,7 @@ def main():
     args = parser.parse_args()
 
     db_specifier = LOCAL_DB_SPECIFIER 
-    #engine = get_engine(db_specifier)
-    engine = create_engine(db_specifier)
+    engine = get_engine(db_specifier)
     session = Session(engine, autoflush=True)
 
     # Do stuff
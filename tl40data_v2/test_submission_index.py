@@ -0,0 +1,47 @@
+# Unit tests for submission_index.py, against dashboard_html_from_db.find_near_date
+
+import datetime
+import random
+from unittest import TestCase
+
+from dashboard_html_from_db import find_near_date
+from submission_index import SubmissionIndex
+
+
+def random_entries(rng, trainers=30, days=400):
+    """entries as loaded for the dashboard, with dates in arbitrary insertion order"""
+    start = datetime.date(2024, 1, 1)
+    entries = {}
+    for idx in range(trainers):
+        dates = rng.sample(range(days), rng.randint(0, 40))
+        entries[f"trainer{idx}"] = {start + datetime.timedelta(days=day): {"day": day} for day in dates}
+    return entries
+
+
+class TestSubmissionIndex(TestCase):
+
+    def test_matches_find_near_date(self):
+        rng = random.Random(13)
+        for _ in range(5):
+            entries = random_entries(rng)
+            index = SubmissionIndex(entries)
+            targets = [datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randint(-10, 410))
+                       for _ in range(20)]
+            for day_delta in (0, 3, 10):
+                batch = index.find_near_dates(targets, day_delta)
+                for target, result in zip(targets, batch):
+                    expected = find_near_date(entries, target, day_delta)
+                    self.assertEqual(result, expected)
+                    self.assertEqual(list(result), list(expected))  # same trainer order
+                    self.assertEqual(index.find_near_date(target, day_delta), expected)
+
+    def test_latest_in_range(self):
+        entries = {"a": {datetime.date(2025, 1, 5): 1, datetime.date(2025, 1, 1): 2}, "b": {}}
+        index = SubmissionIndex(entries)
+        self.assertEqual(index.latest_in_range("a", datetime.date(2025, 1, 1), datetime.date(2025, 1, 4)),
+                         datetime.date(2025, 1, 1))
+        self.assertEqual(index.latest_in_range("a", datetime.date(2025, 1, 1), datetime.date(2025, 2, 1)),
+                         datetime.date(2025, 1, 5))
+        self.assertIsNone(index.latest_in_range("a", datetime.date(2025, 1, 2), datetime.date(2025, 1, 4)))
+        self.assertIsNone(index.latest_in_range("b", datetime.date(2025, 1, 1), datetime.date(2025, 2, 1)))
+        self.assertIsNone(index.latest_in_range("c", datetime.date(2025, 1, 1), datetime.date(2025, 2, 1)))
@@ -0,0 +1,77 @@
+# Tests for the survey form classes in app.py: survey_layout(), survey_form_class() and PogoStatsForm
+
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from werkzeug.datastructures import MultiDict
+
+import app
+from tables import Stat
+
+
+def stat(name, icon, numtype="Integer", maximum=-1, monotonic=True, required=1):
+    return Stat(name=name, icon=icon, numtype=numtype, bronze=0, silver=0, gold=0, platinum=0,
+                maximum=maximum, monotonic=monotonic, required=required)
+
+
+def stats_list(xp, level, km, kanto):
+    """As from get_survey_data_in_survey_order(): [order, Stat, previous value string]"""
+    return [[0, stat("Total XP", "total_xp"), f"{xp}"],
+            [10, stat("Trainer Level", "trainer_level", maximum=80), f"{level}"],
+            [15, stat("Unique Species Seen", "pokedex_seen", required=-1), "0"],
+            [150, stat("Jogger", "travel_km", numtype="Float", required=0), f"{km} (Gold)"],
+            [250, stat("Kanto", "pokedex_entries", maximum=151), f"{kanto} (Silver)"],
+            ]
+
+
+def make_form(survey, **formdata):
+    layout, previous_values = app.survey_layout(survey)
+    form_class = app.survey_form_class(layout)
+    return form_class, form_class(MultiDict(formdata), previous_values=previous_values)
+
+
+class TestSurveyFormClass(TestCase):
+
+    def test_shared_by_layout(self):
+        class_a, form_a = make_form(stats_list(1000, 41, 12.5, 100))
+        class_b, form_b = make_form(stats_list(2000, 45, 20.0, 120))
+        self.assertIs(class_a, class_b)
+        self.assertEqual(class_a.statlist, ("total_xp", "trainer_level", "travel_km", "pokedex_entries"))
+        self.assertEqual(class_a.statdivider, (False, False, True, True))
+        # Per trainer
+        self.assertEqual(form_a.total_xp.render_kw["placeholder"], "1000")
+        self.assertEqual(form_b.total_xp.render_kw["placeholder"], "2000")
+        self.assertEqual(form_b.travel_km.render_kw["placeholder"], "20.0 (Gold)")
+        self.assertIn('min="2000"', form_b.total_xp())
+        self.assertIn('min="1000"', form_a.total_xp())
+        # Maxed Kanto: prefilled and required, so a different layout
+        class_c, form_c = make_form(stats_list(1000, 41, 12.5, 151))
+        self.assertIsNot(class_c, class_a)
+        self.assertEqual(form_c.pokedex_entries.data, 151)
+        self.assertIsNone(form_a.pokedex_entries.data)
+        # The base class is left alone
+        self.assertFalse(hasattr(app.PogoStatsForm, "total_xp"))
+        self.assertFalse(hasattr(app.PogoStatsForm, "statlist"))
+
+    def test_validation_per_trainer(self):
+        submitted = {"trainername": "TrainerA", "total_xp": "1500", "trainer_level": "42", "pokedex_entries": "130"}
+        _, form_a = make_form(stats_list(1000, 41, 12.5, 100), **submitted)
+        _, form_b = make_form(stats_list(2000, 41, 12.5, 100), **submitted)
+        self.assertTrue(form_a.validate(), form_a.errors)
+        self.assertFalse(form_b.validate())
+        self.assertEqual(form_b.errors, {"total_xp": ["Number must be at least 2000."]})
+        # Leveling down, past a maximum, and a non-optional blank
+        _, form = make_form(stats_list(1000, 41, 12.5, 100), trainername="TrainerA", total_xp="1500",
+                            trainer_level="40", pokedex_entries="152")
+        self.assertFalse(form.validate())
+        self.assertEqual(set(form.errors), {"trainer_level", "pokedex_entries"})
+        self.assertIn("between 41 and 80", form.errors["trainer_level"][0])
+
+    def test_concurrent_trainers(self):
+        def validate(xp):
+            _, form = make_form(stats_list(xp, 41, 12.5, 100), trainername="TrainerA", total_xp="5000",
+                                trainer_level="41", pokedex_entries="100")
+            return form.validate()
+        xps = [1000, 9000] * 50
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            self.assertEqual(list(pool.map(validate, xps)), [xp < 5000 for xp in xps])
@@ -0,0 +1,293 @@
+# Unit tests for the storage helpers in tables.py, against an in-memory sqlite db
+
+import datetime
+import os
+import tempfile
+from unittest import TestCase
+
+import sqlalchemy
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from settings import get_engine, local_db_specifier_from_file
+
+from tables import (Base, MonthlySnapshot, Response, ResponseValue, Stat, Trainer, bump_schema_version,
+                    decode_bindata, encode_bindata, survey_month)
+
+
+# (name, icon) in strdata order
+TEST_STATS = [("Total XP", "total_xp"),
+              ("Trainer Level", "trainer_level"),
+              ("Jogger", "travel_km"),
+              ("Collector", "capture_total"),
+              ]
+
+
+def make_session():
+    """Session on a fresh in-memory db with the TEST_STATS rows filled in"""
+    engine = create_engine("sqlite+pysqlite://")
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    for idx, (name, icon) in enumerate(TEST_STATS):
+        session.add(Stat(name=name, icon=icon, order_idx=idx))
+    session.commit()
+    return session
+
+
+class TestResponseValue(TestCase):
+
+    def setUp(self):
+        self.session = make_session()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_save_response_writes_values(self):
+        response = Response.save_response(self.session, {"trainername": "Gertlex",
+                                                         "total_xp": "1000",
+                                                         "trainer_level": "41",
+                                                         "travel_km": "12.5",
+                                                         "capture_total": ""},
+                                          timestamp="1700000000.0")
+        self.assertEqual(response.timestamp_epoch, 1700000000.0)
+        values = ResponseValue.read_values(self.session, response.id)
+        self.assertEqual(values, {"Total XP": 1000, "Trainer Level": 41, "Jogger": 12.5, "Collector": None})
+        self.assertIsInstance(values["Total XP"], int)
+        self.assertEqual(ResponseValue.read_values(self.session, response.id, ["Jogger"]), {"Jogger": 12.5})
+
+    def test_save_response_carries_over_missing_stats(self):
+        first = Response.save_response(self.session, {"trainername": "Gertlex", "total_xp": "1000",
+                                                      "trainer_level": "41", "capture_total": "7"},
+                                       timestamp="1700000000.0")
+        commits = []
+        sqlalchemy.event.listen(self.session, "after_commit", lambda session: commits.append(1))
+        # e.g. Collector was retired from the survey
+        second = Response.save_response(self.session, {"trainername": "gertlex", "total_xp": "2000",
+                                                       "trainer_level": "42"},
+                                        timestamp="1702000000.0")
+        self.assertEqual(len(commits), 1)
+        self.assertEqual(second.strdata, "2000;42;0;7")
+        trainer = self.session.query(Trainer).filter_by(name="gertlex").one()
+        self.assertEqual(trainer.newest_response, second.id)
+        self.assertEqual(trainer.proper_name, "gertlex")
+        # An older (e.g. replayed) submission doesn't become the newest response
+        Response.save_response(self.session, {"trainername": "Gertlex", "total_xp": "1500"},
+                               timestamp="1701000000.0")
+        self.assertEqual(trainer.newest_response, second.id)
+        self.assertNotEqual(first.id, second.id)
+
+    def test_concurrent_first_submissions(self):
+        # Another request saves the new trainer's first response between our lookup and insert
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        engine = get_engine(local_db_specifier_from_file(os.path.join(tmpdir.name, "test.db")))
+        self.addCleanup(engine.dispose)
+        Base.metadata.create_all(engine)
+        with Session(engine) as session:
+            for idx, (name, icon) in enumerate(TEST_STATS):
+                session.add(Stat(name=name, icon=icon, order_idx=idx))
+            session.commit()
+        other_engine = get_engine(local_db_specifier_from_file(os.path.join(tmpdir.name, "test.db")))
+        self.addCleanup(other_engine.dispose)
+
+        def before_insert(conn, cursor, statement, parameters, context, executemany):
+            if statement.startswith("INSERT INTO trainer") and not raced:
+                raced.append(1)
+                with Session(other_engine) as other:
+                    Response.save_response(other, {"trainername": "Newbie", "total_xp": "1000", "capture_total": "7"},
+                                           timestamp="1700000000.0")
+        raced = []
+        sqlalchemy.event.listen(engine, "before_cursor_execute", before_insert)
+        with Session(engine) as session:
+            response = Response.save_response(session, {"trainername": "newbie", "total_xp": "1001"},
+                                              timestamp="1700000001.0")
+            self.assertEqual(raced, [1])
+            trainer = session.query(Trainer).filter_by(name="newbie").one()
+            self.assertEqual(session.query(Trainer).count(), 1)
+            self.assertEqual(session.query(Response).count(), 2)
+            self.assertEqual(trainer.newest_response, response.id)
+            self.assertEqual(response.strdata, "1001;0;0;7")
+
+    def test_short_strdata(self):
+        # Older responses were saved before newer stats existed
+        trainer = Trainer(name="old", proper_name="Old")
+        self.session.add(trainer)
+        self.session.flush()
+        response = Response(trainer_id=trainer.id, timestamp="1600000000.0", strdata="5;40")
+        self.session.add(response)
+        self.session.flush()
+        ResponseValue.write_values(self.session, response)
+        self.assertEqual(ResponseValue.read_values(self.session, response.id),
+                         {"Total XP": 5, "Trainer Level": 40})
+
+    def test_update_strdata_and_query_stat(self):
+        response = Response.save_response(self.session, {"trainername": "a_trainer", "total_xp": "10"},
+                                          timestamp="1700000000.0")
+        response.update_strdata(self.session, "20;41;0;7")
+        self.session.commit()
+        self.assertEqual(ResponseValue.read_values(self.session, response.id)["Collector"], 7)
+        rows = ResponseValue.query_stat(self.session, "Total XP").filter(ResponseValue.value > 15).all()
+        self.assertEqual([(r.id, value) for r, value in rows], [(response.id, 20)])
+
+    def test_rebuild_all(self):
+        Response.save_response(self.session, {"trainername": "a_trainer", "total_xp": "10"},
+                               timestamp="1700000000.0")
+        self.session.query(ResponseValue).delete()
+        self.assertEqual(ResponseValue.rebuild_all(self.session), 1)
+        self.assertEqual(self.session.query(ResponseValue).count(), len(TEST_STATS))
+
+
+class TestStatSchema(TestCase):
+
+    def setUp(self):
+        self.session = make_session()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_lookups(self):
+        schema = Stat.get_schema(self.session)
+        self.assertEqual(schema.names, tuple(name for name, _ in TEST_STATS))
+        self.assertEqual(schema.icon_to_idx["travel_km"], 2)
+        self.assertEqual(schema.name_to_idx["Collector"], 3)
+        self.assertEqual(len(schema), len(TEST_STATS))
+
+    def test_cached_until_invalidated(self):
+        schema = Stat.get_schema(self.session)
+        self.session.add(Stat(name="Scientist", icon="evolved_total", order_idx=len(TEST_STATS)))
+        self.session.commit()
+        self.assertIs(Stat.get_schema(self.session), schema)
+        bump_schema_version(self.session)
+        self.session.commit()
+        self.assertEqual(Stat.get_schema(self.session).names[-1], "Scientist")
+
+    def test_revalidate_sees_version_bump(self):
+        schema = Stat.get_schema(self.session)
+        # As if another process ran fill_static_tables.py
+        self.session.execute(sqlalchemy.text("PRAGMA user_version = 5"))
+        self.session.commit()
+        self.assertIs(Stat.get_schema(self.session), schema)
+        self.assertIsNot(Stat.get_schema(self.session, revalidate=True), schema)
+
+
+class TestUnpackStrdataMany(TestCase):
+
+    def setUp(self):
+        self.session = make_session()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_matches_unpack_strdata(self):
+        rows = [(1, 10, "1700000000.0", "100;41;1.5;7"),
+                (2, 11, "1700000100.5", "200;;0;8"),
+                (3, 10, "1600000000.0", "50;40"),  # from before the last two stats existed
+                ]
+        matrix = Stat.unpack_strdata_many(rows, self.session, pad_data=True)
+        self.assertEqual(matrix.values.shape, (3, len(TEST_STATS)))
+        self.assertEqual(matrix.names, Stat.get_schema(self.session).names)
+        self.assertEqual(list(matrix.response_ids), [1, 2, 3])
+        self.assertEqual(list(matrix.trainer_ids), [10, 11, 10])
+        self.assertEqual(matrix.timestamps[1], 1700000100.5)
+        for row_idx, row in enumerate(rows):
+            unpacked = Stat.unpack_strdata(row[3], self.session, pad_data=True)
+            self.assertEqual(list(matrix.values[row_idx]), [v["value"] for v in unpacked.values()])
+        self.assertEqual(matrix.missing.tolist(), [[False, False, False, False],
+                                                   [False, True, False, False],
+                                                   [False, False, True, True]])
+
+    def test_response_objects_and_no_padding(self):
+        response = Response.save_response(self.session, {"trainername": "a_trainer", "total_xp": "10"},
+                                          timestamp="1700000000.0")
+        matrix = Stat.unpack_strdata_many([response], self.session)
+        self.assertEqual(matrix.values[0, 0], 10)
+        with self.assertRaises(AssertionError):
+            Stat.unpack_strdata_many([(1, 1, "0", "5;40")], self.session)
+
+    def test_empty(self):
+        matrix = Stat.unpack_strdata_many([], self.session)
+        self.assertEqual(matrix.values.shape, (0, len(TEST_STATS)))
+
+
+class TestMonthlySnapshot(TestCase):
+
+    def setUp(self):
+        self.session = make_session()
+
+    def tearDown(self):
+        self.session.close()
+
+    def save(self, trainer, date_string, total_xp):
+        timestamp = str(datetime.datetime.fromisoformat(date_string).timestamp())
+        return Response.save_response(self.session, {"trainername": trainer, "total_xp": str(total_xp)},
+                                      timestamp=timestamp)
+
+    def snapshots(self):
+        return {(snapshot.trainer_id, snapshot.survey_month): (snapshot.response_id, snapshot.response_count)
+                for snapshot in self.session.query(MonthlySnapshot).all()}
+
+    def test_survey_month(self):
+        self.assertEqual(survey_month(datetime.datetime(2025, 11, 3, 23, 59).timestamp()), "2025-10")
+        self.assertEqual(survey_month(str(datetime.datetime(2025, 11, 4).timestamp())), "2025-11")
+        self.assertEqual(survey_month(datetime.datetime(2025, 1, 2).timestamp()), "2024-12")
+
+    def test_save_response_keeps_latest_per_month(self):
+        oct_early = self.save("a_trainer", "2025-10-10T12:00", 1)
+        oct_late = self.save("a_trainer", "2025-11-02T12:00", 2)  # counts for October
+        self.save("a_trainer", "2025-10-20T12:00", 3)  # replayed late; not the newest for October
+        nov = self.save("a_trainer", "2025-11-30T12:00", 4)
+        other = self.save("b_trainer", "2025-10-31T12:00", 5)
+        trainer_id = oct_early.trainer_id
+        self.assertEqual(self.snapshots(), {(trainer_id, "2025-10"): (oct_late.id, 3),
+                                            (trainer_id, "2025-11"): (nov.id, 1),
+                                            (other.trainer_id, "2025-10"): (other.id, 1)})
+        october = MonthlySnapshot.query_responses(self.session) \
+                                 .filter(MonthlySnapshot.survey_month == "2025-10").all()
+        self.assertEqual(sorted(response.id for _, response in october), sorted([oct_late.id, other.id]))
+
+        expected = self.snapshots()
+        self.session.query(MonthlySnapshot).delete()
+        self.assertEqual(MonthlySnapshot.rebuild_all(self.session), 3)
+        self.assertEqual(self.snapshots(), expected)
+
+
+class TestBindata(TestCase):
+
+    def setUp(self):
+        self.session = make_session()
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_round_trip(self):
+        for values in [[1000, 41, 12.5, None],
+                       [67227587, 45, 648.0, 0],
+                       [-1, 2 ** 40, None, None],
+                       [],
+                       ]:
+            self.assertEqual(decode_bindata(encode_bindata(values)), values)
+        # A blob from before the last two stats existed
+        self.assertEqual(decode_bindata(encode_bindata([5, 40]), width=4), [5, 40, None, None])
+        with self.assertRaises(ValueError):
+            decode_bindata(encode_bindata([1, 2, 3]), width=2)
+
+    def test_compact(self):
+        # Small integers take one byte each
+        self.assertLess(len(encode_bindata([1] * 100)), len(";".join(["1"] * 100)))
+
+    def test_matches_unpack_strdata_many(self):
+        strdatas = ["100;41;1.5;7", "200;;0;8", "50;40", "67227587;45;648.0;0"]
+        rows = [(idx, 10, "1700000000.0", strdata) for idx, strdata in enumerate(strdatas)]
+        bin_rows = [(idx, 10, "1700000000.0", Response.bindata_from_strdata(strdata))
+                    for idx, strdata in enumerate(strdatas)]
+        from_strdata = Stat.unpack_strdata_many(rows, self.session, pad_data=True)
+        from_bindata = Stat.unpack_bindata_many(bin_rows, self.session)
+        self.assertEqual(from_bindata.values.tolist(), from_strdata.values.tolist())
+        self.assertEqual(from_bindata.missing.tolist(), from_strdata.missing.tolist())
+
+    def test_kept_in_sync(self):
+        response = Response.save_response(self.session, {"trainername": "a_trainer", "total_xp": "10",
+                                                         "travel_km": "2.5"}, timestamp="1700000000.0")
+        self.assertEqual(decode_bindata(response.bindata), [10, 0, 2.5, 0])
+        response.update_strdata(self.session, "20;41;;7")
+        self.assertEqual(decode_bindata(response.bindata), [20, 41, None, 7])
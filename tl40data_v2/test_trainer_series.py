@@ -0,0 +1,294 @@
+# Tests for trainer_series.py, and app.py's /api/trainer-stats and /api/compare
+
+from datetime import datetime
+import os
+import tempfile
+from unittest import TestCase, mock
+
+from sqlalchemy.orm import Session
+
+import app
+import tables
+from benchmarks.common import make_benchmark_db, quiet, survey_post_values
+from ingest import SubmissionIngester
+from settings import get_engine
+from tables import Response, Stat, Trainer
+from test_page_cache import FakeClock
+from trainer_series import MonthlySeries, ResponseSeries, SeriesCache, compare_columns, monthly_series, \
+    query_monthly_series, query_series, view_points
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def local_timestamp(date_string):
+    """POSIX timestamp of a local "YYYY-MM-DD HH:MM" time"""
+    return datetime.strptime(date_string, "%Y-%m-%d %H:%M").timestamp()
+
+
+class TestViewPoints(TestCase):
+
+    def test_views(self):
+        months = ("2024-01", "2024-02", "2024-03", "2024-04")
+        values = (100.0, 150.0, 0.0, 30.0)
+        self.assertEqual(view_points(months, values), [[m, v] for m, v in zip(months, values)])
+        self.assertEqual(view_points(months, values, "increments"),
+                         [["2024-02", 50.0], ["2024-03", -150.0], ["2024-04", 30.0]])
+        # No rate after a month of 0
+        self.assertEqual(view_points(months, values, "rate"), [["2024-02", 50.0], ["2024-03", -100.0]])
+        self.assertEqual(view_points(months[:1], values[:1], "increments"), [])
+        with self.assertRaises(ValueError):
+            view_points(months, values, "log")
+
+
+class TestCompareColumns(TestCase):
+
+    def test_shared_month_axis(self):
+        series = {"TrainerA": MonthlySeries(("2024-01", "2024-02", "2024-03"), (1, 2, 3),
+                                            {"Total XP": (100.0, 150.0, 175.0), "Jogger": (1.0, 2.0, 3.0)}),
+                  "TrainerB": MonthlySeries(("2024-02", "2024-04"), (2, 4),
+                                            {"Total XP": (10.0, 30.0), "Jogger": (5.0, 6.0)})}
+        months, columns = compare_columns(series, ["Total XP", "Not a stat"])
+        self.assertEqual(months, ["2024-01", "2024-02", "2024-03", "2024-04"])
+        self.assertEqual(columns, [
+            {"trainer_name": "TrainerA", "stat_name": "Total XP", "values": [100.0, 150.0, 175.0, None]},
+            {"trainer_name": "TrainerB", "stat_name": "Total XP", "values": [None, 10.0, None, 30.0]}])
+        months, columns = compare_columns(series, ["Jogger"], "increments")
+        self.assertEqual(months, ["2024-02", "2024-03", "2024-04"])
+        self.assertEqual([column["values"] for column in columns], [[1.0, 1.0, None], [None, None, 1.0]])
+
+
+class DbTestCase(TestCase):
+    """A db with two trainers ("trainer0" and "trainer1") of one response each"""
+
+    def setUp(self):
+        cwd = os.getcwd()
+        os.chdir(MODULE_DIR)
+        self.addCleanup(os.chdir, cwd)
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.tmpdir = tmpdir.name
+        self.engine = get_engine(make_benchmark_db(os.path.join(tmpdir.name, "test.db"), n_trainers=2))
+        self.addCleanup(self.engine.dispose)
+        self.session = Session(self.engine)
+        self.addCleanup(self.session.close)
+        self.trainer = self.session.query(Trainer).filter_by(name="trainer1").one()
+
+    def save_response(self, iteration, date_string=None):
+        timestamp = str(local_timestamp(date_string)) if date_string else None
+        with quiet():
+            Response.save_response(self.session, survey_post_values("trainer1", iteration), timestamp=timestamp)
+
+
+class TestQueryMonthlySeries(DbTestCase):
+
+    def test_matches_strdata(self):
+        self.save_response(1)
+        stat_names = ["Total XP", "Jogger", "Unique Species Seen", "Not a stat"]
+        series = query_series(self.session, [self.trainer.id], stat_names)[self.trainer.id]
+        self.assertEqual(set(series.values), {"Total XP", "Jogger", "Unique Species Seen"})
+
+        names = Stat.get_schema(self.session).names
+        responses = self.session.query(Response).filter(Response.trainer_id == self.trainer.id) \
+                                .order_by(Response.timestamp_epoch).all()
+        self.assertEqual(series.timestamps, tuple(response.timestamp_epoch for response in responses))
+        for idx, response in enumerate(responses):
+            strdata = dict(zip(names, response.strdata.split(';')))
+            for stat_name in series.values:
+                expected = float(strdata[stat_name]) if strdata[stat_name] else 0.0
+                self.assertEqual(series.values[stat_name][idx], expected, stat_name)
+        self.assertEqual(series.values["Total XP"], (1000.0, 1010.0))
+        # Blank (not asked) in the survey
+        self.assertEqual(series.values["Unique Species Seen"][-1], 0.0)
+
+    def test_several_trainers(self):
+        self.save_response(1)
+        trainer0 = self.session.query(Trainer).filter_by(name="trainer0").one()
+        by_trainer = query_series(self.session, [trainer0.id, self.trainer.id, -1], ["Total XP"])
+        self.assertEqual(by_trainer[trainer0.id].values["Total XP"], (1000.0,))
+        self.assertEqual(by_trainer[self.trainer.id].values["Total XP"], (1000.0, 1010.0))
+        self.assertEqual(by_trainer[-1], ResponseSeries((), {"Total XP": ()}))
+
+
+class TestMonthlySeries(TestCase):
+
+    def test_calendar_months(self):
+        # Submissions on the 1st-3rd are in that calendar month, not the previous survey month
+        dates = ["2025-09-20 12:00", "2025-10-05 12:00", "2025-10-20 12:00", "2025-11-01 12:00"]
+        series = ResponseSeries(tuple(local_timestamp(date) for date in dates), {"Total XP": (1010.0, 1020.0, 1030.0, 1040.0)})
+        monthly = monthly_series(series)
+        self.assertEqual(monthly.months, ("2025-09", "2025-10", "2025-11"))
+        self.assertEqual(monthly.values, {"Total XP": (1010.0, 1030.0, 1040.0)})
+        self.assertEqual(monthly.timestamps, (series.timestamps[0], series.timestamps[2], series.timestamps[3]))
+
+    def test_range_before_latest_of_month(self):
+        # A month's latest response past the end of the range falls back to an earlier one in range
+        dates = ["2025-09-20 12:00", "2025-10-05 12:00", "2025-10-20 12:00"]
+        series = ResponseSeries(tuple(local_timestamp(date) for date in dates), {"Total XP": (1010.0, 1020.0, 1030.0)})
+        monthly = monthly_series(series, local_timestamp("2025-09-21 00:00"), local_timestamp("2025-10-10 00:00"))
+        self.assertEqual((monthly.months, monthly.values), (("2025-10",), {"Total XP": (1020.0,)}))
+        self.assertEqual(monthly_series(series, local_timestamp("2026-01-01 00:00")),
+                         MonthlySeries((), (), {"Total XP": ()}))
+
+
+class TestSeriesCache(DbTestCase):
+
+    def test_merges_stats(self):
+        cache = SeriesCache()
+        first = cache.get(self.session, self.trainer.id, "trainer1", ["Total XP"])
+        self.assertIs(cache.get(self.session, self.trainer.id, "trainer1", ["Total XP", "Not a stat"]), first)
+        self.assertEqual(cache.queries, 1)
+        both = cache.get(self.session, self.trainer.id, "trainer1", ["Jogger"])
+        self.assertEqual(set(both.values), {"Total XP", "Jogger"})
+        self.assertEqual(cache.queries, 2)
+        cache.get(self.session, self.trainer.id, "trainer1", ["Total XP", "Jogger"])
+        self.assertEqual(cache.queries, 2)
+
+    def test_get_many(self):
+        cache = SeriesCache()
+        trainer0 = self.session.query(Trainer).filter_by(name="trainer0").one()
+        cache.get(self.session, self.trainer.id, "trainer1", ["Total XP"])
+        trainers = [(trainer0.id, "trainer0"), (self.trainer.id, "trainer1")]
+        by_trainer = cache.get_many(self.session, trainers, ["Total XP"])
+        self.assertEqual(set(by_trainer), {"trainer0", "trainer1"})
+        self.assertEqual(cache.queries, 2)
+        # Both need Jogger: one query
+        by_trainer = cache.get_many(self.session, trainers, ["Jogger"])
+        self.assertEqual(cache.queries, 3)
+        self.assertEqual(set(by_trainer["trainer1"].values), {"Total XP", "Jogger"})
+        cache.get_many(self.session, trainers, ["Total XP", "Jogger"])
+        self.assertEqual(cache.queries, 3)
+
+    def test_ttl_and_size(self):
+        clock = FakeClock()
+        cache = SeriesCache(max_trainers=1, ttl=10, clock=clock)
+        cache.get(self.session, self.trainer.id, "trainer1", ["Total XP"])
+        clock.now = 10
+        cache.get(self.session, self.trainer.id, "trainer1", ["Total XP"])
+        self.assertEqual(cache.queries, 2)
+        trainer0 = self.session.query(Trainer).filter_by(name="trainer0").one()
+        cache.get(self.session, trainer0.id, "trainer0", ["Total XP"])
+        self.assertEqual(len(cache), 1)
+
+    def test_reread_on_new_submission(self):
+        cache = SeriesCache()
+        with mock.patch.object(app, "series_cache", cache):
+            cache.get(self.session, self.trainer.id, "trainer1", ["Total XP"])
+            self.save_response(3)
+            self.assertEqual(len(cache), 0)
+        series = cache.get(self.session, self.trainer.id, "trainer1", ["Total XP"])
+        self.assertEqual(series.values["Total XP"][-1], 1030.0)
+
+
+class TestTrainerStatsApi(DbTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name, value in [("engine", self.engine), ("series_cache", SeriesCache())]:
+            patcher = mock.patch.object(app, name, value, create=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = app.app.test_client()
+
+    def post(self, **kwargs):
+        request = {"trainer_name": "Trainer1", "stat_names": ["Total XP"],
+                   "start_date": "2000-01-01", "end_date": "2100-12-31", **kwargs}
+        return self.client.post("/api/trainer-stats", json=request)
+
+    def test_stats(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual((data["stat_name"], len(data["data_points"]), data["trainer_name"]), ("Total XP", 1, "Trainer1"))
+        response = self.post(stat_names=["Total XP", "Jogger", "Not a stat"])
+        self.assertEqual([stat["stat_name"] for stat in response.get_json()["stats"]], ["Total XP", "Jogger"])
+        self.assertEqual(app.series_cache.queries, 2)
+
+        # Seen right after submitting
+        self.save_response(2)
+        self.assertEqual(self.post().get_json()["data_points"][-1][1], 1020.0)
+
+    def test_calendar_months(self):
+        self.save_response(1, "2025-09-20 12:00")
+        self.save_response(2, "2025-10-20 12:00")
+        self.save_response(3, "2025-11-01 12:00")  # the usual time to submit
+        absolute = self.post(start_date="2025-09-01", end_date="2025-11-30").get_json()
+        self.assertEqual(absolute["data_points"], [["2025-09", 1010.0], ["2025-10", 1020.0], ["2025-11", 1030.0]])
+        increments = self.post(start_date="2025-09-01", end_date="2025-11-30", view_type="increments").get_json()
+        self.assertEqual(increments["data_points"], [["2025-10", 10.0], ["2025-11", 10.0]])
+        # Up to Oct 31: October is still Oct 20's
+        self.assertEqual(self.post(start_date="2025-10-01", end_date="2025-10-31").get_json()["data_points"],
+                         [["2025-10", 1020.0]])
+
+    def test_ingested_submission(self):
+        self.assertEqual(self.post().get_json()["data_points"][-1][1], 1000.0)
+        # A request right after the trainer's cache entry is dropped must already see the new response
+        seen = []
+        listeners = tables.response_saved_listeners + [lambda trainer: seen.append(self.post().get_json())]
+        ingester = SubmissionIngester(self.engine, os.path.join(self.tmpdir, "spill.jsonl"), fsync=False)
+        with mock.patch.object(tables, "response_saved_listeners", listeners), quiet():
+            ingester.start()
+            ingester.submit(survey_post_values("trainer1", 4))
+            ingester.stop()
+        self.assertEqual(seen[0]["data_points"][-1][1], 1040.0)
+        self.assertEqual(self.post().get_json()["data_points"][-1][1], 1040.0)
+
+    def test_errors(self):
+        self.assertEqual(self.post(trainer_name="nobody").status_code, 404)
+        self.assertEqual(self.post(start_date="2000-01-01", end_date="2000-12-31").status_code, 404)
+        self.assertEqual(self.post(view_type="increments").status_code, 400)
+
+
+class TestCompareApi(DbTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for name, value in [("engine", self.engine), ("series_cache", SeriesCache())]:
+            patcher = mock.patch.object(app, name, value, create=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = app.app.test_client()
+
+    def post(self, **kwargs):
+        request = {"trainer_names": ["Trainer1", "trainer0"], "stat_names": ["Total XP", "Jogger"],
+                   "start_date": "2000-01-01", "end_date": "2100-12-31", **kwargs}
+        return self.client.post("/api/compare", json=request)
+
+    def test_columns(self):
+        self.save_response(2)
+        response = self.post(trainer_names=["Trainer1", "trainer0", "TRAINER1", "nobody"],
+                             stat_names=["Total XP", "Not a stat", "Jogger"])
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data["trainer_names"], ["Trainer1", "trainer0"])
+        self.assertEqual(data["stat_names"], ["Total XP", "Jogger"])
+        self.assertEqual(data["missing_trainers"], ["nobody"])
+        self.assertEqual([(column["trainer_name"], column["stat_name"], column["values"]) for column in data["columns"]],
+                         [("Trainer1", "Total XP", [1020.0]), ("Trainer1", "Jogger", [1020.0]),
+                          ("trainer0", "Total XP", [1000.0]), ("trainer0", "Jogger", [1000.0])])
+        # The same values as /api/trainer-stats
+        single = self.client.post("/api/trainer-stats", json={
+            "trainer_name": "Trainer1", "stat_names": ["Total XP"], "start_date": "2000-01-01",
+            "end_date": "2100-12-31"}).get_json()
+        self.assertEqual(single["data_points"], [[data["months"][0], 1020.0]])
+
+    def test_calendar_months(self):
+        self.save_response(1, "2025-10-20 12:00")
+        self.save_response(2, "2025-11-01 12:00")
+        data = self.post(trainer_names=["trainer1"], stat_names=["Total XP"],
+                         start_date="2025-10-01", end_date="2025-11-30").get_json()
+        self.assertEqual((data["months"], data["columns"][0]["values"]), (["2025-10", "2025-11"], [1010.0, 1020.0]))
+        # One query for both trainers, then cached
+        self.assertEqual(app.series_cache.queries, 1)
+
+    def test_errors(self):
+        self.assertEqual(self.post(trainer_names=[]).status_code, 400)
+        self.assertEqual(self.post(trainer_names=[f"t{idx}" for idx in range(app.MAX_COMPARE_TRAINERS + 1)]).status_code,
+                         400)
+        self.assertEqual(self.post(trainer_names=["trainer1"] * 100000 + ["t0"]).status_code, 200)
+        self.assertEqual(self.post(trainer_names=[f"t{idx}" for idx in range(100000)]).status_code, 400)
+        self.assertEqual(self.post(trainer_names="trainer1").status_code, 400)
+        self.assertEqual(self.post(trainer_names=["trainer1", 5]).status_code, 400)
+        self.assertEqual(self.post(view_type="log").status_code, 400)
+        response = self.post(trainer_names=["nobody"])
+        self.assertEqual((response.status_code, response.get_json()["missing_trainers"]), (404, ["nobody"]))
+        self.assertEqual(self.post(start_date="2000-01-01", end_date="2000-12-31").status_code, 404)
@@ -0,0 +1,77 @@
+# Tests for upload_planner.py, against a local directory standing in for the server
+
+import os
+import tarfile
+import tempfile
+from unittest import TestCase
+
+import upload_planner
+from upload_planner import PENDING_MANIFEST_FILENAME, UPLOADED_MANIFEST_FILENAME, build_manifest
+
+
+class TestUploadPlanner(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.html_dir = os.path.join(self.tmpdir.name, "html")
+        self.server_dir = os.path.join(self.tmpdir.name, "server")
+        self.list_file = os.path.join(self.tmpdir.name, "upload_list.txt")
+        self.tar_path = os.path.join(self.tmpdir.name, "upload.tar")
+        os.makedirs(self.html_dir)
+        for name in ["index.html", "2025-09.html", "2025-10.html", "2025-10.json"]:
+            self.write(name, f"<p>{name}</p>")
+
+    def write(self, name, text):
+        with open(os.path.join(self.html_dir, name), 'w') as fw:
+            fw.write(text)
+
+    def run_planner(self, *argv):
+        args = upload_planner.make_parser().parse_args(
+            ["--html-dir", self.html_dir, "--list-file", self.list_file] + list(argv))
+        self.assertEqual(upload_planner.main(args), 0)
+        with open(self.list_file, 'r') as fr:
+            return [os.path.basename(path) for path in fr.read().split()]
+
+    def test_first_upload_is_everything(self):
+        self.assertEqual(self.run_planner("--deliver-to", self.server_dir),
+                         ["2025-09.html", "2025-10.html", "2025-10.json", "index.html"])
+        self.assertEqual(build_manifest(self.server_dir), build_manifest(self.html_dir))
+        self.assertTrue(os.path.exists(os.path.join(self.html_dir, UPLOADED_MANIFEST_FILENAME)))
+        self.assertFalse(os.path.exists(os.path.join(self.html_dir, PENDING_MANIFEST_FILENAME)))
+        # Nothing to do the next time
+        self.assertEqual(self.run_planner("--deliver-to", self.server_dir), [])
+
+    def test_only_changed_files(self):
+        self.run_planner("--deliver-to", self.server_dir)
+        self.write("2025-10.html", "<p>updated</p>")
+        self.write("2025-11.html", "<p>new</p>")
+        os.utime(os.path.join(self.html_dir, "index.html"))  # touched, but the same contents
+        self.assertEqual(self.run_planner("--tar", self.tar_path, "--deliver-to", self.server_dir),
+                         ["2025-10.html", "2025-11.html"])
+        with tarfile.open(self.tar_path, 'r') as tar:
+            self.assertEqual(tar.getnames(), ["2025-10.html", "2025-11.html"])
+            self.assertEqual(tar.extractfile("2025-10.html").read(), b"<p>updated</p>")
+        self.assertEqual(build_manifest(self.server_dir), build_manifest(self.html_dir))
+
+    def test_replanned_until_marked_uploaded(self):
+        self.run_planner("--deliver-to", self.server_dir)
+        self.write("index.html", "<p>updated</p>")
+        self.assertEqual(self.run_planner("--tar", self.tar_path), ["index.html"])
+        # The transfer failed: planned again, and the old bundle is replaced
+        self.assertEqual(self.run_planner("--tar", self.tar_path), ["index.html"])
+        self.assertTrue(os.path.exists(self.tar_path))
+        self.assertTrue(upload_planner.mark_uploaded(self.html_dir))
+        self.assertFalse(upload_planner.mark_uploaded(self.html_dir))
+        self.assertEqual(self.run_planner("--tar", self.tar_path), [])
+        self.assertFalse(os.path.exists(self.tar_path))
+
+    def test_removed_and_hidden_files(self):
+        self.run_planner("--deliver-to", self.server_dir)
+        os.remove(os.path.join(self.html_dir, "2025-09.html"))
+        self.write(".manifest.json", "{}")
+        plan = upload_planner.plan_upload(
+            self.html_dir, upload_planner.load_manifest(os.path.join(self.html_dir, UPLOADED_MANIFEST_FILENAME)))
+        self.assertEqual(plan.changed, [])
+        self.assertEqual(plan.removed, ["2025-09.html"])
+        self.assertNotIn(".manifest.json", plan.manifest)
@@ -0,0 +1,241 @@
+"""Per-stat monthly time series of a trainer's survey responses, for the API and visualization
+
+The value of a stat in a month is from the trainer's latest response in that calendar month,
+among their responses within the requested date range. (Not the monthly_snapshot table: its
+survey months count the first days of a month toward the previous one, which the charts never
+did.) Only the requested stats are read, from the response_value table, in one SQL query for any
+number of trainers, rather than splitting every response's strdata. compare_columns() lines
+several trainers' series up on one month axis, for /api/compare.
+
+Each trainer's responses are cached in series_cache (whole history, only the stats asked for so
+far); a trainer's entry is dropped once a new response of theirs is committed (by
+Response.save_response or the ingest writer), via tables.response_saved_listeners; see app.py.
+"""
+
+# Standard library
+from collections import OrderedDict, namedtuple
+from datetime import datetime
+import threading
+import time
+
+# Third party
+from sqlalchemy import and_
+
+# Local
+from tables import Response, ResponseValue, Stat
+
+
+VIEW_ABSOLUTE = "absolute"
+VIEW_INCREMENTS = "increments"  # change since the previous month
+VIEW_RATE = "rate"  # percent change since the previous month
+VIEW_TYPES = (VIEW_ABSOLUTE, VIEW_INCREMENTS, VIEW_RATE)
+
+# Every response of a trainer, in time order. timestamps: Response.timestamp_epoch of each;
+# values: {stat name: tuple of float per response}, 0 where the response has no (or a blank) value
+ResponseSeries = namedtuple("ResponseSeries", ["timestamps", "values"])
+# As ResponseSeries, for the latest response of each month; months: tuple of "YYYY-MM" in order
+MonthlySeries = namedtuple("MonthlySeries", ["months", "timestamps", "values"])
+
+
+def query_series(session, trainer_ids, stat_names):
+    """ResponseSeries of each of the trainers, from the db in one query
+
+    Args:
+        trainer_ids: Trainer.id of each trainer
+        stat_names: Stats to read; ones not in the stat table are left out of .values
+
+    Returns:
+        {trainer id: ResponseSeries}; trainers without responses get an empty one
+    """
+    schema = Stat.get_schema(session)
+    stat_ids = {schema.ids[schema.name_to_idx[name]]: name for name in stat_names if name in schema.name_to_idx}
+    rows = session.query(Response.trainer_id, Response.id, Response.timestamp_epoch,
+                         ResponseValue.stat_id, ResponseValue.value) \
+                  .outerjoin(ResponseValue, and_(ResponseValue.response_id == Response.id,
+                                                 ResponseValue.stat_id.in_(list(stat_ids)))) \
+                  .filter(Response.trainer_id.in_(list(trainer_ids))) \
+                  .order_by(Response.trainer_id, Response.timestamp_epoch, Response.id)
+    columns = {trainer_id: ([], [], {name: [] for name in stat_ids.values()}) for trainer_id in trainer_ids}
+    for trainer_id, response_id, timestamp_epoch, stat_id, value in rows:
+        response_ids, timestamps, values = columns[trainer_id]
+        if not response_ids or response_ids[-1] != response_id:
+            response_ids.append(response_id)
+            timestamps.append(timestamp_epoch)
+            for stat_values in values.values():
+                stat_values.append(0.0)
+        if stat_id is not None and value is not None:
+            values[stat_ids[stat_id]][-1] = float(value)
+    return {trainer_id: ResponseSeries(tuple(timestamps),
+                                       {name: tuple(stat_values) for name, stat_values in values.items()})
+            for trainer_id, (_, timestamps, values) in columns.items()}
+
+
+def calendar_month(timestamp):
+    """ "YYYY-MM" of a POSIX timestamp, in local time"""
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m')
+
+
+def monthly_series(series, start_timestamp=None, end_timestamp=None):
+    """MonthlySeries of a ResponseSeries: per calendar month, its latest response within
+    [start_timestamp, end_timestamp]
+    """
+    keep = {}  # by month: index of its latest response in range
+    for idx, timestamp in enumerate(series.timestamps):
+        if (start_timestamp is None or timestamp >= start_timestamp) \
+                and (end_timestamp is None or timestamp <= end_timestamp):
+            month = calendar_month(timestamp)
+            # Of responses with the same timestamp, the first saved one counts
+            if month not in keep or timestamp > series.timestamps[keep[month]]:
+                keep[month] = idx
+    months = sorted(keep)
+    return MonthlySeries(tuple(months),
+                         tuple(series.timestamps[keep[month]] for month in months),
+                         {name: tuple(stat_values[keep[month]] for month in months)
+                          for name, stat_values in series.values.items()})
+
+
+def query_monthly_series(session, trainer_id, stat_names, start_timestamp=None, end_timestamp=None):
+    """MonthlySeries of one trainer, from the db; see query_series() and monthly_series()"""
+    return monthly_series(query_series(session, [trainer_id], stat_names)[trainer_id], start_timestamp, end_timestamp)
+
+
+def view_points(months, stat_values, view_type=VIEW_ABSOLUTE):
+    """[[month, value], ...] of one stat's series, as absolute values or changes between months
+
+    The increments and rate views have no point for the first month; the rate view also has
+    none after a month with a value of 0.
+    """
+    if view_type not in VIEW_TYPES:
+        raise ValueError(f"Unknown view type {view_type!r}; expected one of {VIEW_TYPES}")
+    if view_type == VIEW_ABSOLUTE:
+        return [[month, value] for month, value in zip(months, stat_values)]
+    points = []
+    for month, prev_value, value in zip(months[1:], stat_values, stat_values[1:]):
+        if view_type == VIEW_INCREMENTS:
+            points.append([month, value - prev_value])
+        elif prev_value > 0:
+            points.append([month, (value - prev_value) / prev_value * 100])
+    return points
+
+
+def compare_columns(series_by_trainer, stat_names, view_type=VIEW_ABSOLUTE):
+    """Columns of several trainers' series, on one month axis (see view_points() for the view types)
+
+    Args:
+        series_by_trainer: {trainer name as shown: MonthlySeries}, in the order to show them
+        stat_names: Stats in the order to show them; those not in the series' .values are left out
+
+    Returns:
+        (months, columns) where months is a sorted list of every month with a point, and columns
+        a list of {"trainer_name", "stat_name", "values"} per trainer and stat, with values lined
+        up with months (None where that trainer has no point)
+    """
+    points = []
+    for trainer_name, series in series_by_trainer.items():
+        for stat_name in stat_names:
+            if stat_name in series.values:
+                points.append((trainer_name, stat_name,
+                               dict(view_points(series.months, series.values[stat_name], view_type))))
+    months = sorted({month for _, _, stat_points in points for month in stat_points})
+    columns = [{"trainer_name": trainer_name,
+                "stat_name": stat_name,
+                "values": [stat_points.get(month) for month in months]}
+               for trainer_name, stat_name, stat_points in points]
+    return months, columns
+
+
+class SeriesCache():
+    """ResponseSeries (whole history) by trainer, bounded by number of trainers and age. Thread-safe.
+
+    A trainer's entry only has the stats asked for so far; others are read and added on demand.
+    Entries are also dropped when the stat table's schema version changes.
+    """
+    def __init__(self, max_trainers=512, ttl=600, clock=time.monotonic):
+        self.max_trainers = max_trainers
+        self.ttl = ttl
+        self.clock = clock
+        self.queries = 0  # number of query_series() calls made
+        self._entries = OrderedDict()  # by trainer name: (created, schema version, ResponseSeries)
+        self._invalidations = 0  # so a series read while its trainer submitted isn't cached
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, session, trainer_id, trainer_name, stat_names):
+        """ResponseSeries of the trainer with (at least) stat_names, from the cache or the db
+
+        Stats not in the stat table are left out of .values.
+
+        Args:
+            trainer_name (str): Lowercase, as Trainer.name; the key for invalidate_trainer()
+        """
+        return self.get_many(session, [(trainer_id, trainer_name)], stat_names)[trainer_name]
+
+    def get_many(self, session, trainers, stat_names):
+        """As get(), for several trainers; those not cached (with all of stat_names) are read in one query
+
+        Args:
+            trainers: (Trainer.id, Trainer.name) of each trainer
+
+        Returns:
+            {trainer name: ResponseSeries}
+        """
+        schema = Stat.get_schema(session)
+        stat_names = [name for name in stat_names if name in schema.name_to_idx]
+        now = self.clock()
+        cached = {}  # by trainer name: (created, ResponseSeries)
+        with self._lock:
+            invalidations = self._invalidations
+            for _, trainer_name in trainers:
+                entry = self._entries.get(trainer_name)
+                if entry is not None and (entry[1] != schema.version or now - entry[0] >= self.ttl):
+                    del self._entries[trainer_name]
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(trainer_name)
+                    cached[trainer_name] = (entry[0], entry[2])
+        result = {}
+        to_query = {}  # by trainer id: trainer name
+        for trainer_id, trainer_name in trainers:
+            created, series = cached.get(trainer_name, (None, None))
+            if series is not None and all(name in series.values for name in stat_names):
+                result[trainer_name] = series
+            else:
+                to_query[trainer_id] = trainer_name
+        if not to_query:
+            return result
+
+        queried = query_series(session, list(to_query), stat_names)
+        self.queries += 1
+        now = self.clock()
+        new_entries = {}
+        for trainer_id, trainer_name in to_query.items():
+            series = queried[trainer_id]
+            created, old_series = cached.get(trainer_name, (now, None))
+            if old_series is not None and series.timestamps == old_series.timestamps:
+                series = ResponseSeries(series.timestamps, {**old_series.values, **series.values})
+            else:  # e.g. a submission saved by another process: the stats asked for before are read again later
+                created = now
+            new_entries[trainer_name] = (created, schema.version, series)
+            result[trainer_name] = series
+        with self._lock:
+            if invalidations == self._invalidations:
+                for trainer_name, entry in new_entries.items():
+                    self._entries[trainer_name] = entry
+                    self._entries.move_to_end(trainer_name)
+                while len(self._entries) > self.max_trainers:
+                    self._entries.popitem(last=False)
+        return result
+
+    def invalidate_trainer(self, trainer_name):
+        with self._lock:
+            self._entries.pop(trainer_name, None)
+            self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+series_cache = SeriesCache()
@@ -0,0 +1,160 @@
+#! /usr/bin/env python3
+
+"""Work out which generated files need uploading, from content hashes
+
+Instead of picking month pages by hand (upload_prompter.py), compare the sha256 of every file in
+the html output directory with the manifest saved at the last upload, and upload only what changed:
+
+    python3 upload_planner.py --tar upload.tar     # plan; writes upload_list.txt and/or upload.tar
+    scp upload.tar server:... && ssh server "tar -xf ..."
+    python3 upload_planner.py --mark-uploaded      # after the transfer succeeded
+
+The plan's manifest is kept in <html-dir>/.upload_pending.json until --mark-uploaded makes it
+the last-uploaded manifest (<html-dir>/.uploaded_manifest.json), so a failed transfer is simply
+planned again next time. --deliver-to does the transfer into a local directory instead, e.g. to
+try things out against a stand-in for the server.
+"""
+
+# Standard library
+from argparse import ArgumentParser
+from collections import namedtuple
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tarfile
+
+
+UPLOADED_MANIFEST_FILENAME = ".uploaded_manifest.json"
+PENDING_MANIFEST_FILENAME = ".upload_pending.json"
+MANIFEST_VERSION = 1
+
+# changed: files that are new or differ from the last upload, in name order
+# removed: files in the last upload that are gone locally (reported, but not deleted on the server)
+# manifest: {file name: sha256} of the local directory
+UploadPlan = namedtuple("UploadPlan", ["changed", "removed", "manifest"])
+
+
+def file_sha256(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as fr:
+        for chunk in iter(lambda: fr.read(1 << 20), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def build_manifest(directory):
+    """{file name: sha256} for the files directly in directory, except hidden ones (like the manifests)"""
+    manifest = {}
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if filename.startswith(".") or not os.path.isfile(path):
+            continue
+        manifest[filename] = file_sha256(path)
+    return manifest
+
+
+def load_manifest(path):
+    """A saved manifest, or {} if there's none yet"""
+    try:
+        with open(path, 'r') as fr:
+            return json.load(fr)["files"]
+    except FileNotFoundError:
+        return {}
+
+
+def save_manifest(path, manifest):
+    with open(path, 'w') as fw:
+        json.dump({"version": MANIFEST_VERSION, "files": manifest}, fw, indent=1, sort_keys=True)
+
+
+def plan_upload(directory, uploaded_manifest):
+    """Compare directory's files with the manifest of the last upload
+
+    Returns:
+        UploadPlan
+    """
+    manifest = build_manifest(directory)
+    changed = [name for name, digest in manifest.items() if uploaded_manifest.get(name) != digest]
+    removed = sorted(name for name in uploaded_manifest if name not in manifest)
+    return UploadPlan(changed, removed, manifest)
+
+
+def write_tar(directory, names, tar_path):
+    """Bundle the named files of directory into one (uncompressed; most are .gz already) tar, flat"""
+    with tarfile.open(tar_path, 'w') as tar:
+        for name in names:
+            tar.add(os.path.join(directory, name), arcname=name)
+
+
+def deliver_to_directory(directory, names, target_dir):
+    """Copy the named files to target_dir, as the upload would to the server"""
+    os.makedirs(target_dir, exist_ok=True)
+    for name in names:
+        shutil.copy2(os.path.join(directory, name), os.path.join(target_dir, name))
+
+
+def mark_uploaded(directory):
+    """Make the pending plan's manifest the last-uploaded one. Returns False if there was no pending plan"""
+    pending_path = os.path.join(directory, PENDING_MANIFEST_FILENAME)
+    if not os.path.exists(pending_path):
+        return False
+    os.replace(pending_path, os.path.join(directory, UPLOADED_MANIFEST_FILENAME))
+    return True
+
+
+def main(args):
+    directory = args.html_dir
+    if args.mark_uploaded:
+        if mark_uploaded(directory):
+            print("Recorded the planned files as uploaded")
+        else:
+            print(f"No pending upload plan in {directory}; nothing recorded")
+        return 0
+
+    plan = plan_upload(directory, load_manifest(os.path.join(directory, UPLOADED_MANIFEST_FILENAME)))
+    for name in plan.removed:
+        print(f"Note: {name} was uploaded before, but no longer exists locally (not deleted on the server)")
+
+    with open(args.list_file, 'w') as fw:
+        fw.write(" ".join(os.path.join(directory, name) for name in plan.changed))
+    if args.tar and os.path.exists(args.tar):
+        os.remove(args.tar)  # so an old bundle isn't uploaded again
+    if not plan.changed:
+        pending_path = os.path.join(directory, PENDING_MANIFEST_FILENAME)
+        if os.path.exists(pending_path):
+            os.remove(pending_path)
+        print("Nothing changed since the last upload")
+        return 0
+
+    print(f"{len(plan.changed)} of {len(plan.manifest)} files changed since the last upload:")
+    for name in plan.changed:
+        print(f"    {name}")
+    save_manifest(os.path.join(directory, PENDING_MANIFEST_FILENAME), plan.manifest)
+    print(f"Wrote the list to {args.list_file}")
+    if args.tar:
+        write_tar(directory, plan.changed, args.tar)
+        print(f"Bundled them into {args.tar} ({os.path.getsize(args.tar) / 1e3:.0f} kB)")
+    if args.deliver_to:
+        deliver_to_directory(directory, plan.changed, args.deliver_to)
+        mark_uploaded(directory)
+        print(f"Copied them to {args.deliver_to}")
+    return 0
+
+
+def make_parser():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--html-dir", default="html", help="The generated files. Default: %(default)s")
+    parser.add_argument("--list-file", default="upload_list.txt",
+                        help="Where to write the space-separated paths of the changed files. Default: %(default)s")
+    parser.add_argument("--tar", default=None, help="Also bundle the changed files into this tar file")
+    parser.add_argument("--deliver-to", default=None,
+                        help="Copy the changed files to this directory and record them as uploaded")
+    parser.add_argument("--mark-uploaded", action="store_true",
+                        help="Record the last plan's files as uploaded, once the transfer succeeded")
+    return parser
+
+
+if __name__ == "__main__":
+    sys.exit(main(make_parser().parse_args()))
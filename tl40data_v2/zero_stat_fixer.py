@@ -30,12 +30,11 @@ import datetime
 # Third party
 from thefuzz import process
 from sqlalchemy.orm import Session
-from sqlalchemy import create_engine
 from sqlalchemy.orm.exc import NoResultFound, UnmappedInstanceError
 
 # Local
 from tables import Stat, Response, Trainer
-from settings import LOCAL_DB_SPECIFIER, local_db_specifier_from_file
+from settings import LOCAL_DB_SPECIFIER, get_engine, local_db_specifier_from_file
 
 
 def load_entries_from_db(session):
@@ -68,7 +67,7 @@ class Editor():
             db_specifier = local_db_specifier_from_file(db_filepath)
         else:
             db_specifier = LOCAL_DB_SPECIFIER
-        engine = create_engine(db_specifier)
+        engine = get_engine(db_specifier)
         self.session = Session(engine)
 
         self.changed = False
@@ -141,11 +140,9 @@ class Editor():
 
         if prompt_confirm("Go ahead and apply changes? (y/n)"):
             stats_strdata = Stat.repack_strdata(statsLatest)
-            surveyLatest.strdata = stats_strdata
 
             print("Writing to DB...")
-            self.session.add(surveyLatest)  # A response object
-            self.session.flush()
+            surveyLatest.update_strdata(self.session, stats_strdata)
             self.session.commit()
             self.changed = False
 